@@ -0,0 +1,175 @@
+# Standard libraries imports
+from asyncio import get_running_loop
+from concurrent.futures import Executor, ThreadPoolExecutor
+from os import getenv
+from typing import Callable, TypeVar
+
+# Moduls imports
+import cache
+import db
+import metrics
+import transfer
+from schema import (
+    DEFAULT_EVENT_ID,
+    Delivery,
+    DeliveryProgress,
+    DeliveryReport,
+    Event,
+    SearchResults,
+    Statistics,
+    User,
+    UserRow,
+)
+from write_behind import WRITE_BEHIND_MS, Batch, WriteBehindQueue
+
+DB_READ_THREADS: int = int(getenv("DB_READ_THREADS", "4"))
+
+T = TypeVar("T")
+
+# Reads run in parallel on their own WAL connections, writes are serialised through one thread
+read_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=DB_READ_THREADS, thread_name_prefix="db-read")
+write_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+async def _run(executor: Executor, func: Callable[..., T], *args: object) -> T:
+    if not metrics.enabled:
+        return await get_running_loop().run_in_executor(executor, func, *args)
+    # Timed inside the thread so the histogram shows the query itself and not the wait for a free connection
+    result, seconds = await get_running_loop().run_in_executor(executor, metrics.measure, func, *args)
+    metrics.db_query_seconds.observe(func.__name__, seconds)
+    return result
+
+async def _write_batch(batch: Batch) -> None:
+    await _run(write_executor, db.apply_batch, *batch)
+
+# Optional group commit of registration updates, enabled by WRITE_BEHIND_MS > 0
+write_behind: WriteBehindQueue | None = WriteBehindQueue(_write_batch) if WRITE_BEHIND_MS > 0 else None
+
+# Bumped by every write so a read that raced with it does not put a stale user into the cache
+_writes: int = 0
+
+async def _invalidate(user_id: int, event_id: int) -> None:
+    global _writes
+    _writes += 1
+    await cache.invalidate_user(user_id, event_id)
+
+async def create_event(title: str, admin_id: int) -> Event:
+    return await _run(write_executor, db.create_event, title, admin_id)
+
+async def set_event_admin(event_id: int, admin_id: int) -> None:
+    await _run(write_executor, db.set_event_admin, event_id, admin_id)
+    cache.events.invalidate(event_id)
+
+async def get_event(event_id: int) -> Event | None:
+    event: Event | None = cache.events.get(event_id)
+    if event is None:
+        event = await _run(read_executor, db.get_event, event_id)
+        if event is not None:
+            cache.events.set(event_id, event)
+    return event
+
+async def add_exclusions(pairs: list[tuple[int, int]], event_id: int = DEFAULT_EVENT_ID) -> None:
+    await _run(write_executor, db.add_exclusions, pairs, event_id)
+
+async def get_exclusions(event_id: int = DEFAULT_EVENT_ID) -> dict[int, set[int]]:
+    return await _run(read_executor, db.get_exclusions, event_id)
+
+async def add_user(user_id: int, tg_name: str, event_id: int = DEFAULT_EVENT_ID) -> None:
+    if write_behind is not None:
+        write_behind.add_user(user_id, tg_name, event_id)
+        return
+    await _run(write_executor, db.add_user, user_id, tg_name, event_id)
+
+async def get_membership(user_id: int) -> int | None:
+    return await _run(read_executor, db.get_membership, user_id)
+
+async def update_name(user_id: int, name: str, event_id: int = DEFAULT_EVENT_ID) -> None:
+    if write_behind is not None:
+        write_behind.update_name(user_id, name, event_id)
+    else:
+        await _run(write_executor, db.update_name, user_id, name, event_id)
+    await _invalidate(user_id, event_id)
+
+async def update_desire(user_id: int, desire: str, event_id: int = DEFAULT_EVENT_ID) -> None:
+    if write_behind is not None:
+        write_behind.update_desire(user_id, desire, event_id)
+    else:
+        await _run(write_executor, db.update_desire, user_id, desire, event_id)
+    await _invalidate(user_id, event_id)
+
+async def get_user(user_id: int, event_id: int = DEFAULT_EVENT_ID) -> User | None:
+    user: User | None = await cache.get_user(user_id, event_id)
+    if user is not None:
+        return user
+    writes: int = _writes
+    user = await _run(read_executor, db.get_user, user_id, event_id)
+    if write_behind is not None:
+        user = write_behind.overlay(user_id, user, event_id)
+    if user is not None and writes == _writes:
+        await cache.set_user(user, event_id)
+    return user
+
+async def get_statistics(
+    after_id: int | None = None, before_id: int | None = None, event_id: int = DEFAULT_EVENT_ID
+) -> Statistics:
+    await flush()
+    return await _run(read_executor, db.get_statistics, after_id, before_id, db.STATISTICS_PAGE_SIZE, event_id)
+
+async def search_users(
+    text: str, after_key: int | None = None, before_key: int | None = None, event_id: int = DEFAULT_EVENT_ID
+) -> SearchResults:
+    await flush()
+    return await _run(read_executor, db.search_users, text, after_key, before_key, db.STATISTICS_PAGE_SIZE, event_id)
+
+async def get_data(event_id: int = DEFAULT_EVENT_ID) -> list[UserRow]:
+    await flush()
+    return await _run(read_executor, db.get_data, event_id)
+
+async def save_draw(
+    token: int, pairs: list[tuple[int, int]], messages: list[tuple[int, str]], event_id: int = DEFAULT_EVENT_ID
+) -> bool:
+    return await _run(write_executor, db.save_draw, token, pairs, messages, event_id)
+
+async def claim_outbox(limit: int) -> tuple[int, list[tuple[int, str]]]:
+    return await _run(write_executor, db.claim_outbox, limit)
+
+async def claim_reminders(
+    after: tuple[int, int], joined_before: float, limit: int
+) -> tuple[tuple[int, int] | None, list[tuple[int, int]]]:
+    return await _run(write_executor, db.claim_reminders, after, joined_before, limit)
+
+async def finish_outbox(deliveries: list[Delivery], event_id: int = DEFAULT_EVENT_ID) -> None:
+    await _run(write_executor, db.finish_outbox, deliveries, event_id)
+
+async def claim_report(event_id: int = DEFAULT_EVENT_ID) -> bool:
+    return await _run(write_executor, db.claim_report, event_id)
+
+async def get_delivery_progress(event_id: int = DEFAULT_EVENT_ID) -> DeliveryProgress:
+    return await _run(read_executor, db.get_delivery_progress, event_id)
+
+async def get_delivery_report(event_id: int = DEFAULT_EVENT_ID) -> DeliveryReport:
+    return await _run(read_executor, db.get_delivery_report, event_id)
+
+async def import_participants(path: str, event_id: int = DEFAULT_EVENT_ID) -> int:
+    global _writes
+    await flush()
+    count: int = await _run(write_executor, transfer.import_participants, path, event_id)
+    # Imported users may be cached with their old data; the redis level expires within CACHE_TTL
+    _writes += 1
+    cache.users.clear()
+    return count
+
+async def export_participants(path: str, event_id: int = DEFAULT_EVENT_ID) -> int:
+    await flush()
+    return await _run(read_executor, transfer.export_participants, path, event_id)
+
+async def export_pairs(path: str, event_id: int = DEFAULT_EVENT_ID) -> int:
+    return await _run(read_executor, transfer.export_pairs, path, event_id)
+
+async def flush() -> None:
+    if write_behind is not None:
+        await write_behind.flush()
+
+def shutdown() -> None:
+    read_executor.shutdown(wait=True)
+    write_executor.shutdown(wait=True)
+    db.close_db()
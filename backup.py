@@ -0,0 +1,195 @@
+# Standard libraries imports
+import logging
+import sys
+from asyncio import get_running_loop, sleep
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from os import getenv, replace
+from pathlib import Path
+from sqlite3 import Connection, DatabaseError, connect
+from time import perf_counter
+from time import sleep as pause
+
+# Third-party libraries imports
+from redis.asyncio import Redis
+
+# Moduls imports
+import db
+from async_db import flush
+from schema import Snapshot
+
+BACKUP_DIR: str = getenv("BACKUP_DIR", "/data/backups")
+# Seconds between scheduled snapshots, 0 takes them only on /backup
+BACKUP_INTERVAL: float = float(getenv("BACKUP_INTERVAL", "0"))
+BACKUP_KEEP: int = int(getenv("BACKUP_KEEP", "7"))
+# Pages copied per step (4 KiB each) and the pause between steps, which bounds the disk bandwidth of a snapshot
+BACKUP_PAGES: int = int(getenv("BACKUP_PAGES", "256"))
+BACKUP_PAUSE_MS: float = float(getenv("BACKUP_PAUSE_MS", "2"))
+BACKUP_LOCK_KEY: str = "lock:backup"
+SNAPSHOT_PATTERN: str = "santa-*.db"
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# One snapshot at a time, off the event loop and the database executors
+executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+running: bool = False
+
+
+def summary(conn: Connection) -> dict[str, int]:
+    """Schema version and row count of every table, compared between a database and its copy."""
+    tables: list[str] = [
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+    ]
+    counts: dict[str, int] = {"user_version": conn.execute("PRAGMA user_version").fetchone()[0]}
+    for table in sorted(tables):
+        # Table names come from sqlite_master, not from users
+        counts[table] = conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]  # noqa: S608
+    return counts
+
+
+def verify(path: str) -> dict[str, int]:
+    """Check that `path` is an intact database this bot can open and return its summary. Raises ValueError."""
+    if not Path(path).is_file():
+        raise ValueError(f"{path} does not exist")
+    conn: Connection = connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result: list[tuple[str]] = conn.execute("PRAGMA quick_check").fetchall()
+        if result != [("ok",)]:
+            raise ValueError(f"{path} is damaged: {'; '.join(row[0] for row in result[:5])}")
+        counts: dict[str, int] = summary(conn)
+    except DatabaseError as error:
+        raise ValueError(f"{path} is not a database: {error}") from error
+    finally:
+        conn.close()
+    if counts["user_version"] > len(db.MIGRATIONS):
+        raise ValueError(f"{path} was written by a newer version of the bot (schema {counts['user_version']})")
+    return counts
+
+
+def copy(source: Connection, target: Connection, pages: int = BACKUP_PAGES, pause_ms: float = BACKUP_PAUSE_MS) -> int:
+    """Copy `source` into `target` with the online backup API, `pages` pages per step. Returns the number of steps."""
+    steps: int = 0
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal steps
+        steps += 1
+        if remaining and pause_ms:
+            pause(pause_ms / 1000)
+
+    source.backup(target, pages=pages, progress=progress)
+    return steps
+
+
+def take_snapshot(
+    directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP, pages: int = BACKUP_PAGES, pause_ms: float = BACKUP_PAUSE_MS
+) -> Snapshot:
+    """Copy the live database into `directory`, verify the copy and drop all but the `keep` newest snapshots.
+
+    The copy is written under a temporary name and renamed once verified, so a snapshot file is always complete.
+    """
+    start: float = perf_counter()
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    path: Path = Path(directory) / datetime.now(timezone.utc).strftime("santa-%Y%m%d-%H%M%S.db")
+    temp: Path = path.with_name(path.name + ".part")
+    temp.unlink(missing_ok=True)
+    source: Connection = connect(db.DB_PATH)
+    try:
+        # An open read transaction pins one WAL snapshot for every step. Writers are never blocked by a reader in
+        # WAL mode, and their commits do not make the backup restart from the first page, which under steady
+        # registration traffic could go on forever.
+        source.execute("BEGIN")
+        expected: dict[str, int] = summary(source)
+        target: Connection = connect(temp)
+        try:
+            steps: int = copy(source, target, pages, pause_ms)
+            # A single self-contained file, without the -wal and -shm of the live database
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+        source.rollback()
+    finally:
+        source.close()
+    try:
+        copied: dict[str, int] = verify(str(temp))
+        if copied != expected:
+            raise ValueError(f"{temp} does not match the database: {copied} != {expected}")
+    except ValueError:
+        temp.unlink(missing_ok=True)
+        raise
+    replace(temp, path)
+    # keep = 0 keeps every snapshot
+    for old in sorted(Path(directory).glob(SNAPSHOT_PATTERN))[:-keep]:
+        old.unlink()
+    return Snapshot(
+        path=str(path),
+        size=path.stat().st_size,
+        steps=steps,
+        seconds=perf_counter() - start,
+        users=expected.get("users", 0),
+    )
+
+
+def restore(path: str, db_path: str | None = None) -> dict[str, int]:
+    """Replace the database with the snapshot at `path` and verify the result. Stop the bot first.
+
+    The snapshot is verified before the database is touched, and the restored database is checked against it.
+    Older snapshots are migrated to the current schema by init_db at the next start.
+    """
+    expected: dict[str, int] = verify(path)
+    target_path: str = db_path or db.DB_PATH
+    source: Connection = connect(f"file:{path}?mode=ro", uri=True)
+    target: Connection = connect(target_path)
+    try:
+        copy(source, target, pages=-1, pause_ms=0)
+    finally:
+        target.close()
+        source.close()
+    restored: dict[str, int] = verify(target_path)
+    if restored != expected:
+        raise ValueError(f"{target_path} does not match {path} after restore: {restored} != {expected}")
+    return restored
+
+
+async def snapshot() -> Snapshot:
+    """Take a snapshot in the backup thread. Raises RuntimeError if one is already being taken by this process."""
+    global running
+    if running:
+        raise RuntimeError("Snapshot is already running")
+    running = True
+    try:
+        # Registrations still buffered by the write-behind queue belong in the snapshot
+        await flush()
+        return await get_running_loop().run_in_executor(executor, take_snapshot)
+    finally:
+        running = False
+
+
+async def run_backups(redis: Redis, interval: float = BACKUP_INTERVAL) -> None:
+    """Take a snapshot every `interval` seconds until cancelled.
+
+    All instances share one database file, so only the instance that takes the redis lock for this period does it.
+    """
+    while True:
+        await sleep(interval)
+        if not await redis.set(BACKUP_LOCK_KEY, "1", nx=True, px=max(int(interval * 900), 1)):
+            continue
+        try:
+            taken: Snapshot = await snapshot()
+        except Exception:
+            logger.exception("Scheduled snapshot failed")
+        else:
+            logger.info("Snapshot %s: %d bytes in %.1f s", taken.path, taken.size, taken.seconds)
+
+
+if __name__ == "__main__":
+    # python backup.py snapshot | verify PATH | restore PATH
+    command: str = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "snapshot":
+        print(take_snapshot())
+    elif command == "verify" and len(sys.argv) == 3:
+        print(verify(sys.argv[2]))
+    elif command == "restore" and len(sys.argv) == 3:
+        print(restore(sys.argv[2]))
+    else:
+        sys.exit("usage: python backup.py snapshot | verify PATH | restore PATH")
@@ -0,0 +1,82 @@
+"""Snapshot time and the write latency the bot sees while a snapshot is being taken, vs no snapshot.
+
+A writer thread registers users through db.update_name/update_desire, like the write executor does, while the
+main thread takes snapshots with backup.take_snapshot.
+
+Usage: python benchmarks/bench_backup.py [rows ...]
+"""
+# Standard libraries imports
+import sys
+from pathlib import Path
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from time import perf_counter, sleep
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Moduls imports
+import backup  # noqa: E402
+import db  # noqa: E402
+from schema import User  # noqa: E402
+
+DESIRE: str = "Настольная игра, книга про космос или теплые носки. " * 4
+
+
+def write_until(stopped: Event, rows: int, latencies: list[float]) -> None:
+    user_id: int = 0
+    while not stopped.is_set():
+        user_id = user_id % rows + 1
+        start: float = perf_counter()
+        db.update_name(user_id, f"Name {perf_counter()}")
+        db.update_desire(user_id, DESIRE)
+        latencies.append(perf_counter() - start)
+        sleep(0.001)
+
+
+def measure(rows: int, snapshots: Path | None, seconds: float) -> tuple[list[float], list[float]]:
+    """Write for `seconds` (or until the snapshots are done) and return (write latencies, snapshot seconds)."""
+    latencies: list[float] = []
+    taken: list[float] = []
+    stopped: Event = Event()
+    writer: Thread = Thread(target=write_until, args=(stopped, rows, latencies))
+    writer.start()
+    if snapshots is None:
+        sleep(seconds)
+    else:
+        end: float = perf_counter() + seconds
+        while perf_counter() < end:
+            taken.append(backup.take_snapshot(str(snapshots), keep=1).seconds)
+    stopped.set()
+    writer.join()
+    return latencies, taken
+
+
+def milliseconds(latencies: list[float]) -> str:
+    percentiles: list[float] = quantiles(latencies, n=100)
+    return f"{percentiles[49] * 1000:>7.2f} {percentiles[98] * 1000:>7.2f} {max(latencies) * 1000:>7.2f}"
+
+
+def main(counts: list[int]) -> None:
+    print(
+        f"{'rows':>8} {'db MiB':>7} {'snapshot s':>10} | {'writes during':<14}"
+        f" {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7}"
+    )
+    for rows in counts:
+        with TemporaryDirectory() as temp_dir:
+            db.DB_PATH = str(Path(temp_dir) / "live.db")
+            db.init_db()
+            db.import_users(
+                User(id=i, tg_name=f"@user{i}", name=f"User {i}", desire=DESIRE) for i in range(1, rows + 1)
+            )
+            size: float = Path(db.DB_PATH).stat().st_size / 2**20
+            idle, _ = measure(rows, None, 3)
+            busy, taken = measure(rows, Path(temp_dir) / "snapshots", 3)
+            db.close_db()
+        snapshot: str = f"{min(taken):>10.2f}"
+        print(f"{rows:>8} {size:>7.0f} {snapshot} | {'no snapshot':<14} {milliseconds(idle)}")
+        print(f"{'':>8} {'':>7} {'':>10} | {'snapshot':<14} {milliseconds(busy)}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
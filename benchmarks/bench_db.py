@@ -0,0 +1,79 @@
+"""Benchmark of get_user/update_name calls per second: connection per call vs the persistent connection.
+
+Usage: python benchmarks/bench_db.py [calls]
+"""
+# Standard libraries imports
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from sqlite3 import Connection, Cursor, connect
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Moduls imports
+import db  # noqa: E402
+
+
+@contextmanager
+def legacy_connection(path: str) -> Iterator[Cursor]:
+    """The connection-per-call helper db.py used before."""
+    conn: Connection = connect(path)
+    cursor: Cursor = conn.cursor()
+    try:
+        yield cursor
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def legacy_get_user(path: str, user_id: int) -> None:
+    with legacy_connection(path) as cursor:
+        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+        cursor.fetchone()
+
+
+def legacy_update_name(path: str, user_id: int, name: str) -> None:
+    with legacy_connection(path) as cursor:
+        cursor.execute("UPDATE users SET name = ? WHERE id = ?", (name, user_id))
+
+
+def rate(func: Callable[[int], object], calls: int) -> float:
+    start: float = perf_counter()
+    for call in range(calls):
+        func(call % 1000)
+    return calls / (perf_counter() - start)
+
+
+def main(calls: int) -> None:
+    with TemporaryDirectory() as temp_dir:
+        legacy_path: str = str(Path(temp_dir) / "legacy.db")
+        conn: Connection = connect(legacy_path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, tg_name TEXT DEFAULT '', name TEXT DEFAULT '', "
+                     "desire TEXT DEFAULT '', is_registered BOOLEAN DEFAULT 0)")
+        conn.executemany("INSERT INTO users (id, tg_name) VALUES (?, ?)", ((i, f"@u{i}") for i in range(1000)))
+        conn.commit()
+        conn.close()
+
+        db.DB_PATH = str(Path(temp_dir) / "tuned.db")
+        db.init_db()
+        for user_id in range(1000):
+            db.add_user(user_id, f"@u{user_id}")
+
+        results: dict[str, tuple[float, float]] = {
+            "get_user": (rate(lambda i: legacy_get_user(legacy_path, i), calls), rate(db.get_user, calls)),
+            "update_name": (
+                rate(lambda i: legacy_update_name(legacy_path, i, "name"), calls),
+                rate(lambda i: db.update_name(i, "name"), calls),
+            ),
+        }
+        db.close_db()
+
+    for name, (before, after) in results.items():
+        print(f"{name:<12} before: {before:>9.0f} calls/s  after: {after:>9.0f} calls/s  x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
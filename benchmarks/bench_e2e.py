@@ -0,0 +1,247 @@
+"""End-to-end load test: synthetic updates go through dp.feed_update into the real handlers of main.py.
+
+The bot talks to a local stand-in for the Bot API, to fakeredis (or a real Redis with --redis HOST) and to SQLite
+in a temp dir. Every size runs in a fresh process, so the peak RSS printed for a scenario is the peak of the run
+up to and including it.
+
+Scenarios:
+- registration: every user sends a first message, a name and a desire
+- clicks: every user presses "Посмотреть свои данные" --clicks times
+- draw: the admin presses "Розыгрыш" and "Да", then the outbox worker delivers every letter
+
+Usage: python benchmarks/bench_e2e.py [users ...] [--concurrency N] [--clicks N] [--api-ms MS] [--redis HOST]
+"""
+# Standard libraries imports
+import os
+import resource
+import subprocess
+import sys
+from argparse import SUPPRESS, ArgumentParser, Namespace
+from asyncio import Event, create_task, gather, run, sleep, wait_for
+from itertools import count
+from pathlib import Path
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Third-party libraries imports
+from aiohttp import web  # noqa: E402
+
+TOKEN: str = "123456:BENCH"  # noqa: S105 (token of the local stand-in API)
+ADMIN_ID: int = 10**9
+API_PORT: int = 8783
+
+update_ids: Iterator[int] = count(1)
+
+
+def user_dict(user_id: int) -> dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": "User", "username": f"user{user_id}"}
+
+
+def message(user_id: int, text: str) -> dict[str, Any]:
+    update_id: int = next(update_ids)
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": user_dict(user_id),
+            "text": text,
+        },
+    }
+
+
+def click(user_id: int, data: str) -> dict[str, Any]:
+    update_id: int = next(update_ids)
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user_dict(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": 1700000000,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 123456, "is_bot": True, "first_name": "Bench"},
+                "text": "menu",
+            },
+        },
+    }
+
+
+class FakeBotAPI:
+    """Answers every Bot API method like Telegram would, optionally after `delay` seconds, and counts letters."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay: float = delay
+        self.requests: int = 0
+        self.letters: int = 0
+        self.expected_letters: int = -1
+        self.delivered: Event = Event()
+        self.message_ids: Iterator[int] = count(1)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.delay:
+            await sleep(self.delay)
+        method: str = request.match_info["method"].lower()
+        if method == "getme":
+            return web.json_response({"ok": True, "result": {"id": 123456, "is_bot": True, "first_name": "Bench"}})
+        if method != "sendmessage":
+            return web.json_response({"ok": True, "result": True})
+        form = await request.post()
+        chat_id: int = int(str(form["chat_id"]))
+        if chat_id != ADMIN_ID:
+            self.letters += 1
+            if self.letters == self.expected_letters:
+                self.delivered.set()
+        result: dict[str, Any] = {
+            "message_id": next(self.message_ids),
+            "date": 1700000000,
+            "chat": {"id": chat_id, "type": "private"},
+            "text": str(form.get("text", "")),
+        }
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self) -> web.AppRunner:
+        app: web.Application = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        runner: web.AppRunner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", API_PORT).start()
+        return runner
+
+
+def peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(users: int, scenario: str, updates: int, elapsed: float, latencies: list[float], note: str = "") -> None:
+    if len(latencies) >= 2:
+        percentiles: list[float] = quantiles(latencies, n=100)
+        p50, p99 = f"{percentiles[49] * 1000:.2f}", f"{percentiles[98] * 1000:.2f}"
+    else:
+        p50 = p99 = "-"
+    print(
+        f"{users:>7} {scenario:<12} {updates:>8} {updates / elapsed:>10.0f} {p50:>8} {p99:>8}"
+        f" {peak_rss_mib():>9.0f}  {note}",
+        flush=True,
+    )
+
+
+async def drive(
+    main: Any, users: range, make_updates: Callable[[int], list[dict[str, Any]]], concurrency: int
+) -> tuple[int, float, list[float]]:
+    """Feed every user's updates in order, `concurrency` users at a time, like the update scheduler does."""
+    from aiogram.types import Update
+
+    latencies: list[float] = []
+    pending: Iterator[int] = iter(users)
+
+    async def worker() -> None:
+        for user_id in pending:
+            for data in make_updates(user_id):
+                update: Update = Update.model_validate(data, context={"bot": main.bot})
+                start: float = perf_counter()
+                await main.dp.feed_update(main.bot, update)
+                latencies.append(perf_counter() - start)
+
+    start: float = perf_counter()
+    await gather(*(worker() for _ in range(concurrency)))
+    return len(latencies), perf_counter() - start, latencies
+
+
+async def bench(args: Namespace, users: int) -> None:
+    import db
+    import main
+    from async_db import flush, set_event_admin
+    from cluster import run_outbox_worker
+    from schema import DEFAULT_EVENT_ID
+
+    api: FakeBotAPI = FakeBotAPI(args.api_ms / 1000)
+    runner: web.AppRunner = await api.start()
+    with TemporaryDirectory() as temp_dir:
+        db.DB_PATH = str(Path(temp_dir) / "bench.db")
+        db.init_db()
+        await set_event_admin(DEFAULT_EVENT_ID, ADMIN_ID)
+        participants: range = range(1, users + 1)
+
+        def register(user_id: int) -> list[dict[str, Any]]:
+            return [message(user_id, "/start"), message(user_id, f"User {user_id}"), message(user_id, "A book")]
+
+        updates, elapsed, latencies = await drive(main, participants, register, args.concurrency)
+        report(users, "registration", updates, elapsed, latencies)
+
+        throttled: int = main.throttling.throttled
+        updates, elapsed, latencies = await drive(
+            main, participants, lambda user_id: [click(user_id, "info") for _ in range(args.clicks)], args.concurrency
+        )
+        report(users, "clicks", updates, elapsed, latencies, f"throttled {main.throttling.throttled - throttled}")
+
+        api.letters, api.expected_letters = 0, users
+        worker = create_task(run_outbox_worker(main.bot, main.broadcaster, ADMIN_ID))
+        start: float = perf_counter()
+        _, _, latencies = await drive(
+            main,
+            range(ADMIN_ID, ADMIN_ID + 1),
+            lambda user_id: [click(user_id, "admin_roll"), click(user_id, "yes")],
+            1,
+        )
+        await wait_for(api.delivered.wait(), timeout=3600)
+        elapsed = perf_counter() - start
+        report(users, "draw", users, elapsed, [], f"letters/s; pressing Да took {latencies[-1]:.2f} s")
+        worker.cancel()
+        await gather(worker, return_exceptions=True)
+        await flush()
+        db.close_db()
+    await main.bot.session.close()
+    await runner.cleanup()
+
+
+def child(args: Namespace, users: int) -> None:
+    os.environ.update({
+        "BOT_TOKEN": TOKEN,
+        "ADMIN_ID": str(ADMIN_ID),
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{API_PORT}",
+        # The stand-in has no rate limit of its own, so the broadcast runs as fast as the bot can send
+        "BROADCAST_RATE": "1000000",
+    })
+    if args.redis:
+        os.environ["REDIS_HOST"] = args.redis
+    else:
+        import aiogram.fsm.storage.redis
+        from fakeredis.aioredis import FakeRedis
+
+        # main.py builds its client from this name
+        aiogram.fsm.storage.redis.Redis = FakeRedis  # type: ignore[attr-defined]
+    run(bench(args, users))
+
+
+def parse_args() -> Namespace:
+    parser: ArgumentParser = ArgumentParser()
+    parser.add_argument("users", type=int, nargs="*", default=[1000, 10_000])
+    parser.add_argument("--concurrency", type=int, default=64, help="users handled at the same time")
+    parser.add_argument("--clicks", type=int, default=3, help="button presses per user")
+    parser.add_argument("--api-ms", type=float, default=0.0, help="latency of the stand-in Bot API")
+    parser.add_argument("--redis", help="host of a real Redis instead of fakeredis")
+    parser.add_argument("--child", action="store_true", help=SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args: Namespace = parse_args()
+    if args.child:
+        child(args, args.users[0])
+    else:
+        header: str = f"{'users':>7} {'scenario':<12} {'updates':>8} {'per second':>10} {'p50 ms':>8} {'p99 ms':>8}"
+        print(f"{header} {'peak MiB':>9}", flush=True)
+        options: list[str] = ["--concurrency", str(args.concurrency), "--clicks", str(args.clicks)]
+        options += ["--api-ms", str(args.api_ms), *(["--redis", args.redis] if args.redis else [])]
+        for users in args.users:
+            subprocess.run([sys.executable, __file__, str(users), *options, "--child"], check=True)  # noqa: S603
@@ -0,0 +1,62 @@
+"""Benchmark for pairing.draw_pairs under exclusion rules.
+
+Every participant excludes a few random recipients (partners, last year's recipient) and belongs to a team
+whose members may not draw each other. The last two columns time infeasible sets: one team holds more than half
+of the participants, or everybody excludes the same participant.
+
+Usage: python benchmarks/bench_matching.py [participants ...]
+"""
+# Standard libraries imports
+import sys
+from functools import partial
+from pathlib import Path
+from random import Random
+from time import perf_counter
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Moduls imports
+from pairing import draw_pairs  # noqa: E402
+from schema import User  # noqa: E402
+
+EXCLUSIONS_PER_USER: int = 3
+TEAM_SIZE: int = 20
+
+
+def best(func: Callable[[], object], rounds: int = 3) -> float:
+    result: float = float("inf")
+    for _ in range(rounds):
+        start: float = perf_counter()
+        try:
+            func()
+        except ValueError:
+            pass
+        result = min(result, perf_counter() - start)
+    return result * 1000
+
+
+def main(counts: list[int]) -> None:
+    random: Random = Random(42)  # noqa: S311 (reproducible test data, not security)
+    print(f"{'n':>7} | {'no rules':>9} {'exclusions':>11} {'+ teams':>9} | {'big team':>9} {'nobody gives':>13}")
+    for count in counts:
+        users: list[User] = [User(id=user_id, tg_name=f"@user{user_id}") for user_id in range(count)]
+        exclusions: dict[int, set[int]] = {
+            user.id: set(random.sample(range(count), EXCLUSIONS_PER_USER)) for user in users
+        }
+        teams: dict[int, int] = {user.id: user.id // TEAM_SIZE for user in users}
+        crowded: dict[int, int] = {user.id: 0 for user in users[: count // 2 + 1]}
+        shunned: dict[int, set[int]] = {user.id: exclusions[user.id] | {0} for user in users}
+        plain: float = best(partial(draw_pairs, users))
+        excluded: float = best(partial(draw_pairs, users, exclusions))
+        teamed: float = best(partial(draw_pairs, users, exclusions, teams))
+        big_team: float = best(partial(draw_pairs, users, teams=crowded))
+        nobody_gives: float = best(partial(draw_pairs, users, shunned))
+        print(
+            f"{count:>7} | {plain:>6.1f} ms {excluded:>8.1f} ms {teamed:>6.1f} ms"
+            f" | {big_team:>6.1f} ms {nobody_gives:>10.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 50_000])
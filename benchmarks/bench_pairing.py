@@ -0,0 +1,30 @@
+"""Benchmark for pairing.draw_pairs.
+
+Usage: python benchmarks/bench_pairing.py [participants ...]
+"""
+# Standard libraries imports
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Moduls imports
+from pairing import draw_pairs  # noqa: E402
+from schema import User  # noqa: E402
+
+
+def bench(count: int, rounds: int = 5) -> float:
+    users: list[User] = [User(id=user_id, tg_name=f"@user{user_id}") for user_id in range(count)]
+    best: float = float("inf")
+    for _ in range(rounds):
+        start: float = perf_counter()
+        draw_pairs(users)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    counts: list[int] = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for count in counts:
+        print(f"draw_pairs n={count:>7}: {bench(count) * 1000:8.2f} ms")
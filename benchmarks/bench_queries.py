@@ -0,0 +1,88 @@
+"""Draw-time and statistics queries on the original schema vs the migrated one.
+
+Usage: python benchmarks/bench_queries.py [rows ...]
+"""
+# Standard libraries imports
+import sys
+from functools import partial
+from pathlib import Path
+from sqlite3 import Connection, connect
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Moduls imports
+import db  # noqa: E402
+
+DESIRE: str = "Настольная игра, книга про космос или теплые носки. " * 4
+# Same query as db.get_data, without building the pydantic models
+DRAW_QUERY: str = """
+    SELECT users.id, tg_name, name, COALESCE(desire, '') FROM users
+    LEFT JOIN user_desires ON user_desires.event_id = users.event_id AND user_desires.user_id = users.id
+    WHERE users.event_id = 0 AND is_registered = 1
+"""
+
+
+def create_legacy(path: str, rows: int) -> None:
+    conn: Connection = connect(path)
+    conn.execute("""
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY,
+            tg_name TEXT DEFAULT '',
+            name TEXT DEFAULT '',
+            desire TEXT DEFAULT '',
+            is_registered BOOLEAN DEFAULT 0
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?, ?)",
+        ((user_id, f"@user{user_id}", f"User {user_id}", DESIRE, user_id % 10 == 0) for user_id in range(rows)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def fetch_all(conn: Connection, query: str) -> list[object]:
+    return conn.execute(query).fetchall()
+
+
+def best(func: Callable[[], object], rounds: int = 3) -> float:
+    result: float = float("inf")
+    for _ in range(rounds):
+        start: float = perf_counter()
+        func()
+        result = min(result, perf_counter() - start)
+    return result * 1000
+
+
+def legacy_queries(path: str) -> tuple[float, float]:
+    conn: Connection = connect(path)
+    draw: float = best(lambda: conn.execute("SELECT * FROM users WHERE is_registered = 1").fetchall())
+    statistics: float = best(lambda: conn.execute("SELECT tg_name, name, is_registered FROM users").fetchall())
+    conn.close()
+    return draw, statistics
+
+
+def main(counts: list[int]) -> None:
+    print(f"{'rows':>9} | {'draw before':>12} {'draw after':>11} | {'stats before':>13} {'stats after':>12}")
+    for rows in counts:
+        with TemporaryDirectory() as temp_dir:
+            legacy_path: str = str(Path(temp_dir) / "legacy.db")
+            create_legacy(legacy_path, rows)
+            draw_before, stats_before = legacy_queries(legacy_path)
+
+            db.DB_PATH = str(Path(temp_dir) / "migrated.db")
+            create_legacy(db.DB_PATH, rows)
+            db.init_db()
+            conn: Connection = db.get_connection()
+            draw_after: float = best(partial(fetch_all, conn, DRAW_QUERY))
+            stats_after: float = best(db.get_statistics)
+            db.close_db()
+        draw: str = f"{draw_before:>9.1f} ms {draw_after:>8.1f} ms"
+        print(f"{rows:>9} | {draw} | {stats_before:>10.1f} ms {stats_after:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,69 @@
+"""Time and peak memory of reading all registered users as pydantic models vs lean rows.
+
+Usage: python benchmarks/bench_rows.py [rows ...]
+"""
+# Standard libraries imports
+import sys
+import tracemalloc
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Moduls imports
+import db  # noqa: E402
+from schema import User  # noqa: E402
+
+DESIRE: str = "Настольная игра, книга про космос или теплые носки."
+
+
+def models() -> list[User]:
+    """What db.get_data returned before: one validated User per row."""
+    with db.db_connection() as cursor:
+        cursor.execute("""
+            SELECT users.id, tg_name, name, COALESCE(desire, '') FROM users
+            LEFT JOIN user_desires ON user_desires.event_id = users.event_id AND user_desires.user_id = users.id
+            WHERE users.event_id = 0 AND is_registered = 1
+        """)
+        return [User(id=row[0], tg_name=row[1], name=row[2], desire=row[3]) for row in cursor.fetchall()]
+
+
+def measure(func: Callable[[], object]) -> tuple[float, float]:
+    """Best time in ms over 3 runs and peak traced memory in MiB of one run."""
+    elapsed: float = float("inf")
+    for _ in range(3):
+        start: float = perf_counter()
+        func()
+        elapsed = min(elapsed, perf_counter() - start)
+    tracemalloc.start()
+    result: object = func()
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return elapsed * 1000, peak / 2**20
+
+
+def main(counts: list[int]) -> None:
+    print(f"{'rows':>8} | {'models':>9} {'memory':>10} | {'rows':>9} {'memory':>10}")
+    for count in counts:
+        with TemporaryDirectory() as temp_dir:
+            db.DB_PATH = str(Path(temp_dir) / "bench.db")
+            db.init_db()
+            db.apply_batch(
+                [(0, user_id, f"@user{user_id}") for user_id in range(count)],
+                [(f"User {user_id}", 0, user_id) for user_id in range(count)],
+                [(DESIRE, 0, user_id) for user_id in range(count)],
+            )
+            model_time, model_memory = measure(models)
+            row_time, row_memory = measure(db.get_data)
+            db.close_db()
+        print(
+            f"{count:>8} | {model_time:>6.1f} ms {model_memory:>6.1f} MiB"
+            f" | {row_time:>6.1f} ms {row_memory:>6.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
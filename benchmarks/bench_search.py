@@ -0,0 +1,88 @@
+"""Participant search: LIKE '%text%' scans vs the FTS5 index, first page of results for a few kinds of queries.
+
+Usage: python benchmarks/bench_search.py [rows ...]
+"""
+# Standard libraries imports
+import sys
+from functools import partial
+from pathlib import Path
+from sqlite3 import Connection
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Moduls imports
+import db  # noqa: E402
+from schema import User  # noqa: E402
+
+NAMES: list[str] = ["Анна", "Борис", "Вера", "Глеб", "Дарья", "Егор", "Жанна", "Захар", "Ирина", "Кирилл"]
+DESIRES: list[str] = ["Настольная игра", "Книга про космос", "Теплые носки", "Пазл на 1000 деталей", "Чай"]
+# (title, query) from a single match to most of the table
+QUERIES: list[tuple[str, str]] = [
+    ("one user", "user4321"),
+    ("name prefix", "Дар"),
+    ("two words", "Ирина пазл"),
+    ("common prefix", "us"),
+]
+
+LIKE_SEARCH: str = """
+    SELECT users.id, tg_name, name, is_registered FROM users
+    LEFT JOIN user_desires ON user_desires.event_id = users.event_id AND user_desires.user_id = users.id
+    WHERE users.event_id = 0 AND (tg_name LIKE ?1 OR name LIKE ?1 OR desire LIKE ?1)
+    ORDER BY users.id LIMIT 26
+"""
+
+
+def users(rows: int) -> Iterator[User]:
+    for user_id in range(1, rows + 1):
+        yield User(
+            id=user_id,
+            tg_name=f"@user{user_id}",
+            name=f"{NAMES[user_id % len(NAMES)]} {user_id}",
+            desire=DESIRES[user_id % len(DESIRES)],
+        )
+
+
+def like_search(conn: Connection, pattern: str) -> list[object]:
+    return conn.execute(LIKE_SEARCH, (pattern,)).fetchall()
+
+
+def best(func: Callable[[], object], rounds: int = 5) -> float:
+    result: float = float("inf")
+    for _ in range(rounds):
+        start: float = perf_counter()
+        func()
+        result = min(result, perf_counter() - start)
+    return result * 1000
+
+
+def main(counts: list[int]) -> None:
+    for rows in counts:
+        with TemporaryDirectory() as temp_dir:
+            db.DB_PATH = str(Path(temp_dir) / "search.db")
+            db.init_db()
+            start: float = perf_counter()
+            db.import_users(users(rows))
+            imported: float = perf_counter() - start
+            conn: Connection = db.get_connection()
+            print(f"{rows} rows, imported with the index triggers in {imported:.1f} s")
+            print(f"{'query':<14} {'matches':>8} {'LIKE ms':>9} {'FTS5 ms':>9} {'next page ms':>13}")
+            for title, query in QUERIES:
+                # LIKE can only look for one of the words, which already makes it a lower bound
+                pattern: str = f"%{query.split()[-1]}%"
+                like: float = best(partial(like_search, conn, pattern))
+                matches: int = conn.execute(
+                    "SELECT count(*) FROM users_search WHERE users_search MATCH ?", (db._match_query(query),)
+                ).fetchone()[0]
+                first: float = best(partial(db.search_users, query))
+                last_key: int = db.search_users(query).last_key
+                after: float = best(partial(db.search_users, query, last_key))
+                print(f"{title:<14} {matches:>8} {like:>9.2f} {first:>9.2f} {after:>13.2f}")
+            db.close_db()
+        print()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,71 @@
+"""Rows per second of the streaming participant import and export, and peak traced memory of each.
+
+Memory is traced in a second run (the import then updates the rows it inserted), since tracing slows Python down.
+
+Usage: python benchmarks/bench_transfer.py [rows ...]
+"""
+# Standard libraries imports
+import json
+import sys
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Moduls imports
+import db  # noqa: E402
+import transfer  # noqa: E402
+
+DESIRE: str = "Настольная игра, книга про космос или теплые носки."
+
+
+def write_source(path: str, rows: int) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        if path.endswith(".jsonl"):
+            file.writelines(
+                json.dumps({"id": user_id, "tg_name": f"@user{user_id}", "name": f"User {user_id}", "desire": DESIRE})
+                + "\n"
+                for user_id in range(rows)
+            )
+        else:
+            file.write("id,tg_name,name,desire\n")
+            file.writelines(f"{user_id},@user{user_id},User {user_id},{DESIRE}\n" for user_id in range(rows))
+
+
+def measure(func: Callable[[], int]) -> tuple[float, float]:
+    """Rows per second of one run and peak traced memory in MiB of another."""
+    start: float = perf_counter()
+    rows: int = func()
+    elapsed: float = perf_counter() - start
+    tracemalloc.start()
+    func()
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows / elapsed, peak / 2**20
+
+
+def main(counts: list[int]) -> None:
+    print(f"{'rows':>8} {'format':>6} | {'import':>13} {'memory':>9} | {'export':>13} {'memory':>9}")
+    for count in counts:
+        for extension in (".csv", ".jsonl"):
+            with TemporaryDirectory() as temp_dir:
+                db.DB_PATH = str(Path(temp_dir) / "bench.db")
+                db.init_db()
+                source: str = str(Path(temp_dir) / f"source{extension}")
+                write_source(source, count)
+                import_rate, import_memory = measure(partial(transfer.import_participants, source))
+                target: str = str(Path(temp_dir) / f"target{extension}")
+                export_rate, export_memory = measure(partial(transfer.export_participants, target))
+                db.close_db()
+            print(
+                f"{count:>8} {extension[1:]:>6} | {import_rate:>8.0f} rows/s {import_memory:>5.1f} MiB"
+                f" | {export_rate:>8.0f} rows/s {export_memory:>5.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
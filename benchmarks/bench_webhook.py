@@ -0,0 +1,140 @@
+"""Throughput of webhook mode vs long polling against a local stand-in for the Bot API.
+
+Every update goes through a handler that waits `--io-ms` to imitate database and API calls.
+
+Usage: python benchmarks/bench_webhook.py [--updates N] [--io-ms MS]
+"""
+# Standard libraries imports
+import sys
+from argparse import ArgumentParser
+from asyncio import Event, Semaphore, create_task, gather, run, sleep, wait_for
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Third-party libraries imports
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from aiogram.types import Message  # noqa: E402
+from aiohttp import ClientSession, web  # noqa: E402
+
+# Moduls imports
+from webhook import SECRET_HEADER, create_app  # noqa: E402
+
+TOKEN: str = "123456:BENCH"  # noqa: S105 (token of the local stand-in API)
+SECRET: str = "bench"  # noqa: S105
+
+
+def make_update(update_id: int) -> dict[str, Any]:
+    user: dict[str, Any] = {"id": update_id % 5000 + 1, "is_bot": False, "first_name": "User"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": "hello",
+        },
+    }
+
+
+def make_dispatcher(expected: int, io_ms: float) -> tuple[Dispatcher, Event]:
+    dp: Dispatcher = Dispatcher(storage=MemoryStorage())
+    done: Event = Event()
+    handled: list[int] = [0]
+
+    @dp.message()
+    async def handler(message: Message) -> None:
+        await sleep(io_ms / 1000)
+        handled[0] += 1
+        if handled[0] == expected:
+            done.set()
+
+    return dp, done
+
+
+async def fake_api(updates: list[dict[str, Any]]) -> web.AppRunner:
+    """Serves getUpdates from `updates` in batches of 100 like Telegram does."""
+
+    async def handle(request: web.Request) -> web.Response:
+        method: str = request.match_info["method"]
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 123456, "is_bot": True, "first_name": "Bench"}})
+        if method == "getUpdates":
+            form = await request.post()
+            offset: int = int(str(form.get("offset") or 0))
+            batch: list[dict[str, Any]] = [update for update in updates if update["update_id"] >= offset][:100]
+            if not batch:
+                await sleep(0.1)
+            return web.json_response({"ok": True, "result": batch})
+        return web.json_response({"ok": True, "result": True})
+
+    app: web.Application = web.Application()
+    app.router.add_post("/bot{token}/{method}", handle)
+    runner: web.AppRunner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 8781).start()
+    return runner
+
+
+async def bench_polling(count: int, io_ms: float) -> float:
+    updates: list[dict[str, Any]] = [make_update(update_id) for update_id in range(1, count + 1)]
+    api: web.AppRunner = await fake_api(updates)
+    session: AiohttpSession = AiohttpSession(api=TelegramAPIServer.from_base("http://127.0.0.1:8781"))
+    bot: Bot = Bot(TOKEN, session=session)
+    dp, done = make_dispatcher(count, io_ms)
+    start: float = perf_counter()
+    polling = create_task(dp.start_polling(bot, polling_timeout=1, handle_signals=False, close_bot_session=False))
+    await wait_for(done.wait(), timeout=600)
+    elapsed: float = perf_counter() - start
+    await dp.stop_polling()
+    await polling
+    await session.close()
+    await api.cleanup()
+    return elapsed
+
+
+async def bench_webhook(count: int, io_ms: float) -> float:
+    bot: Bot = Bot(TOKEN)
+    dp, done = make_dispatcher(count, io_ms)
+    runner: web.AppRunner = web.AppRunner(create_app(dp, bot, secret=SECRET, path="/webhook"))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 8782).start()
+    # Telegram keeps up to 40 connections open to a webhook by default
+    connections: Semaphore = Semaphore(40)
+
+    async with ClientSession() as client:
+
+        async def post(update_id: int) -> None:
+            async with connections:
+                async with client.post(
+                    "http://127.0.0.1:8782/webhook", json=make_update(update_id), headers={SECRET_HEADER: SECRET}
+                ) as response:
+                    response.raise_for_status()
+
+        start: float = perf_counter()
+        await gather(*(post(update_id) for update_id in range(1, count + 1)))
+        await wait_for(done.wait(), timeout=600)
+        elapsed: float = perf_counter() - start
+    await runner.cleanup()
+    await bot.session.close()
+    return elapsed
+
+
+async def main() -> None:
+    parser: ArgumentParser = ArgumentParser()
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--io-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    for name, bench in (("polling", bench_polling), ("webhook", bench_webhook)):
+        elapsed: float = await bench(args.updates, args.io_ms)
+        print(f"{name:<8} {args.updates} updates in {elapsed:6.2f} s  {args.updates / elapsed:8.0f} updates/s")
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,131 @@
+# Standard libraries imports
+from asyncio import Queue, gather, sleep
+from os import getenv
+from random import uniform
+from time import monotonic
+from typing import Iterable
+
+# Third-party libraries imports
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+# Moduls imports
+from schema import Delivery, DeliveryReport
+
+BROADCAST_RATE: float = float(getenv("BROADCAST_RATE", "30"))
+BROADCAST_CHAT_RATE: float = float(getenv("BROADCAST_CHAT_RATE", "1"))
+BROADCAST_RETRIES: int = int(getenv("BROADCAST_RETRIES", "3"))
+BROADCAST_CONCURRENCY: int = int(getenv("BROADCAST_CONCURRENCY", "30"))
+BACKOFF_BASE: float = 0.5
+BACKOFF_MAX: float = 30.0
+
+
+class TokenBucket:
+    """Global send budget. `pause` stops every sender until Telegram lets us continue."""
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate: float = rate
+        self.capacity: float = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens: float = self.capacity
+        self.updated: float = monotonic()
+        self.paused_until: float = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            now: float = monotonic()
+            self._refill(now)
+            if now < self.paused_until:
+                delay: float = self.paused_until - now
+            elif self.tokens >= 1:
+                self.tokens -= 1
+                return
+            else:
+                delay = (1 - self.tokens) / self.rate
+            await sleep(delay)
+
+    def active(self, window: float = 1.0) -> bool:
+        """True if a sender took a token in the last `window` seconds or sending is paused."""
+        now: float = monotonic()
+        return now - self.updated < window or now < self.paused_until
+
+    def pause(self, seconds: float) -> None:
+        until: float = monotonic() + seconds
+        if until > self.paused_until:
+            self.paused_until = until
+            self.tokens = 0
+
+
+class ChatLimiter:
+    """Spaces out messages to the same chat according to the per-chat rate."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval: float = 1 / rate
+        self.next_slot: dict[int, float] = {}
+
+    async def wait(self, chat_id: int) -> None:
+        now: float = monotonic()
+        slot: float = max(now, self.next_slot.get(chat_id, 0.0))
+        self.next_slot[chat_id] = slot + self.interval
+        if len(self.next_slot) > 10_000:
+            self.next_slot = {chat: time for chat, time in self.next_slot.items() if time > now}
+        if slot > now:
+            await sleep(slot - now)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))  # noqa: S311
+
+
+class Broadcaster:
+    def __init__(
+        self,
+        bot: Bot,
+        rate: float = BROADCAST_RATE,
+        chat_rate: float = BROADCAST_CHAT_RATE,
+        retries: int = BROADCAST_RETRIES,
+        concurrency: int = BROADCAST_CONCURRENCY,
+    ) -> None:
+        self.bot: Bot = bot
+        self.bucket: TokenBucket = TokenBucket(rate)
+        self.chats: ChatLimiter = ChatLimiter(chat_rate)
+        self.retries: int = retries
+        self.concurrency: int = concurrency
+
+    async def deliver(self, chat_id: int, text: str) -> Delivery:
+        attempts: int = 0
+        failures: int = 0
+        while True:
+            attempts += 1
+            await self.chats.wait(chat_id)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                return Delivery(chat_id=chat_id, ok=True, attempts=attempts)
+            except TelegramRetryAfter as error:
+                self.bucket.pause(error.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as error:
+                failures += 1
+                if failures > self.retries:
+                    return Delivery(chat_id=chat_id, ok=False, attempts=attempts, error=error.message)
+                await sleep(backoff_delay(failures))
+            except TelegramAPIError as error:
+                return Delivery(chat_id=chat_id, ok=False, attempts=attempts, error=error.message)
+
+    async def send(self, messages: Iterable[tuple[int, str]]) -> DeliveryReport:
+        queue: Queue[tuple[int, str]] = Queue()
+        for message in messages:
+            queue.put_nowait(message)
+        deliveries: list[Delivery] = []
+
+        async def worker() -> None:
+            while not queue.empty():
+                chat_id, text = queue.get_nowait()
+                deliveries.append(await self.deliver(chat_id, text))
+
+        await gather(*(worker() for _ in range(min(self.concurrency, queue.qsize()))))
+        return DeliveryReport(deliveries=deliveries)
@@ -0,0 +1,139 @@
+# Standard libraries imports
+from collections import OrderedDict
+from os import getenv
+from time import monotonic
+from typing import Generic, TypeVar
+
+# Third-party libraries imports
+from redis.asyncio import Redis
+
+# Moduls imports
+from schema import DEFAULT_EVENT_ID, Event, User
+
+CACHE_SIZE: int = int(getenv("CACHE_SIZE", "10000"))
+CACHE_TTL: float = float(getenv("CACHE_TTL", "300"))
+CACHE_REDIS: bool = getenv("CACHE_REDIS", "0") == "1"
+ROLL_DONE_KEY: str = "roll_done"
+# Another instance may make the draw, so "not done yet" is only cached locally with a single instance. Read here
+# and not from cluster.py, which imports this module through async_db
+CACHE_NOT_DONE: bool = int(getenv("BOT_WORKERS", "1")) == 1
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """In-process LRU cache whose entries expire `ttl` seconds after they were stored."""
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size: int = size
+        self.ttl: float = ttl
+        self.entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: K) -> V | None:
+        entry: tuple[float, V] | None = self.entries.get(key)
+        if entry is None or entry[0] < monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def peek(self, key: K) -> V | None:
+        """Like get, but does not count as a hit or miss and does not refresh the LRU order."""
+        entry: tuple[float, V] | None = self.entries.get(key)
+        return None if entry is None or entry[0] < monotonic() else entry[1]
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        self.entries[key] = (monotonic() + (self.ttl if ttl is None else ttl), value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+users: TTLCache[tuple[int, int], User] = TTLCache(CACHE_SIZE, CACHE_TTL)
+flags: TTLCache[str, bool] = TTLCache(CACHE_SIZE, CACHE_TTL)
+events: TTLCache[int, Event] = TTLCache(CACHE_SIZE, CACHE_TTL)
+# Optional shared second level for users, set with use_redis()
+l2: Redis | None = None
+
+
+def use_redis(redis: Redis) -> None:
+    global l2
+    l2 = redis
+
+
+def _user_key(user_id: int, event_id: int) -> str:
+    if event_id == DEFAULT_EVENT_ID:
+        return f"cache:user:{user_id}"
+    return f"cache:user:{event_id}:{user_id}"
+
+
+def roll_done_key(event_id: int = DEFAULT_EVENT_ID) -> str:
+    """The default event keeps the key it had before events existed."""
+    return ROLL_DONE_KEY if event_id == DEFAULT_EVENT_ID else f"{ROLL_DONE_KEY}:{event_id}"
+
+
+async def get_user(user_id: int, event_id: int = DEFAULT_EVENT_ID) -> User | None:
+    user: User | None = users.get((event_id, user_id))
+    if user is not None or l2 is None:
+        return user
+    raw: bytes | str | None = await l2.get(_user_key(user_id, event_id))
+    if raw is None:
+        return None
+    user = User.model_validate_json(raw)
+    users.set((event_id, user_id), user)
+    return user
+
+
+async def set_user(user: User, event_id: int = DEFAULT_EVENT_ID) -> None:
+    users.set((event_id, user.id), user)
+    if l2 is not None:
+        await l2.set(_user_key(user.id, event_id), user.model_dump_json(), ex=int(CACHE_TTL))
+
+
+async def invalidate_user(user_id: int, event_id: int = DEFAULT_EVENT_ID) -> None:
+    users.invalidate((event_id, user_id))
+    if l2 is not None:
+        await l2.delete(_user_key(user_id, event_id))
+
+
+async def is_roll_done(redis: Redis, fresh: bool = False, event_id: int = DEFAULT_EVENT_ID) -> bool:
+    """The flag only ever goes from "no" to "yes", so "yes" is cached for good.
+
+    "no" is cached for CACHE_TTL with a single instance and not at all with several.
+    """
+    key: str = roll_done_key(event_id)
+    done: bool | None = None if fresh else flags.get(key)
+    if done is not None:
+        return done
+    value: bytes | str | None = await redis.get(key)
+    done = (value.decode() if isinstance(value, bytes) else value) == "yes"
+    if done or CACHE_NOT_DONE:
+        flags.set(key, done, ttl=float("inf") if done else None)
+    return done
+
+
+async def set_roll_done(redis: Redis, event_id: int = DEFAULT_EVENT_ID) -> None:
+    key: str = roll_done_key(event_id)
+    await redis.set(key, "yes")
+    flags.set(key, True, ttl=float("inf"))
+
+
+def counters() -> dict[str, int]:
+    return {
+        "user_hits": users.hits,
+        "user_misses": users.misses,
+        "flag_hits": flags.hits,
+        "flag_misses": flags.misses,
+    }
@@ -0,0 +1,40 @@
+# Third-party libraries imports
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, MaybeInaccessibleMessageUnion, Message
+
+# How callback screens were shown, exported on the metrics endpoint
+counters: dict[str, int] = {"edited": 0, "unchanged": 0, "sent": 0}
+
+
+def _dump(markup: InlineKeyboardMarkup | None) -> dict[str, object] | None:
+    # Compared as plain data, since a parsed markup also carries the bot it came from
+    return None if markup is None else markup.model_dump(exclude_none=True)
+
+
+async def show(query: CallbackQuery, text: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+    """Show `text` in the message whose button was pressed instead of sending a new one.
+
+    Nothing is sent if the message already shows the same text and keyboard. A message that can no longer be
+    edited is replaced by a new message.
+    """
+    message: MaybeInaccessibleMessageUnion | None = query.message
+    if isinstance(message, Message) and message.text is not None:
+        if message.text == text and _dump(message.reply_markup) == _dump(reply_markup):
+            counters["unchanged"] += 1
+            return
+        try:
+            await message.edit_text(text, reply_markup=reply_markup)
+        except TelegramBadRequest as error:
+            # Telegram trims text, so a screen may be the same although the strings differ
+            if "message is not modified" in error.message:
+                counters["unchanged"] += 1
+                return
+        else:
+            counters["edited"] += 1
+            return
+    bot: Bot | None = query.bot
+    if bot is None:
+        raise RuntimeError("Callback query is not bound to a bot")
+    await bot.send_message(query.from_user.id, text, reply_markup=reply_markup)
+    counters["sent"] += 1
@@ -0,0 +1,109 @@
+# Standard libraries imports
+import logging
+from asyncio import Event as Signal
+from asyncio import sleep, wait_for
+from os import getenv
+
+# Third-party libraries imports
+from aiogram import Bot
+from redis.asyncio import Redis
+
+# Moduls imports
+from async_db import claim_outbox, claim_report, finish_outbox, get_delivery_report, get_event
+from broadcast import Broadcaster, backoff_delay
+from schema import DEFAULT_EVENT_ID, DeliveryReport, Event
+
+BOT_WORKERS: int = int(getenv("BOT_WORKERS", "1"))
+DRAW_LOCK_TTL_MS: int = int(getenv("DRAW_LOCK_TTL_MS", "600000"))
+DRAW_LOCK_KEY: str = "lock:draw"
+# Counter that gives every lock holder its own token
+LOCK_COUNTER_KEY: str = "lock:draw:fence"
+OUTBOX_BATCH: int = int(getenv("OUTBOX_BATCH", "100"))
+OUTBOX_POLL_SECONDS: float = float(getenv("OUTBOX_POLL_SECONDS", "2"))
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Deletes the lock only if it still holds our token
+RELEASE_SCRIPT: str = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class DrawLock:
+    """Cluster-wide lock around the draw, so two admins or instances do not compute it at the same time.
+
+    Every acquisition gets its own token, which only lets the holder release the lock. The lock expires, so it
+    does not by itself prevent a second draw: db.save_draw stores the first draw of an event and refuses the rest.
+    """
+
+    @classmethod
+    def for_event(cls, redis: Redis, event_id: int = DEFAULT_EVENT_ID) -> "DrawLock":
+        """Draws of different events do not block each other; the default event keeps the old key."""
+        return cls(redis, DRAW_LOCK_KEY if event_id == DEFAULT_EVENT_ID else f"{DRAW_LOCK_KEY}:{event_id}")
+
+    def __init__(self, redis: Redis, key: str = DRAW_LOCK_KEY, ttl_ms: int = DRAW_LOCK_TTL_MS) -> None:
+        self.redis: Redis = redis
+        self.key: str = key
+        self.ttl_ms: int = ttl_ms
+
+    async def acquire(self) -> int | None:
+        token: int = await self.redis.incr(LOCK_COUNTER_KEY)
+        acquired: bool | str | bytes | None = await self.redis.set(self.key, token, nx=True, px=self.ttl_ms)
+        return token if acquired else None
+
+    async def release(self, token: int) -> bool:
+        return bool(await self.redis.eval(RELEASE_SCRIPT, 1, self.key, token))
+
+
+# Set by the process that saved a draw so its worker does not wait for the next poll
+outbox_ready: Signal = Signal()
+
+
+async def run_outbox_worker(
+    bot: Bot,
+    broadcaster: Broadcaster,
+    admin_id: int,
+    batch: int = OUTBOX_BATCH,
+    poll: float = OUTBOX_POLL_SECONDS,
+) -> None:
+    """Deliver messages from the outbox until cancelled. Workers claim batches, so they share the load.
+
+    Messages claimed by a worker that died are picked up again after OUTBOX_CLAIM_TIMEOUT, so a restart resumes
+    the broadcast. The worker that finds the outbox of an event drained first sends the report to the event's admin,
+    or to `admin_id` if the event has none. A failed batch (a locked database, redis or Telegram down) is logged
+    and retried with backoff, its claimed messages are picked up again after OUTBOX_CLAIM_TIMEOUT.
+    """
+    failures: int = 0
+    while True:
+        try:
+            if not await deliver_batch(bot, broadcaster, admin_id, batch):
+                try:
+                    await wait_for(outbox_ready.wait(), poll)
+                except TimeoutError:
+                    pass
+                outbox_ready.clear()
+        except Exception:
+            failures += 1
+            logger.exception("Outbox delivery failed")
+            await sleep(backoff_delay(failures))
+            continue
+        failures = 0
+
+
+async def deliver_batch(bot: Bot, broadcaster: Broadcaster, admin_id: int, batch: int = OUTBOX_BATCH) -> bool:
+    """Send one claimed batch and the report if it drained the event's outbox. Returns False if nothing was due."""
+    event_id, messages = await claim_outbox(batch)
+    if not messages:
+        return False
+    report: DeliveryReport = await broadcaster.send(messages)
+    await finish_outbox(report.deliveries, event_id)
+    if await claim_report(event_id):
+        event: Event | None = await get_event(event_id)
+        await bot.send_message(
+            chat_id=event.admin_id if event is not None and event.admin_id else admin_id,
+            text=str(await get_delivery_report(event_id)),
+        )
+    return True
@@ -1,16 +1,81 @@
 # Standard libraries imports
+import re
 from contextlib import contextmanager
+from itertools import batched
+from os import getenv
 from sqlite3 import Connection, Cursor, connect
-from typing import Iterator
+from threading import Lock, local
+from time import time
+from typing import Iterable, Iterator
 
 # Moduls imports
-from schema import Statistics, User, UserStatistics
+from schema import (
+    DEFAULT_EVENT_ID,
+    Delivery,
+    DeliveryProgress,
+    DeliveryReport,
+    Event,
+    SearchResults,
+    Statistics,
+    User,
+    UserRow,
+    UserStatistics,
+)
 
 DB_PATH: str = "/data/database.db"
+DB_CACHE_KIB: int = int(getenv("DB_CACHE_KIB", "16384"))
+DB_MMAP_SIZE: int = int(getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_CACHED_STATEMENTS: int = 256
+STATISTICS_PAGE_SIZE: int = 25
+IMPORT_CHUNK: int = int(getenv("IMPORT_CHUNK", "1000"))
+OUTBOX_CLAIM_TIMEOUT: float = float(getenv("OUTBOX_CLAIM_TIMEOUT", "300"))
+
+_local: local = local()
+_connections: list[Connection] = []
+_connections_lock: Lock = Lock()
+_generation: int = 0
+
+def _connect(path: str) -> Connection:
+    conn: Connection = connect(path, check_same_thread=False, cached_statements=DB_CACHED_STATEMENTS)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+def get_connection() -> Connection:
+    """Long-lived connection of the current thread, reopened if DB_PATH changes or close_db was called."""
+    conn: Connection | None = getattr(_local, "conn", None)
+    key: tuple[str, int] = (DB_PATH, _generation)
+    if conn is not None and _local.key == key:
+        return conn
+    if conn is not None:
+        _forget(conn)
+    conn = _connect(DB_PATH)
+    _local.conn, _local.key = conn, key
+    with _connections_lock:
+        _connections.append(conn)
+    return conn
+
+def _forget(conn: Connection) -> None:
+    with _connections_lock:
+        if conn in _connections:
+            _connections.remove(conn)
+    conn.close()
+
+def close_db() -> None:
+    global _generation
+    with _connections_lock:
+        connections: list[Connection] = _connections.copy()
+        _connections.clear()
+        _generation += 1
+    for conn in connections:
+        conn.close()
 
 @contextmanager
 def db_connection() -> Iterator[Cursor]:
-    conn: Connection = connect(DB_PATH)
+    conn: Connection = get_connection()
     cursor: Cursor = conn.cursor()
     try:
         yield cursor
@@ -19,11 +84,13 @@ def db_connection() -> Iterator[Cursor]:
         conn.rollback()
         raise
     finally:
-        conn.close()
+        cursor.close()
 
-def init_db() -> None:
-    with db_connection() as cursor:
-        cursor.execute("""
+# Each migration runs in its own transaction and bumps PRAGMA user_version.
+# Version 1 is written with IF NOT EXISTS so it also adopts databases created before migrations existed.
+MIGRATIONS: list[tuple[str, ...]] = [
+    (
+        """
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY,
                 tg_name TEXT DEFAULT '',
@@ -31,52 +98,655 @@ def init_db() -> None:
                 desire TEXT DEFAULT '',
                 is_registered BOOLEAN DEFAULT 0
             )
-        """)
+        """,
+        # User counters kept up to date by triggers, so statistics do not scan the table
+        "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO counters SELECT 'total', COUNT(*) FROM users",
+        "INSERT OR IGNORE INTO counters SELECT 'registered', COUNT(*) FROM users WHERE is_registered = 1",
+        """
+            CREATE TRIGGER IF NOT EXISTS users_count_insert AFTER INSERT ON users BEGIN
+                UPDATE counters SET value = value + 1 WHERE name = 'total';
+                UPDATE counters SET value = value + NEW.is_registered WHERE name = 'registered';
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS users_count_delete AFTER DELETE ON users BEGIN
+                UPDATE counters SET value = value - 1 WHERE name = 'total';
+                UPDATE counters SET value = value - OLD.is_registered WHERE name = 'registered';
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS users_count_update AFTER UPDATE OF is_registered ON users BEGIN
+                UPDATE counters SET value = value + NEW.is_registered - OLD.is_registered WHERE name = 'registered';
+            END
+        """,
+        # The draw is saved before anything is sent, and messages are delivered from the outbox
+        """
+            CREATE TABLE IF NOT EXISTS draws (
+                id INTEGER PRIMARY KEY,
+                token INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                reported BOOLEAN DEFAULT 0
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS pairs (
+                giver_id INTEGER PRIMARY KEY,
+                recipient_id INTEGER NOT NULL,
+                draw_id INTEGER NOT NULL REFERENCES draws (id)
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS outbox (
+                chat_id INTEGER PRIMARY KEY,
+                text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT NOT NULL DEFAULT '',
+                claimed_at REAL
+            )
+        """,
+        "CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, claimed_at)",
+    ),
+    (
+        # Event/tenant column and a partial index for the draw-time query
+        "ALTER TABLE users ADD COLUMN event_id INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX users_registered ON users (id, tg_name, name) WHERE is_registered = 1",
+    ),
+    (
+        # Desires can be long, keep them out of the rows scanned by statistics and the draw
+        """
+            CREATE TABLE user_desires (
+                user_id INTEGER PRIMARY KEY REFERENCES users (id),
+                desire TEXT NOT NULL DEFAULT ''
+            )
+        """,
+        "INSERT INTO user_desires (user_id, desire) SELECT id, desire FROM users WHERE desire != ''",
+        "ALTER TABLE users DROP COLUMN desire",
+    ),
+    (
+        # Events: every table is partitioned by event_id, which leads each primary key
+        """
+            CREATE TABLE events (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL DEFAULT '',
+                admin_id INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL DEFAULT 0
+            )
+        """,
+        "INSERT INTO events (id) VALUES (0)",
+        "CREATE INDEX events_admin ON events (admin_id)",
+        "DROP TRIGGER users_count_insert",
+        "DROP TRIGGER users_count_delete",
+        "DROP TRIGGER users_count_update",
+        """
+            CREATE TABLE users_new (
+                event_id INTEGER NOT NULL DEFAULT 0,
+                id INTEGER NOT NULL,
+                tg_name TEXT DEFAULT '',
+                name TEXT DEFAULT '',
+                is_registered BOOLEAN DEFAULT 0,
+                PRIMARY KEY (event_id, id)
+            )
+        """,
+        "INSERT INTO users_new SELECT event_id, id, tg_name, name, is_registered FROM users",
+        """
+            CREATE TABLE user_desires_new (
+                event_id INTEGER NOT NULL DEFAULT 0,
+                user_id INTEGER NOT NULL,
+                desire TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (event_id, user_id)
+            )
+        """,
+        "INSERT INTO user_desires_new SELECT 0, user_id, desire FROM user_desires",
+        """
+            CREATE TABLE counters_new (
+                event_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                value INTEGER NOT NULL,
+                PRIMARY KEY (event_id, name)
+            )
+        """,
+        "INSERT INTO counters_new SELECT 0, name, value FROM counters",
+        """
+            CREATE TABLE pairs_new (
+                event_id INTEGER NOT NULL DEFAULT 0,
+                giver_id INTEGER NOT NULL,
+                recipient_id INTEGER NOT NULL,
+                draw_id INTEGER NOT NULL REFERENCES draws (id),
+                PRIMARY KEY (event_id, giver_id)
+            )
+        """,
+        "INSERT INTO pairs_new SELECT 0, giver_id, recipient_id, draw_id FROM pairs",
+        """
+            CREATE TABLE outbox_new (
+                event_id INTEGER NOT NULL DEFAULT 0,
+                chat_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT NOT NULL DEFAULT '',
+                claimed_at REAL,
+                PRIMARY KEY (event_id, chat_id)
+            )
+        """,
+        "INSERT INTO outbox_new SELECT 0, chat_id, text, status, attempts, error, claimed_at FROM outbox",
+        "DROP TABLE user_desires",
+        "DROP TABLE users",
+        "DROP TABLE counters",
+        "DROP TABLE pairs",
+        "DROP TABLE outbox",
+        "ALTER TABLE users_new RENAME TO users",
+        "ALTER TABLE user_desires_new RENAME TO user_desires",
+        "ALTER TABLE counters_new RENAME TO counters",
+        "ALTER TABLE pairs_new RENAME TO pairs",
+        "ALTER TABLE outbox_new RENAME TO outbox",
+        "CREATE INDEX users_registered ON users (event_id, id, tg_name, name) WHERE is_registered = 1",
+        "CREATE INDEX outbox_status ON outbox (status, claimed_at)",
+        "ALTER TABLE draws ADD COLUMN event_id INTEGER NOT NULL DEFAULT 0",
+        "CREATE UNIQUE INDEX draws_event ON draws (event_id)",
+        """
+            CREATE TRIGGER users_count_insert AFTER INSERT ON users BEGIN
+                INSERT INTO counters (event_id, name, value)
+                VALUES (NEW.event_id, 'total', 1), (NEW.event_id, 'registered', NEW.is_registered)
+                ON CONFLICT (event_id, name) DO UPDATE SET value = value + excluded.value;
+            END
+        """,
+        """
+            CREATE TRIGGER users_count_delete AFTER DELETE ON users BEGIN
+                UPDATE counters SET value = value - 1 WHERE event_id = OLD.event_id AND name = 'total';
+                UPDATE counters SET value = value - OLD.is_registered
+                WHERE event_id = OLD.event_id AND name = 'registered';
+            END
+        """,
+        """
+            CREATE TRIGGER users_count_update AFTER UPDATE OF is_registered ON users BEGIN
+                UPDATE counters SET value = value + NEW.is_registered - OLD.is_registered
+                WHERE event_id = NEW.event_id AND name = 'registered';
+            END
+        """,
+    ),
+    (
+        # Exclusion rules for the draw: giver_id may not draw recipient_id
+        """
+            CREATE TABLE exclusions (
+                event_id INTEGER NOT NULL,
+                giver_id INTEGER NOT NULL,
+                recipient_id INTEGER NOT NULL,
+                PRIMARY KEY (event_id, giver_id, recipient_id)
+            ) WITHOUT ROWID
+        """,
+    ),
+    (
+        # Full-text search over participants. users has no stable rowid (VACUUM may renumber it), so search_ids
+        # gives every user a fixed key that is the rowid of its row in the FTS5 index.
+        """
+            CREATE TABLE search_ids (
+                id INTEGER PRIMARY KEY,
+                event_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                UNIQUE (event_id, user_id)
+            )
+        """,
+        """
+            CREATE VIRTUAL TABLE users_search USING fts5(
+                tg_name, name, desire, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )
+        """,
+        "INSERT INTO search_ids (event_id, user_id) SELECT event_id, id FROM users ORDER BY event_id, id",
+        """
+            INSERT INTO users_search (rowid, tg_name, name, desire)
+            SELECT search_ids.id, COALESCE(tg_name, ''), COALESCE(name, ''), COALESCE(desire, '') FROM search_ids
+            JOIN users ON users.event_id = search_ids.event_id AND users.id = search_ids.user_id
+            LEFT JOIN user_desires
+                ON user_desires.event_id = search_ids.event_id AND user_desires.user_id = search_ids.user_id
+        """,
+        """
+            CREATE TRIGGER users_search_insert AFTER INSERT ON users BEGIN
+                INSERT INTO search_ids (event_id, user_id) VALUES (NEW.event_id, NEW.id);
+                INSERT INTO users_search (rowid, tg_name, name, desire)
+                VALUES (last_insert_rowid(), COALESCE(NEW.tg_name, ''), COALESCE(NEW.name, ''), '');
+            END
+        """,
+        """
+            CREATE TRIGGER users_search_update AFTER UPDATE OF tg_name, name ON users
+            WHEN OLD.tg_name IS NOT NEW.tg_name OR OLD.name IS NOT NEW.name BEGIN
+                UPDATE users_search SET tg_name = COALESCE(NEW.tg_name, ''), name = COALESCE(NEW.name, '')
+                WHERE rowid = (SELECT id FROM search_ids WHERE event_id = NEW.event_id AND user_id = NEW.id);
+            END
+        """,
+        """
+            CREATE TRIGGER users_search_delete AFTER DELETE ON users BEGIN
+                DELETE FROM users_search
+                WHERE rowid = (SELECT id FROM search_ids WHERE event_id = OLD.event_id AND user_id = OLD.id);
+                DELETE FROM search_ids WHERE event_id = OLD.event_id AND user_id = OLD.id;
+            END
+        """,
+        """
+            CREATE TRIGGER user_desires_search_insert AFTER INSERT ON user_desires BEGIN
+                UPDATE users_search SET desire = NEW.desire
+                WHERE rowid = (SELECT id FROM search_ids WHERE event_id = NEW.event_id AND user_id = NEW.user_id);
+            END
+        """,
+        """
+            CREATE TRIGGER user_desires_search_update AFTER UPDATE OF desire ON user_desires
+            WHEN OLD.desire IS NOT NEW.desire BEGIN
+                UPDATE users_search SET desire = NEW.desire
+                WHERE rowid = (SELECT id FROM search_ids WHERE event_id = NEW.event_id AND user_id = NEW.user_id);
+            END
+        """,
+    ),
+    (
+        # Reminders for unfinished registrations. Users created before this migration count as joined now, so they
+        # are not all due at once right after the upgrade. The partial index holds exactly the users the reminder
+        # scan still has to look at.
+        "ALTER TABLE users ADD COLUMN created_at REAL",
+        "ALTER TABLE users ADD COLUMN reminded_at REAL",
+        "UPDATE users SET created_at = unixepoch()",
+        "CREATE INDEX users_unreminded ON users (event_id, id) WHERE is_registered = 0 AND reminded_at IS NULL",
+    ),
+    (
+        # The event every user currently takes part in, so it survives a lost FSM state. Users already in several
+        # events keep the latest one.
+        "CREATE TABLE memberships (user_id INTEGER PRIMARY KEY, event_id INTEGER NOT NULL)",
+        "INSERT INTO memberships (user_id, event_id) SELECT id, MAX(event_id) FROM users GROUP BY id",
+    ),
+]
+
+def migrate(conn: Connection) -> int:
+    """Apply pending migrations and return the resulting schema version.
+
+    The version is read inside the write transaction of every migration, so when several instances start together
+    each migration is applied by whichever gets the lock first and skipped by the others.
+    """
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version: int = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.commit()
+                return version
+            for statement in MIGRATIONS[version]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
-def add_user(user_id: int, tg_name: str) -> None:
+def init_db() -> None:
+    migrate(get_connection())
+
+def create_event(title: str, admin_id: int) -> Event:
     with db_connection() as cursor:
         cursor.execute("""
-            INSERT OR IGNORE INTO users (id, tg_name)
-            VALUES (?, ?)
-        """, (user_id, tg_name))
+            INSERT INTO events (title, admin_id, created_at)
+            VALUES (?, ?, ?)
+        """, (title, admin_id, time()))
+        event_id: int = cursor.lastrowid or 0
+    return Event(id=event_id, title=title, admin_id=admin_id)
+
+def set_event_admin(event_id: int, admin_id: int) -> None:
+    with db_connection() as cursor:
+        cursor.execute("UPDATE events SET admin_id = ? WHERE id = ?", (admin_id, event_id))
+
+def get_event(event_id: int) -> Event | None:
+    with db_connection() as cursor:
+        cursor.execute("SELECT id, title, admin_id FROM events WHERE id = ?", (event_id,))
+        row: tuple[int, str, int] | None = cursor.fetchone()
+    if row is None:
+        return None
+    return Event(id=row[0], title=row[1], admin_id=row[2])
+
+def add_exclusions(pairs: list[tuple[int, int]], event_id: int = DEFAULT_EVENT_ID) -> None:
+    with db_connection() as cursor:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO exclusions (event_id, giver_id, recipient_id) VALUES (?, ?, ?)",
+            ((event_id, giver_id, recipient_id) for giver_id, recipient_id in pairs),
+        )
+
+def get_exclusions(event_id: int = DEFAULT_EVENT_ID) -> dict[int, set[int]]:
+    exclusions: dict[int, set[int]] = {}
+    with db_connection() as cursor:
+        cursor.execute("SELECT giver_id, recipient_id FROM exclusions WHERE event_id = ?", (event_id,))
+        for giver_id, recipient_id in cursor.fetchall():
+            exclusions.setdefault(giver_id, set()).add(recipient_id)
+    return exclusions
+
+JOIN_EVENT: str = """
+    INSERT INTO memberships (user_id, event_id) VALUES (?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET event_id = excluded.event_id
+"""
+
+def add_user(user_id: int, tg_name: str, event_id: int = DEFAULT_EVENT_ID) -> None:
+    """Add the user to the event and make it the event they take part in."""
+    with db_connection() as cursor:
+        cursor.execute("""
+            INSERT OR IGNORE INTO users (event_id, id, tg_name, created_at)
+            VALUES (?, ?, ?, unixepoch())
+        """, (event_id, user_id, tg_name))
+        cursor.execute(JOIN_EVENT, (user_id, event_id))
+
+def get_membership(user_id: int) -> int | None:
+    """Event the user joined last, or None for a user the bot has never seen."""
+    with db_connection() as cursor:
+        cursor.execute("SELECT event_id FROM memberships WHERE user_id = ?", (user_id,))
+        row: tuple[int] | None = cursor.fetchone()
+    return None if row is None else row[0]
 
-def update_name(user_id: int, name: str) -> None:
+def update_name(user_id: int, name: str, event_id: int = DEFAULT_EVENT_ID) -> None:
     with db_connection() as cursor:
         cursor.execute("""
             UPDATE users SET name = ?
-            WHERE id = ?
-        """, (name, user_id))
+            WHERE event_id = ? AND id = ?
+        """, (name, event_id, user_id))
+
+UPSERT_DESIRE: str = """
+    INSERT INTO user_desires (event_id, user_id, desire)
+    SELECT event_id, id, ? FROM users WHERE event_id = ? AND id = ?
+    ON CONFLICT (event_id, user_id) DO UPDATE SET desire = excluded.desire
+"""
+SET_REGISTERED: str = "UPDATE users SET is_registered = 1 WHERE event_id = ? AND id = ?"
+
+def update_desire(user_id: int, desire: str, event_id: int = DEFAULT_EVENT_ID) -> None:
+    with db_connection() as cursor:
+        cursor.execute(UPSERT_DESIRE, (desire, event_id, user_id))
+        cursor.execute(SET_REGISTERED, (event_id, user_id))
+
+def apply_batch(
+    new_users: list[tuple[int, int, str]], names: list[tuple[str, int, int]], desires: list[tuple[str, int, int]]
+) -> None:
+    """Apply a batch of registration updates in one transaction. Rows are in the parameter order of the queries."""
+    with db_connection() as cursor:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO users (event_id, id, tg_name, created_at) VALUES (?, ?, ?, unixepoch())", new_users
+        )
+        cursor.executemany(JOIN_EVENT, ((user_id, event_id) for event_id, user_id, _ in new_users))
+        cursor.executemany("UPDATE users SET name = ? WHERE event_id = ? AND id = ?", names)
+        cursor.executemany(UPSERT_DESIRE, desires)
+        cursor.executemany(SET_REGISTERED, ((event_id, user_id) for _, event_id, user_id in desires))
 
-def update_desire(user_id: int, desire: str) -> None:
+UPSERT_USER: str = """
+    INSERT INTO users (event_id, id, tg_name, name, is_registered, created_at) VALUES (?, ?, ?, ?, ?, unixepoch())
+    ON CONFLICT (event_id, id) DO UPDATE SET
+        tg_name = excluded.tg_name,
+        name = excluded.name,
+        is_registered = MAX(is_registered, excluded.is_registered)
+"""
+
+IMPORT_MEMBERSHIP: str = "INSERT OR IGNORE INTO memberships (user_id, event_id) VALUES (?, ?)"
+
+def import_users(users: Iterable[User], event_id: int = DEFAULT_EVENT_ID, chunk: int = IMPORT_CHUNK) -> int:
+    """Insert or update users from a stream in one transaction, `chunk` rows per executemany.
+
+    Users with both a name and a desire are registered, users the bot has not seen yet become members of the event.
+    Returns the number of imported users.
+    """
+    count: int = 0
+    with db_connection() as cursor:
+        for batch in batched(users, chunk, strict=False):
+            cursor.executemany(UPSERT_USER, (
+                (event_id, user.id, user.tg_name, user.name, bool(user.name and user.desire)) for user in batch
+            ))
+            cursor.executemany(UPSERT_DESIRE, ((user.desire, event_id, user.id) for user in batch if user.desire))
+            cursor.executemany(IMPORT_MEMBERSHIP, ((user.id, event_id) for user in batch))
+            count += len(batch)
+    return count
+
+def iter_participants(event_id: int = DEFAULT_EVENT_ID) -> Iterator[tuple[int, str, str, str, int]]:
+    """Stream (id, tg_name, name, desire, is_registered) of every user of the event straight from the cursor."""
     with db_connection() as cursor:
         cursor.execute("""
-            UPDATE users SET desire = ?, is_registered = 1
-            WHERE id = ?
-        """, (desire, user_id))
+            SELECT users.id, COALESCE(tg_name, ''), COALESCE(name, ''), COALESCE(desire, ''), is_registered FROM users
+            LEFT JOIN user_desires ON user_desires.event_id = users.event_id AND user_desires.user_id = users.id
+            WHERE users.event_id = ? ORDER BY users.id
+        """, (event_id,))
+        yield from cursor
 
-def get_user(user_id: int) -> User | None:
+def iter_pairs(event_id: int = DEFAULT_EVENT_ID) -> Iterator[tuple[int, str, str, int, str, str]]:
+    """Stream (giver id, tg_name, name, recipient id, tg_name, name) of the event's draw."""
     with db_connection() as cursor:
-        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        row: tuple[int, str , str , str, int] | None = cursor.fetchone()
+        cursor.execute("""
+            SELECT pairs.giver_id, COALESCE(givers.tg_name, ''), COALESCE(givers.name, ''),
+                pairs.recipient_id, COALESCE(recipients.tg_name, ''), COALESCE(recipients.name, '')
+            FROM pairs
+            LEFT JOIN users AS givers ON givers.event_id = pairs.event_id AND givers.id = pairs.giver_id
+            LEFT JOIN users AS recipients ON recipients.event_id = pairs.event_id AND recipients.id = pairs.recipient_id
+            WHERE pairs.event_id = ? ORDER BY pairs.giver_id
+        """, (event_id,))
+        yield from cursor
+
+def get_user(user_id: int, event_id: int = DEFAULT_EVENT_ID) -> User | None:
+    with db_connection() as cursor:
+        cursor.execute("""
+            SELECT users.id, tg_name, name, COALESCE(desire, '') FROM users
+            LEFT JOIN user_desires ON user_desires.event_id = users.event_id AND user_desires.user_id = users.id
+            WHERE users.event_id = ? AND users.id = ?
+        """, (event_id, user_id))
+        row: tuple[int, str , str , str] | None = cursor.fetchone()
     if row is None:
         return None
     user: User = User(id=row[0], tg_name=row[1], name=row[2], desire=row[3])
     return user
 
-def get_statistics() -> Statistics:
+def get_statistics(
+    after_id: int | None = None,
+    before_id: int | None = None,
+    limit: int = STATISTICS_PAGE_SIZE,
+    event_id: int = DEFAULT_EVENT_ID,
+) -> Statistics:
+    """Counters plus one keyset page of users: the first page, the page after `after_id` or before `before_id`."""
     with db_connection() as cursor:
-        cursor.execute("SELECT tg_name, name, is_registered FROM users")
-        rows: list[tuple[str, str, int]] = cursor.fetchall()
-        statistics: Statistics = Statistics(users=[
-            UserStatistics(tg_name=row[0], name=row[1], is_registered=bool(row[2])) for row in rows
-        ])
+        cursor.execute("SELECT name, value FROM counters WHERE event_id = ?", (event_id,))
+        counters: dict[str, int] = dict(cursor.fetchall())
+        if before_id is not None:
+            cursor.execute("""
+                SELECT id, tg_name, name, is_registered FROM users
+                WHERE event_id = ? AND id < ? ORDER BY id DESC LIMIT ?
+            """, (event_id, before_id, limit))
+            rows: list[tuple[int, str, str, int]] = cursor.fetchall()[::-1]
+        else:
+            cursor.execute("""
+                SELECT id, tg_name, name, is_registered FROM users
+                WHERE event_id = ? AND id > ? ORDER BY id LIMIT ?
+            """, (event_id, after_id if after_id is not None else -1, limit))
+            rows = cursor.fetchall()
+        has_prev: bool = False
+        has_next: bool = False
+        if rows:
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM users WHERE event_id = ? AND id < ?)", (event_id, rows[0][0]))
+            has_prev = bool(cursor.fetchone()[0])
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM users WHERE event_id = ? AND id > ?)", (event_id, rows[-1][0]))
+            has_next = bool(cursor.fetchone()[0])
+        statistics: Statistics = Statistics(
+            users=[UserStatistics(id=row[0], tg_name=row[1], name=row[2], is_registered=bool(row[3])) for row in rows],
+            total_count=counters.get("total", 0),
+            registered_count=counters.get("registered", 0),
+            has_prev=has_prev,
+            has_next=has_next,
+        )
     return statistics
 
-def get_data() -> list[User]:
+def _match_query(text: str) -> str:
+    """FTS5 query that finds rows with a word starting with every word of `text`, with FTS syntax quoted away."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+# CROSS JOIN keeps the FTS index as the outer loop, so a rare word costs a few lookups instead of a MATCH per user.
+# Pages are keyed by the index rowid, which FTS5 can seek and order by itself, i.e. users come in the order they joined.
+SEARCH_USERS: str = """
+    SELECT users_search.rowid, users.id, COALESCE(users.tg_name, ''), COALESCE(users.name, ''), users.is_registered
+    FROM users_search
+    CROSS JOIN search_ids ON search_ids.id = users_search.rowid
+    CROSS JOIN users ON users.event_id = search_ids.event_id AND users.id = search_ids.user_id
+    WHERE users_search MATCH ? AND users_search.rowid {} ? AND search_ids.event_id = ?
+    ORDER BY users_search.rowid {} LIMIT ?
+"""
+
+def search_users(
+    text: str,
+    after_key: int | None = None,
+    before_key: int | None = None,
+    limit: int = STATISTICS_PAGE_SIZE,
+    event_id: int = DEFAULT_EVENT_ID,
+) -> SearchResults:
+    """Users whose tg_name, name or desire has words starting with the words of `text`, one keyset page at a time.
+
+    Pages are addressed by the `first_key`/`last_key` of the neighbouring page.
+    """
+    query: str = _match_query(text)
+    if not query:
+        return SearchResults(query=text, users=[])
     with db_connection() as cursor:
-        cursor.execute("SELECT * FROM users WHERE is_registered = 1")
-        rows: list[tuple[int, str , str , str, int]] = cursor.fetchall()
-        users: list[User] = [
-            User(id=row[0], tg_name=row[1], name=row[2], desire=row[3]) for row in rows
-        ]
+        # One row past the page tells whether there is more in that direction
+        if before_key is not None:
+            cursor.execute(SEARCH_USERS.format("<", "DESC"), (query, before_key, event_id, limit + 1))
+            rows: list[tuple[int, int, str, str, int]] = cursor.fetchall()
+            has_prev, has_next = len(rows) > limit, True
+            rows = rows[:limit][::-1]
+        else:
+            cursor.execute(
+                SEARCH_USERS.format(">", "ASC"), (query, after_key if after_key is not None else 0, event_id, limit + 1)
+            )
+            rows = cursor.fetchall()
+            has_prev, has_next = after_key is not None, len(rows) > limit
+            rows = rows[:limit]
+    if not rows:
+        return SearchResults(query=text, users=[])
+    return SearchResults(
+        query=text,
+        users=[UserStatistics(id=row[1], tg_name=row[2], name=row[3], is_registered=bool(row[4])) for row in rows],
+        first_key=rows[0][0],
+        last_key=rows[-1][0],
+        has_prev=has_prev,
+        has_next=has_next,
+    )
+
+def get_data(event_id: int = DEFAULT_EVENT_ID) -> list[UserRow]:
+    with db_connection() as cursor:
+        cursor.execute("""
+            SELECT users.id, COALESCE(tg_name, ''), COALESCE(name, ''), COALESCE(desire, '') FROM users
+            LEFT JOIN user_desires ON user_desires.event_id = users.event_id AND user_desires.user_id = users.id
+            WHERE users.event_id = ? AND is_registered = 1
+        """, (event_id,))
+        users: list[UserRow] = list(map(UserRow._make, cursor))
     return users
+
+def save_draw(
+    token: int, pairs: list[tuple[int, int]], messages: list[tuple[int, str]], event_id: int = DEFAULT_EVENT_ID
+) -> bool:
+    """Store the pairs and their messages in one transaction. Returns False if the event already has a draw."""
+    with db_connection() as cursor:
+        cursor.execute("""
+            INSERT INTO draws (event_id, token, created_at)
+            SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM draws WHERE event_id = ?)
+        """, (event_id, token, time(), event_id))
+        if cursor.rowcount == 0:
+            return False
+        draw_id: int | None = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO pairs (event_id, giver_id, recipient_id, draw_id) VALUES (?, ?, ?, ?)",
+            ((event_id, giver_id, recipient_id, draw_id) for giver_id, recipient_id in pairs),
+        )
+        cursor.executemany(
+            "INSERT INTO outbox (event_id, chat_id, text) VALUES (?, ?, ?)",
+            ((event_id, chat_id, text) for chat_id, text in messages),
+        )
+    return True
+
+def claim_outbox(limit: int) -> tuple[int, list[tuple[int, str]]]:
+    """Mark up to `limit` messages of one event as being sent by this worker, including ones abandoned by a dead
+    worker. Returns the event id and the claimed (chat_id, text) messages.
+    """
+    now: float = time()
+    with db_connection() as cursor:
+        cursor.execute("""
+            WITH target AS (
+                SELECT event_id FROM outbox
+                WHERE status = 'pending' OR (status = 'sending' AND claimed_at < :stale)
+                LIMIT 1
+            )
+            UPDATE outbox SET status = 'sending', claimed_at = :now
+            WHERE event_id = (SELECT event_id FROM target) AND chat_id IN (
+                SELECT chat_id FROM outbox
+                WHERE event_id = (SELECT event_id FROM target)
+                    AND (status = 'pending' OR (status = 'sending' AND claimed_at < :stale))
+                LIMIT :limit
+            )
+            RETURNING event_id, chat_id, text
+        """, {"now": now, "stale": now - OUTBOX_CLAIM_TIMEOUT, "limit": limit})
+        rows: list[tuple[int, int, str]] = cursor.fetchall()
+    if not rows:
+        return DEFAULT_EVENT_ID, []
+    return rows[0][0], [(row[1], row[2]) for row in rows]
+
+REMINDER_PAGE: str = """
+    SELECT event_id, id FROM users
+    WHERE is_registered = 0 AND reminded_at IS NULL AND (event_id, id) > (:event_id, :user_id)
+    ORDER BY event_id, id LIMIT :limit
+"""
+
+def claim_reminders(
+    after: tuple[int, int], joined_before: float, limit: int
+) -> tuple[tuple[int, int] | None, list[tuple[int, int]]]:
+    """Look at the next `limit` unregistered users that were not reminded yet, in (event_id, id) order after the
+    keyset cursor `after`, and mark the ones that joined before `joined_before` as reminded now. Users of events
+    with a saved draw are left alone, events drawn before draws were saved are only known to redis (roll_done).
+
+    Returns the cursor for the next call, None once the scan reached the end, and the claimed (event_id, user_id).
+    Claiming is one statement, so several workers never remind the same user.
+    """
+    params: dict[str, float] = {
+        "event_id": after[0], "user_id": after[1], "limit": limit, "now": time(), "joined_before": joined_before,
+    }
+    with db_connection() as cursor:
+        cursor.execute(REMINDER_PAGE, params)
+        page: list[tuple[int, int]] = cursor.fetchall()
+        # REMINDER_PAGE is a constant, every value is bound
+        cursor.execute(f"""
+            UPDATE users SET reminded_at = :now
+            WHERE (event_id, id) IN ({REMINDER_PAGE})
+                AND created_at <= :joined_before
+                AND NOT EXISTS (SELECT 1 FROM draws WHERE draws.event_id = users.event_id)
+            RETURNING event_id, id
+        """, params)  # noqa: S608
+        claimed: list[tuple[int, int]] = cursor.fetchall()
+    return (page[-1] if len(page) == limit else None), sorted(claimed)
+
+def finish_outbox(deliveries: list[Delivery], event_id: int = DEFAULT_EVENT_ID) -> None:
+    with db_connection() as cursor:
+        cursor.executemany("""
+            UPDATE outbox SET status = ?, attempts = attempts + ?, error = ?
+            WHERE event_id = ? AND chat_id = ?
+        """, ((
+            "sent" if delivery.ok else "failed", delivery.attempts, delivery.error, event_id, delivery.chat_id
+        ) for delivery in deliveries))
+
+def claim_report(event_id: int = DEFAULT_EVENT_ID) -> bool:
+    """True exactly once per draw: for the caller that sees the outbox of the event drained first."""
+    with db_connection() as cursor:
+        cursor.execute("""
+            UPDATE draws SET reported = 1
+            WHERE event_id = ? AND reported = 0 AND NOT EXISTS (
+                SELECT 1 FROM outbox WHERE event_id = ? AND status IN ('pending', 'sending')
+            )
+        """, (event_id, event_id))
+        claimed: bool = cursor.rowcount > 0
+    return claimed
+
+def get_delivery_progress(event_id: int = DEFAULT_EVENT_ID) -> DeliveryProgress:
+    with db_connection() as cursor:
+        cursor.execute("SELECT status, COUNT(*) FROM outbox WHERE event_id = ? GROUP BY status", (event_id,))
+        counts: dict[str, int] = dict(cursor.fetchall())
+    return DeliveryProgress(**counts)
+
+def get_delivery_report(event_id: int = DEFAULT_EVENT_ID) -> DeliveryReport:
+    with db_connection() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM outbox WHERE event_id = ? AND status = 'sent'", (event_id,))
+        sent: int = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT chat_id, attempts, error FROM outbox WHERE event_id = ? AND status = 'failed'", (event_id,)
+        )
+        failed: list[Delivery] = [
+            Delivery(chat_id=row[0], ok=False, attempts=row[1], error=row[2]) for row in cursor.fetchall()
+        ]
+    return DeliveryReport(deliveries=failed, sent_count=sent)
@@ -0,0 +1,130 @@
+# Standard libraries imports
+from os import getenv
+from typing import Any, Mapping
+
+# Third-party libraries imports
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio.client import Pipeline
+
+# Moduls imports
+from cache import TTLCache
+from cluster import BOT_WORKERS
+
+# Another instance may change a user's state, so the local copy is only safe with a single instance
+FSM_CACHE_SIZE: int = int(getenv("FSM_CACHE_SIZE", "10000" if BOT_WORKERS == 1 else "0"))
+FSM_CACHE_TTL: float = float(getenv("FSM_CACHE_TTL", "600"))
+# States and data of users that were idle this long are dropped from redis (0 keeps them forever). The event of a
+# user is also kept in the database, so main.get_event_id restores it after the data expired
+FSM_STATE_TTL: int = int(getenv("FSM_STATE_TTL", str(60 * 24 * 3600)))
+
+# (state, data) of one user in one chat
+Record = tuple[str | None, dict[str, Any]]
+
+
+class TieredStorage(BaseStorage):
+    """FSM storage that keeps hot records in an in-process LRU in front of a RedisStorage.
+
+    A miss reads state and data in one pipelined round trip, so an active user costs no reads. Writes go to
+    redis first and refresh the TTL of both keys in the same pipeline.
+    """
+
+    def __init__(
+        self,
+        storage: RedisStorage,
+        size: int = FSM_CACHE_SIZE,
+        cache_ttl: float = FSM_CACHE_TTL,
+        state_ttl: int = FSM_STATE_TTL,
+    ) -> None:
+        self.storage: RedisStorage = storage
+        self.state_ttl: int | None = state_ttl or None
+        self.records: TTLCache[StorageKey, Record] = TTLCache(size, cache_ttl)
+        # Reads from redis in flight per key, and keys written meanwhile, whose reads are not cached
+        self.loading: dict[StorageKey, int] = {}
+        self.stale: set[StorageKey] = set()
+
+    def _keys(self, key: StorageKey) -> tuple[str, str]:
+        return self.storage.key_builder.build(key, "state"), self.storage.key_builder.build(key, "data")
+
+    async def _load(self, key: StorageKey) -> Record:
+        record: Record | None = self.records.get(key)
+        if record is not None:
+            return record
+        state_key, data_key = self._keys(key)
+        self.loading[key] = self.loading.get(key, 0) + 1
+        try:
+            pipeline: Pipeline
+            async with self.storage.redis.pipeline(transaction=False) as pipeline:
+                for redis_key in (state_key, data_key):
+                    if self.state_ttl:
+                        # Reading counts as activity, so the TTL restarts
+                        pipeline.getex(redis_key, ex=self.state_ttl)
+                    else:
+                        pipeline.get(redis_key)
+                state, data = await pipeline.execute()
+        finally:
+            stale: bool = key in self.stale
+            if self.loading[key] == 1:
+                del self.loading[key]
+                self.stale.discard(key)
+            else:
+                self.loading[key] -= 1
+        record = (
+            state.decode("utf-8") if isinstance(state, bytes) else state,
+            self.storage.json_loads(data) if data else {},
+        )
+        if not stale:
+            self.records.set(key, record)
+        return record
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._load(key))[0]
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        # A copy, since update_data changes the returned dict in place
+        return dict((await self._load(key))[1])
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value: str | None = state.state if isinstance(state, State) else state
+        state_key, data_key = self._keys(key)
+        pipeline: Pipeline
+        async with self.storage.redis.pipeline(transaction=False) as pipeline:
+            if value is None:
+                pipeline.delete(state_key)
+            else:
+                pipeline.set(state_key, value, ex=self.state_ttl)
+            if self.state_ttl:
+                pipeline.expire(data_key, self.state_ttl)
+            await pipeline.execute()
+        if key in self.loading:
+            self.stale.add(key)
+        record: Record | None = self.records.peek(key)
+        if record is not None:
+            self.records.set(key, (value, record[1]))
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        state_key, data_key = self._keys(key)
+        pipeline: Pipeline
+        async with self.storage.redis.pipeline(transaction=False) as pipeline:
+            if data:
+                pipeline.set(data_key, self.storage.json_dumps(data), ex=self.state_ttl)
+            else:
+                pipeline.delete(data_key)
+            if self.state_ttl:
+                pipeline.expire(state_key, self.state_ttl)
+            await pipeline.execute()
+        if key in self.loading:
+            self.stale.add(key)
+        record: Record | None = self.records.peek(key)
+        if record is not None:
+            self.records.set(key, (record[0], dict(data)))
+
+    def create_isolation(self, **kwargs: Any) -> BaseEventIsolation:
+        return self.storage.create_isolation(**kwargs)
+
+    async def close(self) -> None:
+        await self.storage.close()
@@ -1,26 +1,92 @@
 # Standard libraries imports
+from asyncio import Task, create_task, current_task, get_running_loop
 from asyncio import run as asyncio_run
-from asyncio import sleep as asyncio_sleep
+from csv import Error as CsvError
 from os import getenv
-from secrets import choice as secret_choice
+from os.path import join
+from signal import SIGINT, SIGTERM
+from tempfile import TemporaryDirectory
 
 # Third-party libraries imports
 from aiogram import Bot, Dispatcher, F, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.redis import Redis, RedisStorage
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import CallbackQuery, FSInputFile, InaccessibleMessage, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.callback_answer import CallbackAnswerMiddleware
+from aiogram.utils.deep_linking import create_start_link
 
 # Moduls imports
-from db import add_user, get_data, get_statistics, get_user, init_db, update_desire, update_name
-from schema import Statistics, User
+import backup
+import cache
+import metrics
+import profiling
+from async_db import (
+    add_exclusions,
+    add_user,
+    create_event,
+    export_pairs,
+    export_participants,
+    flush,
+    get_data,
+    get_delivery_progress,
+    get_event,
+    get_exclusions,
+    get_membership,
+    get_statistics,
+    get_user,
+    import_participants,
+    save_draw,
+    search_users,
+    set_event_admin,
+    shutdown,
+    update_desire,
+    update_name,
+)
+from broadcast import BROADCAST_RATE, Broadcaster
+from callbacks import counters as callback_counters
+from callbacks import show
+from cluster import BOT_WORKERS, DrawLock, outbox_ready, run_outbox_worker
+from db import init_db
+from fsm_storage import TieredStorage
+from pairing import draw_pairs
+from reminders import REMINDER_BUSY_UPDATES, REMINDER_DELAY, REMINDER_RATE, run_reminders
+from reminders import counters as reminder_counters
+from scheduler import UpdateScheduler, run_polling
+from schema import DEFAULT_EVENT_ID, DeliveryProgress, Event, SearchResults, Snapshot, Statistics, User, UserRow
+from throttling import ThrottlingMiddleware
 from utils import create_name
+from webhook import BOT_MODE, run_webhook
 
 ADMIN_ID: int = int(getenv("ADMIN_ID", "0"))
+# Users allowed to create events and import participants besides ADMIN_ID, comma separated
+EVENT_ORGANIZERS: frozenset[int] = frozenset(
+    int(user_id) for user_id in getenv("EVENT_ORGANIZERS", "").split(",") if user_id.strip()
+)
 BOT_TOKEN: str = getenv("BOT_TOKEN", "")
+REDIS_HOST: str = getenv("REDIS_HOST", "redis")
+REDIS_PORT: int = int(getenv("REDIS_PORT", "6379"))
+# A local Bot API server (or a stand-in for benchmarks) instead of api.telegram.org
+TELEGRAM_API_URL: str = getenv("TELEGRAM_API_URL", "")
 
-redis: Redis = Redis(host="redis", port=6379)
-dp: Dispatcher = Dispatcher(storage=RedisStorage(redis))
+redis: Redis = Redis(host=REDIS_HOST, port=REDIS_PORT)
+# Idle states expire in redis, and states of active users are read from memory
+storage: TieredStorage = TieredStorage(RedisStorage(redis))
+dp: Dispatcher = Dispatcher(storage=storage)
+if cache.CACHE_REDIS:
+    cache.use_redis(redis)
+# Stops the spinner on the button before the handler runs, so users do not tap again. Registered ahead of the
+# flood limit, so presses it drops are answered too
+dp.callback_query.outer_middleware(CallbackAnswerMiddleware(pre=True))
+# Drops floods before they reach first_contact and the database
+throttling: ThrottlingMiddleware = ThrottlingMiddleware(redis)
+dp.message.outer_middleware(throttling)
+dp.callback_query.outer_middleware(throttling)
+dp.message.middleware(profiling.ProfilingMiddleware())
+dp.callback_query.middleware(profiling.ProfilingMiddleware())
 
 class UsersStates(StatesGroup):
     new = State()
@@ -35,6 +101,8 @@ change_desire: InlineKeyboardButton = InlineKeyboardButton(text="Изменит
 info: InlineKeyboardButton = InlineKeyboardButton(text="Посмотреть свои данные", callback_data="info")
 admin_info: InlineKeyboardButton = InlineKeyboardButton(text="Статистика", callback_data="admin_info")
 admin_roll: InlineKeyboardButton = InlineKeyboardButton(text="Розыгрыш", callback_data="admin_roll")
+admin_progress: InlineKeyboardButton = InlineKeyboardButton(text="Ход рассылки", callback_data="admin_progress")
+admin_profile: InlineKeyboardButton = InlineKeyboardButton(text="Профилирование", callback_data="admin_profile")
 yes: InlineKeyboardButton = InlineKeyboardButton(text="Да", callback_data="yes")
 no: InlineKeyboardButton = InlineKeyboardButton(text="Нет", callback_data="no")
 
@@ -52,8 +120,11 @@ keyboard_admin = InlineKeyboardMarkup(
         [change_desire],
         [admin_info],
         [admin_roll],
+        [admin_progress],
     ]
 )
+# Profiling shows the whole process, so only the operator (ADMIN_ID) gets it and not every event admin
+keyboard_operator = InlineKeyboardMarkup(inline_keyboard=[*keyboard_admin.inline_keyboard, [admin_profile]])
 keyboard_roll = InlineKeyboardMarkup(
     inline_keyboard=[
         [yes],
@@ -61,70 +132,263 @@ keyboard_roll = InlineKeyboardMarkup(
     ]
 )
 
-bot: Bot = Bot(token=BOT_TOKEN)
+bot: Bot = Bot(
+    token=BOT_TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION),
+)
+# Keeps background tasks referenced until they finish
+background_tasks: set[Task[None]] = set()
+# Workers share Telegram's global limit
+broadcaster: Broadcaster = Broadcaster(bot, rate=BROADCAST_RATE / BOT_WORKERS)
 
 async def alert_admin(query: CallbackQuery, func: str) -> None:
     tg_name: str = create_name(query.from_user.first_name, query.from_user.last_name, query.from_user.username)
     text: str = f"Пользователь не найден в базе данных! ID: {query.from_user.id} name: {tg_name} func: {func}"
     await bot.send_message(chat_id=ADMIN_ID, text=text)
 
-async def send_mails() -> bool:
-    users: list[User] = get_data()
+async def send_mails(token: int, event: Event) -> bool:
+    users: list[UserRow] = await get_data(event.id)
     if len(users) < 2:
-        await bot.send_message(chat_id=ADMIN_ID, text="Зарегистрировано менее 2 пользователей, розыгрыш невозможен!")
+        await bot.send_message(
+            chat_id=event.admin_id, text="Зарегистрировано менее 2 пользователей, розыгрыш невозможен!"
+        )
         return False
 
-    recipients: set[int] = {user.id for user in users}
-    pairs: dict[int, int | None] = {user.id: None for user in users}
+    try:
+        pairs: dict[int, UserRow] = draw_pairs(users, await get_exclusions(event.id))
+    except ValueError as error:
+        await bot.send_message(chat_id=event.admin_id, text=f"Невозможно составить пары с учетом исключений: {error}")
+        return False
+    messages: list[tuple[int, str]] = [
+        (giver_id, f"Ты даришь подарок {recipient.name} ({recipient.tg_name}), вот его пожелание: {recipient.desire}")
+        for giver_id, recipient in pairs.items()
+    ]
+    saved: bool = await save_draw(
+        token, [(giver_id, recipient.id) for giver_id, recipient in pairs.items()], messages, event.id
+    )
+    if saved:
+        await cache.set_roll_done(redis, event.id)
+        outbox_ready.set()
+    return saved
+
+def get_statistics_keyboard(statistics: Statistics) -> InlineKeyboardMarkup:
+    """Admin keyboard with prev/next buttons for the statistics page."""
+    navigation: list[InlineKeyboardButton] = []
+    if statistics.has_prev:
+        navigation.append(InlineKeyboardButton(text="◀️", callback_data=f"stats:prev:{statistics.users[0].id}"))
+    if statistics.has_next:
+        navigation.append(InlineKeyboardButton(text="▶️", callback_data=f"stats:next:{statistics.users[-1].id}"))
+    if not navigation:
+        return keyboard_admin
+    return InlineKeyboardMarkup(inline_keyboard=[navigation, *keyboard_admin.inline_keyboard])
+
+def get_search_keyboard(results: SearchResults) -> InlineKeyboardMarkup:
+    """Admin keyboard with prev/next buttons for the search results page. The query itself is kept in FSM data."""
+    navigation: list[InlineKeyboardButton] = []
+    if results.has_prev:
+        navigation.append(InlineKeyboardButton(text="◀️", callback_data=f"search:prev:{results.first_key}"))
+    if results.has_next:
+        navigation.append(InlineKeyboardButton(text="▶️", callback_data=f"search:next:{results.last_key}"))
+    if not navigation:
+        return keyboard_admin
+    return InlineKeyboardMarkup(inline_keyboard=[navigation, *keyboard_admin.inline_keyboard])
+
+async def get_event_id(state: FSMContext) -> int:
+    """Event the user takes part in, chosen with a /start link. Users without one are in the default event.
+
+    FSM data is only a copy of the membership kept in the database, so a lost or expired state is restored from it.
+    """
+    event_id: object = (await state.get_data()).get("event_id")
+    if isinstance(event_id, int):
+        return event_id
+    membership: int | None = await get_membership(state.key.user_id)
+    restored: int = DEFAULT_EVENT_ID if membership is None else membership
+    await state.update_data(event_id=restored)
+    return restored
+
+def is_organizer(user_id: int) -> bool:
+    return user_id == ADMIN_ID or user_id in EVENT_ORGANIZERS
+
+async def is_admin(user_id: int, event_id: int) -> bool:
+    event: Event | None = await get_event(event_id)
+    return event is not None and user_id == event.admin_id
+
+async def get_keyboard(user_id: int, event_id: int) -> InlineKeyboardMarkup:
+    """Get appropriate keyboard for user (admin of the event or regular user)."""
+    if not await is_admin(user_id, event_id):
+        return keyboard_user
+    return keyboard_operator if user_id == ADMIN_ID else keyboard_admin
+
+async def join_event(message: types.Message, state: FSMContext, event_id: int) -> None:
+    tg_name = create_name(message.from_user.first_name, message.from_user.last_name, message.from_user.username)
+    await add_user(message.from_user.id, tg_name, event_id)
+    await state.set_state(UsersStates.new)
+    await state.update_data(event_id=event_id)
+
+@dp.message(CommandStart(deep_link=True, magic=F.args.regexp(r"^ev\d+$")))
+async def handle_event_link(message: types.Message, command: CommandObject, state: FSMContext) -> None:
+    if command.args is None:
+        return
+    event: Event | None = await get_event(int(command.args[2:]))
+    if event is None:
+        await message.answer("Такое событие не найдено, проверь ссылку")
+        return
+    await join_event(message, state, event.id)
+    await message.answer(f"Ты участвуешь в «{event.title}»! Напиши свое имя, чтобы другие знали кому дарить подарок")
 
-    for user_id in pairs:
-        possible_recipients: set[int] = recipients - {user_id}
-        recipient_id: int = secret_choice(list(possible_recipients))
-        pairs[user_id] = recipient_id
-        recipients.remove(recipient_id)
+@dp.message(Command("new_event"))
+async def handle_new_event(message: types.Message, command: CommandObject, state: FSMContext) -> None:
+    if not is_organizer(message.from_user.id):
+        return
+    if not command.args:
+        await message.answer("Укажи название события: /new_event Название")
+        return
+    event: Event = await create_event(command.args, message.from_user.id)
+    await join_event(message, state, event.id)
+    link: str = await create_start_link(bot, f"ev{event.id}")
+    await message.answer(
+        f"Событие «{event.title}» создано, ты его администратор. Ссылка для участников: {link}\n\n"
+        "Напиши свое имя, чтобы другие знали кому дарить подарок"
+    )
 
-    for giver_id, recipient_id in pairs.items():
-        recipient: User = next(user for user in users if user.id == recipient_id)
-        text: str = f"Ты даришь подарок {recipient.name} ({recipient.tg_name}), вот его пожелание: {recipient.desire}"
-        await bot.send_message(chat_id=giver_id, text=text)
-        await asyncio_sleep(1)
+@dp.message(Command("exclude"))
+async def handle_exclude(message: types.Message, command: CommandObject, state: FSMContext) -> None:
+    event_id: int = await get_event_id(state)
+    if not await is_admin(message.from_user.id, event_id):
+        return
+    user_ids: list[str] = (command.args or "").split()
+    if len(user_ids) != 2 or not all(user_id.isdigit() for user_id in user_ids):
+        await message.answer("Укажи ID двух участников: /exclude 123 456")
+        return
+    first, second = int(user_ids[0]), int(user_ids[1])
+    await add_exclusions([(first, second), (second, first)], event_id)
+    await message.answer(f"Готово, {first} и {second} не будут дарить подарки друг другу")
 
-    return True
+@dp.message(Command("import"))
+async def handle_import(message: types.Message, state: FSMContext) -> None:
+    event_id: int = await get_event_id(state)
+    if not is_organizer(message.from_user.id) or not await is_admin(message.from_user.id, event_id):
+        return
+    document: types.Document | None = message.document
+    file_name: str = (document.file_name or "") if document else ""
+    if document is None or not file_name.endswith((".csv", ".jsonl")):
+        await message.answer("Пришли файл .csv или .jsonl с подписью /import. Колонки: id, tg_name, name, desire")
+        return
+    with TemporaryDirectory() as temp_dir:
+        path: str = join(temp_dir, "import" + file_name[file_name.rindex("."):])
+        await bot.download(document, destination=path)
+        try:
+            count: int = await import_participants(path, event_id)
+        except (CsvError, ValueError) as error:
+            await message.answer(f"Файл не импортирован, ошибка: {error}")
+            return
+    await message.answer(f"Импортировано участников: {count}")
 
-def get_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    """Get appropriate keyboard for user (admin or regular user)."""
-    return keyboard_admin if user_id == ADMIN_ID else keyboard_user
+@dp.message(Command("export_users", "export_pairs"))
+async def handle_export(message: types.Message, command: CommandObject, state: FSMContext) -> None:
+    event_id: int = await get_event_id(state)
+    if not await is_admin(message.from_user.id, event_id):
+        return
+    extension: str = ".jsonl" if command.args == "jsonl" else ".csv"
+    export = export_participants if command.command == "export_users" else export_pairs
+    with TemporaryDirectory() as temp_dir:
+        path: str = join(temp_dir, command.command.removeprefix("export_") + extension)
+        count: int = await export(path, event_id)
+        await message.answer_document(FSInputFile(path), caption=f"Строк: {count}")
+
+@dp.message(Command("search"))
+async def handle_search(message: types.Message, command: CommandObject, state: FSMContext) -> None:
+    event_id: int = await get_event_id(state)
+    if not await is_admin(message.from_user.id, event_id):
+        return
+    if not command.args:
+        await message.answer("Укажи, кого искать: /search Имя или часть пожелания")
+        return
+    await state.update_data(search=command.args)
+    results: SearchResults = await search_users(command.args, event_id=event_id)
+    await message.answer(str(results), reply_markup=get_search_keyboard(results))
+
+@dp.message(Command("backup"))
+async def handle_backup(message: types.Message) -> None:
+    # The snapshot holds every event, so only the operator may take one
+    if message.from_user is None or message.from_user.id != ADMIN_ID:
+        return
+    try:
+        snapshot: Snapshot = await backup.snapshot()
+    except RuntimeError:
+        await message.answer("Снимок базы уже создается, попробуй позже")
+        return
+    except (OSError, ValueError) as error:
+        await message.answer(f"Не удалось создать снимок базы: {error}")
+        return
+    await message.answer(str(snapshot))
+
+async def send_profile(chat_id: int, session: profiling.ProfileSession) -> None:
+    report: str = await session.run()
+    with TemporaryDirectory() as temp_dir:
+        path: str = join(temp_dir, f"profile-{session.mode}.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(report)
+        await bot.send_document(chat_id, FSInputFile(path), caption=f"Профиль готов, обновлений: {session.handled}")
+
+async def start_profile(
+    message: types.Message | InaccessibleMessage, mode: str, seconds: float, updates: int
+) -> None:
+    try:
+        session: profiling.ProfileSession = profiling.start(mode, seconds, updates)
+    except (RuntimeError, ValueError) as error:
+        await bot.send_message(message.chat.id, f"Профилирование не запущено: {error}")
+        return
+    task: Task[None] = create_task(send_profile(message.chat.id, session))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    limit: str = f"{updates} обновлений или {session.seconds:g} с" if updates else f"{session.seconds:g} с"
+    await bot.send_message(message.chat.id, f"Профилирование ({mode}) запущено на {limit}")
+
+@dp.message(Command("profile"))
+async def handle_profile(message: types.Message, command: CommandObject) -> None:
+    if message.from_user is None or message.from_user.id != ADMIN_ID:
+        return
+    try:
+        mode, seconds, updates = profiling.parse_args(command.args)
+    except ValueError as error:
+        await message.answer(str(error))
+        return
+    await start_profile(message, mode, seconds, updates)
 
 @dp.message(UsersStates.new)
 async def process_name(message: types.Message, state: FSMContext) -> None:
-    update_name(message.from_user.id, message.text)
+    await update_name(message.from_user.id, message.text, await get_event_id(state))
     await state.set_state(UsersStates.name)
     await message.answer("Теперь напиши, что бы ты хотел получить в подарок. Чем подробнее, тем лучше!")
 
 @dp.message(UsersStates.name)
 async def process_desire(message: types.Message, state: FSMContext) -> None:
-    update_desire(message.from_user.id, message.text)
+    event_id: int = await get_event_id(state)
+    await update_desire(message.from_user.id, message.text, event_id)
     await state.set_state(UsersStates.done)
-    response_keyboard: InlineKeyboardMarkup = get_keyboard(message.from_user.id)
+    response_keyboard: InlineKeyboardMarkup = await get_keyboard(message.from_user.id, event_id)
     await message.answer("Спасибо! Твоя информация сохранена. Жди розыгрыша!", reply_markup=response_keyboard)
 
 @dp.message(UsersStates.done)
-async def process_done(message: types.Message) -> None:
-    response_keyboard: InlineKeyboardMarkup = get_keyboard(message.from_user.id)
+async def process_done(message: types.Message, state: FSMContext) -> None:
+    response_keyboard: InlineKeyboardMarkup = await get_keyboard(message.from_user.id, await get_event_id(state))
     await message.answer("Yo!", reply_markup=response_keyboard)
 
 @dp.message(UsersStates.change_name)
 async def process_change_name(message: types.Message, state: FSMContext) -> None:
-    update_name(message.from_user.id, message.text)
+    event_id: int = await get_event_id(state)
+    await update_name(message.from_user.id, message.text, event_id)
     await state.set_state(UsersStates.done)
-    response_keyboard: InlineKeyboardMarkup = get_keyboard(message.from_user.id)
+    response_keyboard: InlineKeyboardMarkup = await get_keyboard(message.from_user.id, event_id)
     await message.answer("Спасибо! Твоя информация сохранена. Жди розыгрыша!", reply_markup=response_keyboard)
 
 @dp.message(UsersStates.change_desire)
 async def process_change_desire(message: types.Message, state: FSMContext) -> None:
-    update_desire(message.from_user.id, message.text)
+    event_id: int = await get_event_id(state)
+    await update_desire(message.from_user.id, message.text, event_id)
     await state.set_state(UsersStates.done)
-    response_keyboard: InlineKeyboardMarkup = get_keyboard(message.from_user.id)
+    response_keyboard: InlineKeyboardMarkup = await get_keyboard(message.from_user.id, event_id)
     await message.answer("Спасибо! Твоя информация сохранена. Жди розыгрыша!", reply_markup=response_keyboard)
 
 @dp.message(UsersStates.admin_roll)
@@ -134,91 +398,199 @@ async def process_admin_roll(message: types.Message, state: FSMContext) -> None:
 
 @dp.callback_query(F.data == "info")
 async def handle_info(query: CallbackQuery, state: FSMContext) -> None:
-    user: User | None = get_user(query.from_user.id)
-    response_keyboard: InlineKeyboardMarkup = get_keyboard(query.from_user.id)
+    event_id: int = await get_event_id(state)
+    user: User | None = await get_user(query.from_user.id, event_id)
+    response_keyboard: InlineKeyboardMarkup = await get_keyboard(query.from_user.id, event_id)
     if user is None:
         await alert_admin(query, "handle_info")
         response: str = "Произошла ошибка, уже разбираемся!"
     else:
         response: str = (f"Твои данные:\n Имя: {user.name}\n Пожелание: {user.desire}")
-    await query.message.answer(response, reply_markup=response_keyboard)
+    await show(query, response, response_keyboard)
 
 @dp.callback_query(F.data == "change_name")
 async def handle_change_name(query: CallbackQuery, state: FSMContext) -> None:
-    response_keyboard: InlineKeyboardMarkup = get_keyboard(query.from_user.id)
-    mails_sent = await redis.get("roll_done")
-    mails_sent = mails_sent.decode() if mails_sent is not None else None
-    if mails_sent == "yes":
-        await query.message.answer(
-            "Розыгрыш уже был проведен, изменение имени невозможно!", reply_markup=response_keyboard
-        )
+    event_id: int = await get_event_id(state)
+    response_keyboard: InlineKeyboardMarkup = await get_keyboard(query.from_user.id, event_id)
+    if await cache.is_roll_done(redis, event_id=event_id):
+        await show(query, "Розыгрыш уже был проведен, изменение имени невозможно!", response_keyboard)
         return
-    user: User | None = get_user(query.from_user.id)
+    user: User | None = await get_user(query.from_user.id, event_id)
     if user is None:
         await alert_admin(query, "handle_change_name")
-        await query.message.answer("Произошла ошибка, уже разбираемся!", reply_markup=response_keyboard)
+        await show(query, "Произошла ошибка, уже разбираемся!", response_keyboard)
     else:
         await state.set_state(UsersStates.change_name)
-        await query.message.answer("Напиши свое имя, чтобы другие знали кому дарить подарок")
+        await show(query, "Напиши свое имя, чтобы другие знали кому дарить подарок")
 
 @dp.callback_query(F.data == "change_desire")
 async def handle_change_desire(query: CallbackQuery, state: FSMContext) -> None:
-    response_keyboard: InlineKeyboardMarkup = get_keyboard(query.from_user.id)
-    mails_sent = await redis.get("roll_done")
-    mails_sent = mails_sent.decode() if mails_sent is not None else None
-    if mails_sent == "yes":
-        await query.message.answer(
-            "Розыгрыш уже был проведен, изменение пожелания невозможно!", reply_markup=response_keyboard
-        )
+    event_id: int = await get_event_id(state)
+    response_keyboard: InlineKeyboardMarkup = await get_keyboard(query.from_user.id, event_id)
+    if await cache.is_roll_done(redis, event_id=event_id):
+        await show(query, "Розыгрыш уже был проведен, изменение пожелания невозможно!", response_keyboard)
         return
-    user: User | None = get_user(query.from_user.id)
+    user: User | None = await get_user(query.from_user.id, event_id)
     if user is None:
         await alert_admin(query, "handle_change_desire")
-        await query.message.answer("Произошла ошибка, уже разбираемся!", reply_markup=response_keyboard)
+        await show(query, "Произошла ошибка, уже разбираемся!", response_keyboard)
     else:
         await state.set_state(UsersStates.change_desire)
-        await query.message.answer("Напиши, что бы ты хотел получить в подарок. Чем подробнее, тем лучше!")
+        await show(query, "Напиши, что бы ты хотел получить в подарок. Чем подробнее, тем лучше!")
 
 @dp.callback_query(F.data == "admin_info")
-async def handle_admin_info(query: CallbackQuery) -> None:
-    statistics: Statistics = get_statistics()
-    await query.message.answer(str(statistics), reply_markup=keyboard_admin)
+async def handle_admin_info(query: CallbackQuery, state: FSMContext) -> None:
+    event_id: int = await get_event_id(state)
+    if not await is_admin(query.from_user.id, event_id):
+        return
+    statistics: Statistics = await get_statistics(event_id=event_id)
+    await show(query, str(statistics), get_statistics_keyboard(statistics))
+
+@dp.callback_query(F.data.startswith("stats:"))
+async def handle_statistics_page(query: CallbackQuery, state: FSMContext) -> None:
+    event_id: int = await get_event_id(state)
+    if not await is_admin(query.from_user.id, event_id) or query.data is None:
+        return
+    _, direction, user_id = query.data.split(":")
+    if direction == "next":
+        statistics: Statistics = await get_statistics(after_id=int(user_id), event_id=event_id)
+    else:
+        statistics = await get_statistics(before_id=int(user_id), event_id=event_id)
+    await show(query, str(statistics), get_statistics_keyboard(statistics))
+
+@dp.callback_query(F.data.startswith("search:"))
+async def handle_search_page(query: CallbackQuery, state: FSMContext) -> None:
+    event_id: int = await get_event_id(state)
+    text: object = (await state.get_data()).get("search")
+    if not await is_admin(query.from_user.id, event_id) or not isinstance(text, str) or query.data is None:
+        return
+    _, direction, key = query.data.split(":")
+    if direction == "next":
+        results: SearchResults = await search_users(text, after_key=int(key), event_id=event_id)
+    else:
+        results = await search_users(text, before_key=int(key), event_id=event_id)
+    await show(query, str(results), get_search_keyboard(results))
+
+@dp.callback_query(F.data == "admin_progress")
+async def handle_admin_progress(query: CallbackQuery, state: FSMContext) -> None:
+    event_id: int = await get_event_id(state)
+    if not await is_admin(query.from_user.id, event_id):
+        return
+    progress: DeliveryProgress = await get_delivery_progress(event_id)
+    await show(query, str(progress), keyboard_admin)
+
+@dp.callback_query(F.data == "admin_profile")
+async def handle_admin_profile(query: CallbackQuery) -> None:
+    if query.from_user.id != ADMIN_ID or query.message is None:
+        return
+    await start_profile(query.message, "sample", profiling.PROFILE_SECONDS, 0)
 
 @dp.callback_query(F.data == "admin_roll")
 async def handle_admin_roll(query: CallbackQuery, state: FSMContext) -> None:
+    if not await is_admin(query.from_user.id, await get_event_id(state)):
+        return
     await state.set_state(UsersStates.admin_roll)
-    await query.message.answer("Запустить тайного санту?", reply_markup=keyboard_roll)
+    await show(query, "Запустить тайного санту?", keyboard_roll)
 
 @dp.callback_query(F.data == "no")
 async def handle_no(query: CallbackQuery, state: FSMContext) -> None:
     await state.set_state(UsersStates.done)
-    await query.message.answer("Санта пока подождет", reply_markup=keyboard_admin)
+    await show(query, "Санта пока подождет", keyboard_admin)
 
 @dp.callback_query(F.data == "yes")
 async def handle_yes(query: CallbackQuery, state: FSMContext) -> None:
-    mails_sent = await redis.get("roll_done")
-    mails_sent = mails_sent.decode() if mails_sent is not None else None
     await state.set_state(UsersStates.done)
-    if mails_sent == "yes":
-        await query.message.answer("Розыгрыш уже был проведен!", reply_markup=keyboard_admin)
+    event: Event | None = await get_event(await get_event_id(state))
+    if event is None or query.from_user.id != event.admin_id:
+        return
+    lock: DrawLock = DrawLock.for_event(redis, event.id)
+    token: int | None = await lock.acquire()
+    if token is None:
+        await show(query, "Розыгрыш уже проводится!", keyboard_admin)
         return
-    success = await send_mails()
+    try:
+        if await cache.is_roll_done(redis, fresh=True, event_id=event.id):
+            await show(query, "Розыгрыш уже был проведен!", keyboard_admin)
+            return
+        success = await send_mails(token, event)
+    finally:
+        await lock.release(token)
     if success:
-        await redis.set("roll_done", "yes")
-        await query.message.answer("Письма отправлены!", reply_markup=keyboard_admin)
+        await show(query, "Письма отправляются, отчет придет по окончании рассылки!", keyboard_admin)
     else:
-        await query.message.answer("Произошла ошибка при отправке!!!", reply_markup=keyboard_admin)
+        await show(query, "Произошла ошибка при отправке!!!", keyboard_admin)
 
 @dp.message()
 async def first_contact(message: types.Message, state: FSMContext) -> None:
-    tg_name = create_name(message.from_user.first_name, message.from_user.last_name, message.from_user.username)
-    add_user(message.from_user.id, tg_name)
-    await state.set_state(UsersStates.new)
+    event_id: int = await get_event_id(state)
+    user: User | None = await get_user(state.key.user_id, event_id)
+    if user is not None and user.name and user.desire:
+        # Registered user whose FSM state expired (FSM_STATE_TTL): restore it instead of registering again
+        await state.set_state(UsersStates.done)
+        await message.answer("Yo!", reply_markup=await get_keyboard(user.id, event_id))
+        return
+    await join_event(message, state, event_id)
     await message.answer("Напиши свое имя, чтобы другие знали кому дарить подарок")
 
 async def main() -> None:
     init_db()
-    await dp.start_polling(bot)
+    await set_event_admin(DEFAULT_EVENT_ID, ADMIN_ID)
+    broadcast_worker = create_task(run_outbox_worker(bot, broadcaster, ADMIN_ID))
+    backups: Task[None] | None = create_task(backup.run_backups(redis)) if backup.BACKUP_INTERVAL > 0 else None
+    scheduler = UpdateScheduler(dp, bot)
+    scheduler.start()
+    reminders: Task[None] | None = None
+    if REMINDER_DELAY > 0:
+        # A budget of their own, and they wait while users are answered or a draw is delivered
+        reminders = create_task(run_reminders(
+            redis,
+            Broadcaster(bot, rate=REMINDER_RATE, concurrency=max(int(REMINDER_RATE), 1)),
+            lambda: scheduler.size > REMINDER_BUSY_UPDATES or broadcaster.bucket.active(),
+        ))
+    metrics_server = None
+    if metrics.enabled:
+        metrics.instrument(dp, bot, redis)
+        metrics.register("throttling", "counter", "Updates let through or dropped by the flood limit", lambda: {
+            "allowed": throttling.allowed, "throttled": throttling.throttled,
+        })
+        metrics.register("cache", "counter", "Local cache hits and misses", cache.counters)
+        metrics.register(
+            "callbacks", "counter", "Callback screens edited in place, unchanged or sent anew",
+            lambda: callback_counters,
+        )
+        metrics.register("fsm_cache", "counter", "Local FSM state cache hits and misses", lambda: {
+            "hits": storage.records.hits, "misses": storage.records.misses,
+        })
+        metrics.register("scheduler", "counter", "Updates processed, shed or deferred by the scheduler", lambda: {
+            "processed": scheduler.processed, "shed": scheduler.shed, "deferred": scheduler.deferred,
+        })
+        metrics.register(
+            "reminders", "counter", "Registration reminders sent, failed or postponed", lambda: reminder_counters
+        )
+        metrics.register("scheduler_queue", "gauge", "Updates queued or running", lambda: {"size": scheduler.size})
+        metrics_server = await metrics.start_server()
+    # Always set inside a running coroutine, the check only narrows the Optional
+    main_task: Task[object] | None = current_task()
+    if main_task is not None:
+        for signal in (SIGINT, SIGTERM):
+            get_running_loop().add_signal_handler(signal, main_task.cancel)
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot, scheduler)
+        else:
+            await run_polling(dp, bot, scheduler)
+    finally:
+        await scheduler.stop()
+        broadcast_worker.cancel()
+        if backups is not None:
+            backups.cancel()
+        if reminders is not None:
+            reminders.cancel()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        await bot.session.close()
+        await flush()
+        shutdown()
 
 if __name__ == "__main__":
     asyncio_run(main())
@@ -0,0 +1,188 @@
+# Standard libraries imports
+from bisect import bisect_left
+from os import getenv
+from time import perf_counter
+from typing import Any, Awaitable, Callable, TypeVar
+
+# Third-party libraries imports
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+from aiohttp import web
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+METRICS_PORT: int = int(getenv("METRICS_PORT", "0"))
+METRICS_HOST: str = getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PATH: str = "/metrics"
+PREFIX: str = "santa_"
+BUCKETS: tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Nothing is timed unless METRICS_PORT is set, so a disabled bot only pays for one boolean check per query
+enabled: bool = METRICS_PORT > 0
+
+T = TypeVar("T")
+
+
+def _labels(label: str, value: str, le: str | None = None) -> str:
+    value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'{{{label}="{value}"}}' if le is None else f'{{{label}="{value}",le="{le}"}}'
+
+
+class Histogram:
+    """Latency histogram with one label, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, label: str, buckets: tuple[float, ...] = BUCKETS) -> None:
+        self.name: str = PREFIX + name
+        self.documentation: str = documentation
+        self.label: str = label
+        self.buckets: tuple[float, ...] = buckets
+        # Observations per label value and bucket, the last bucket is +Inf. Only updated from the event loop.
+        self.counts: dict[str, list[int]] = {}
+        self.sums: dict[str, float] = {}
+
+    def observe(self, value: str, seconds: float) -> None:
+        counts: list[int] | None = self.counts.get(value)
+        if counts is None:
+            counts = self.counts[value] = [0] * (len(self.buckets) + 1)
+            self.sums[value] = 0.0
+        counts[bisect_left(self.buckets, seconds)] += 1
+        self.sums[value] += seconds
+
+    def render(self) -> list[str]:
+        lines: list[str] = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for value, counts in sorted(self.counts.items()):
+            cumulative: int = 0
+            for bound, count in zip((*map(str, self.buckets), "+Inf"), counts, strict=True):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label, value, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label, value)} {self.sums[value]}")
+            lines.append(f"{self.name}_count{_labels(self.label, value)} {cumulative}")
+        return lines
+
+
+handler_seconds: Histogram = Histogram("handler_seconds", "Time spent in a bot handler", "handler")
+db_query_seconds: Histogram = Histogram("db_query_seconds", "Time spent in a db.py query", "query")
+redis_command_seconds: Histogram = Histogram("redis_command_seconds", "Time spent in a Redis command", "command")
+telegram_request_seconds: Histogram = Histogram(
+    "telegram_request_seconds", "Time spent in a Telegram Bot API request", "method"
+)
+histograms: list[Histogram] = [handler_seconds, db_query_seconds, redis_command_seconds, telegram_request_seconds]
+
+
+def measure(func: Callable[..., T], *args: object) -> tuple[T, float]:
+    """Call a blocking function and return its result with the seconds it took, for timing queries in a thread."""
+    start: float = perf_counter()
+    result: T = func(*args)
+    return result, perf_counter() - start
+
+
+# name -> (type, documentation, function returning the current values by name)
+collectors: dict[str, tuple[str, str, Callable[[], dict[str, int]]]] = {}
+
+
+def register(name: str, kind: str, documentation: str, collect: Callable[[], dict[str, int]]) -> None:
+    """Export the values returned by `collect` as `santa_<name>_<key>` counters or gauges."""
+    collectors[name] = (kind, documentation, collect)
+
+
+def render() -> str:
+    lines: list[str] = []
+    for histogram in histograms:
+        lines += histogram.render()
+    for name, (kind, documentation, collect) in collectors.items():
+        for key, value in collect().items():
+            metric: str = f"{PREFIX}{name}_{key}" + ("_total" if kind == "counter" else "")
+            lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} {kind}", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware that times every handler by its function name."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        start: float = perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_seconds.observe(data["handler"].callback.__name__, perf_counter() - start)
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Session middleware that times every Bot API request (send_message, message.answer and the rest)."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        start: float = perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            telegram_request_seconds.observe(method.__api_method__, perf_counter() - start)
+
+
+def instrument_redis(redis: Redis) -> None:
+    """Time every command of this client, including scripts, and every pipeline as one PIPELINE round trip.
+
+    Pipelines send their commands without execute_command, so the FSM storage is only timed through the
+    pipeline wrapper.
+    """
+    execute_command: Callable[..., Awaitable[Any]] = redis.execute_command
+    create_pipeline: Callable[..., Pipeline] = redis.pipeline
+
+    async def timed(*args: Any, **options: Any) -> Any:
+        start: float = perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        finally:
+            redis_command_seconds.observe(str(args[0]).upper(), perf_counter() - start)
+
+    def timed_pipeline(*args: Any, **kwargs: Any) -> Pipeline:
+        pipeline: Pipeline = create_pipeline(*args, **kwargs)
+        execute: Callable[[bool], Awaitable[list[Any]]] = pipeline.execute
+
+        async def timed_execute(raise_on_error: bool = True) -> list[Any]:
+            start: float = perf_counter()
+            try:
+                return await execute(raise_on_error)
+            finally:
+                redis_command_seconds.observe("PIPELINE", perf_counter() - start)
+
+        pipeline.execute = timed_execute  # type: ignore[method-assign]
+        return pipeline
+
+    redis.execute_command = timed  # type: ignore[method-assign]
+    redis.pipeline = timed_pipeline  # type: ignore[method-assign]
+
+
+def instrument(dp: Dispatcher, bot: Bot, redis: Redis) -> None:
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(RequestMetricsMiddleware())
+    instrument_redis(redis)
+
+
+def create_app() -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app: web.Application = web.Application()
+    app.router.add_get(METRICS_PATH, handle)
+    return app
+
+
+async def start_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> web.AppRunner:
+    runner: web.AppRunner = web.AppRunner(create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
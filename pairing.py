@@ -0,0 +1,138 @@
+# Standard libraries imports
+from collections import Counter, deque
+from random import Random
+from secrets import randbits
+from typing import Collection, Mapping, Sequence, TypeVar
+
+# Moduls imports
+from schema import User, UserRow
+
+NO_EXCLUSIONS: frozenset[int] = frozenset()
+
+U = TypeVar("U", User, UserRow)
+
+
+def draw_pairs(
+    users: Sequence[U],
+    exclusions: Mapping[int, Collection[int]] | None = None,
+    teams: Mapping[int, int] | None = None,
+) -> dict[int, U]:
+    """Map every giver id to a recipient. Nobody draws themselves, a recipient listed in `exclusions[giver_id]` or
+    anyone from the giver's team in `teams`.
+
+    The shuffled users form one cycle. Edges of the cycle that break a rule are dropped and the givers left
+    without a recipient are matched by augmenting paths, so with rules the result is a cycle cover rather than
+    a single cycle. Raises ValueError if the rules leave no valid draw.
+    """
+    if len(users) < 2:
+        raise ValueError("At least 2 users are required for a draw")
+    order: list[U] = list(users)
+    Random(randbits(256)).shuffle(order)  # noqa: S311
+    if not exclusions and not teams:
+        return {giver.id: recipient for giver, recipient in zip(order, order[1:] + order[:1], strict=True)}
+    count: int = len(order)
+    # Everything below works on positions in the shuffled order, so stack order is random too
+    ids: list[int] = [user.id for user in order]
+    excluded_by: Mapping[int, Collection[int]] = exclusions or {}
+    team: list[int | None] = [teams.get(user_id) for user_id in ids] if teams else [None] * count
+    if teams:
+        # Hall's condition for a team: its members need as many recipients outside of it
+        for key, size in Counter(key for key in team if key is not None).most_common(1):
+            if size > count - size:
+                raise ValueError(f"No valid draw: team {key} has {size} of {count} participants, more than half")
+
+    recipient_of: list[int] = [-1] * count
+    giver_of: list[int] = [-1] * count
+    for giver in range(count):
+        recipient: int = (giver + 1) % count
+        if ids[recipient] not in excluded_by.get(ids[giver], NO_EXCLUSIONS) and (
+            team[giver] is None or team[giver] != team[recipient]
+        ):
+            recipient_of[giver] = recipient
+            giver_of[recipient] = giver
+
+    free: list[int] = [giver for giver in range(count) if recipient_of[giver] < 0]
+    while free:
+        if not _augment(free, recipient_of, giver_of, ids, excluded_by, team):
+            sample: str = ", ".join(str(ids[giver]) for giver in free[:5])
+            raise ValueError(f"No valid draw: {len(free)} participants cannot get a recipient (e.g. {sample})")
+        free = [giver for giver in free if recipient_of[giver] < 0]
+    return {ids[giver]: order[recipient] for giver, recipient in enumerate(recipient_of)}
+
+
+def _augment(
+    free: list[int],
+    recipient_of: list[int],
+    giver_of: list[int],
+    ids: list[int],
+    excluded_by: Mapping[int, Collection[int]],
+    team: list[int | None],
+) -> int:
+    """One Hopcroft-Karp style phase: grow vertex-disjoint alternating trees from all free givers at once and
+    flip every path that reaches a free recipient. Returns the number of givers matched.
+
+    Allowed edges are never listed, which would be quadratic. Each step takes one recipient the giver may draw
+    from the recipients not visited in this phase, free ones first, so trees grow side by side and a phase costs
+    O(participants + exclusions).
+    """
+    unvisited_free: dict[int | None, list[int]] = {}
+    unvisited: dict[int | None, list[int]] = {}
+    for candidate in range(len(giver_of)):
+        (unvisited if giver_of[candidate] >= 0 else unvisited_free).setdefault(team[candidate], []).append(candidate)
+    parent: dict[int, int] = {}
+    root: dict[int, int] = {giver: giver for giver in free}
+    done: set[int] = set()
+    queue: deque[int] = deque(free)
+    while queue:
+        giver: int = queue.popleft()
+        if root[giver] in done:
+            continue
+        excluded: Collection[int] = excluded_by.get(ids[giver], NO_EXCLUSIONS)
+        recipient: int = _take(unvisited_free, giver, ids, excluded, team[giver])
+        if recipient < 0:
+            recipient = _take(unvisited, giver, ids, excluded, team[giver])
+        if recipient < 0:
+            continue
+        parent[recipient] = giver
+        if giver_of[recipient] >= 0:
+            root[giver_of[recipient]] = root[giver]
+            queue.append(giver_of[recipient])
+            queue.append(giver)
+            continue
+        done.add(root[giver])
+        while recipient >= 0:
+            giver = parent[recipient]
+            previous: int = recipient_of[giver]
+            recipient_of[giver] = recipient
+            giver_of[recipient] = giver
+            recipient = previous
+    return len(done)
+
+
+def _take(
+    unvisited: dict[int | None, list[int]], giver: int, ids: list[int], excluded: Collection[int], own_team: int | None
+) -> int:
+    """Pop an unvisited recipient the giver may draw, or return -1. Recipients are grouped by team, so the giver's
+    own team is skipped as a whole.
+    """
+    found: int = -1
+    emptied: list[int | None] = []
+    for key, stack in unvisited.items():
+        if key is not None and key == own_team:
+            continue
+        skipped: list[int] = []
+        while stack:
+            recipient: int = stack.pop()
+            if recipient == giver or ids[recipient] in excluded:
+                skipped.append(recipient)
+                continue
+            found = recipient
+            break
+        stack.extend(skipped)
+        if not stack:
+            emptied.append(key)
+        if found >= 0:
+            break
+    for key in emptied:
+        del unvisited[key]
+    return found
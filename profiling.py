@@ -0,0 +1,202 @@
+# Standard libraries imports
+import re
+import sys
+from asyncio import Event, wait_for
+from collections import Counter
+from cProfile import Profile
+from io import StringIO
+from os import getenv
+from pstats import Stats
+from threading import Event as ThreadEvent
+from threading import Thread, get_ident
+from time import perf_counter
+from types import FrameType
+from typing import Any, Awaitable, Callable
+
+# Third-party libraries imports
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+PROFILE_SECONDS: float = float(getenv("PROFILE_SECONDS", "30"))
+PROFILE_MAX_SECONDS: float = float(getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_INTERVAL_MS: float = float(getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_TOP: int = 30
+
+ARGS_PATTERN: re.Pattern[str] = re.compile(r"^(?:(\d+)([su]?))?\s*(cprofile)?$")
+
+Function = tuple[str, int, str]
+
+
+def parse_args(args: str | None) -> tuple[str, float, int]:
+    """Parse `/profile [N[s|u]] [cprofile]` into (mode, seconds, updates). N without a unit is seconds."""
+    match: re.Match[str] | None = ARGS_PATTERN.match((args or "").strip().lower())
+    if match is None:
+        raise ValueError("usage: /profile [N[s|u]] [cprofile]")
+    number, unit, cprofile = match.groups()
+    mode: str = "cprofile" if cprofile else "sample"
+    if number is None:
+        return mode, PROFILE_SECONDS, 0
+    if unit == "u":
+        return mode, PROFILE_MAX_SECONDS, int(number)
+    return mode, min(float(number), PROFILE_MAX_SECONDS), 0
+
+
+def _function(frame: Any) -> Function:
+    code = frame.f_code
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+class Sampler:
+    """Statistical profiler: a thread that records the stacks of all other threads every `interval` seconds.
+
+    The cost is bounded by the sampling rate and does not grow with the amount of code the bot runs.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000) -> None:
+        self.interval: float = interval
+        self.samples: int = 0
+        self.own: Counter[Function] = Counter()
+        self.cumulative: Counter[Function] = Counter()
+        self.stopped: ThreadEvent = ThreadEvent()
+        self.thread: Thread = Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        own_ident: int = get_ident()
+        for ident, top in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            self.samples += 1
+            self.own[_function(top)] += 1
+            # A recursive function counts once per sample
+            seen: set[Function] = set()
+            frame: FrameType | None = top
+            while frame is not None:
+                function: Function = _function(frame)
+                if function not in seen:
+                    seen.add(function)
+                    self.cumulative[function] += 1
+                frame = frame.f_back
+
+    def report(self) -> str:
+        lines: list[str] = [f"Samples: {self.samples} (every {self.interval * 1000:g} ms, all threads)"]
+        tables: tuple[tuple[str, Counter[Function]], ...] = (
+            ("Top functions by own samples", self.own),
+            ("Top functions by cumulative samples", self.cumulative),
+        )
+        for title, counter in tables:
+            lines += ["", title, f"{'samples':>8} {'share':>6}  function"]
+            for (filename, lineno, name), count in counter.most_common(PROFILE_TOP):
+                lines.append(f"{count:>8} {count / max(self.samples, 1):>6.1%}  {name} ({filename}:{lineno})")
+        return "\n".join(lines)
+
+
+class ProfileSession:
+    """One profiling run, limited by time and optionally by the number of handled updates."""
+
+    def __init__(self, mode: str, seconds: float, updates: int) -> None:
+        self.mode: str = mode
+        self.seconds: float = min(seconds, PROFILE_MAX_SECONDS)
+        self.updates: int = updates
+        # handler name -> [calls, total seconds, max seconds]
+        self.handlers: dict[str, list[float]] = {}
+        self.handled: int = 0
+        self.done: Event = Event()
+        self.sampler: Sampler | None = None
+        self.profile: Profile | None = None
+
+    def record(self, handler: str, seconds: float) -> None:
+        stats: list[float] | None = self.handlers.get(handler)
+        if stats is None:
+            stats = self.handlers[handler] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+        self.handled += 1
+        if self.updates and self.handled >= self.updates:
+            self.done.set()
+
+    def start(self) -> None:
+        if self.mode == "cprofile":
+            # Deterministic, but only sees the event loop thread and slows Python code down noticeably
+            self.profile = Profile()
+            self.profile.enable()
+        else:
+            self.sampler = Sampler()
+            self.sampler.start()
+
+    async def run(self) -> str:
+        """Wait for the session to end and return the text report."""
+        global session
+        start: float = perf_counter()
+        try:
+            await wait_for(self.done.wait(), self.seconds)
+        except TimeoutError:
+            pass
+        finally:
+            if self.profile is not None:
+                self.profile.disable()
+            if self.sampler is not None:
+                self.sampler.stop()
+            session = None
+        return self.report(perf_counter() - start)
+
+    def report(self, elapsed: float) -> str:
+        lines: list[str] = [f"Profile: {self.mode}, {elapsed:.1f} s, {self.handled} updates handled", ""]
+        lines += ["Handlers", f"{'calls':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9}  handler"]
+        for name, (calls, total, longest) in sorted(self.handlers.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{calls:>7.0f} {total:>9.3f} {total / calls * 1000:>9.1f} {longest * 1000:>9.1f}  {name}")
+        lines.append("")
+        if self.profile is not None:
+            stream: StringIO = StringIO()
+            stats: Stats = Stats(self.profile, stream=stream)
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+            stats.sort_stats("tottime").print_stats(PROFILE_TOP)
+            lines.append(stream.getvalue())
+        if self.sampler is not None:
+            lines.append(self.sampler.report())
+        return "\n".join(lines)
+
+
+# The running session, at most one per process
+session: ProfileSession | None = None
+
+
+def start(mode: str = "sample", seconds: float = PROFILE_SECONDS, updates: int = 0) -> ProfileSession:
+    """Start profiling this bot instance. Raises RuntimeError if a session is already running."""
+    global session
+    if session is not None:
+        raise RuntimeError("Profiling is already running")
+    new_session: ProfileSession = ProfileSession(mode, seconds, updates)
+    new_session.start()
+    session = new_session
+    return new_session
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """Inner middleware that times handlers while a session is running and costs one check otherwise."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if session is None:
+            return await handler(event, data)
+        current: ProfileSession = session
+        start: float = perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            current.record(data["handler"].callback.__name__, perf_counter() - start)
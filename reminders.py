@@ -0,0 +1,93 @@
+# Standard libraries imports
+import logging
+from asyncio import sleep
+from os import getenv
+from time import time
+from typing import Callable
+
+# Third-party libraries imports
+from redis.asyncio import Redis
+
+# Moduls imports
+from async_db import claim_reminders
+from broadcast import Broadcaster, backoff_delay
+from cache import is_roll_done
+from schema import DeliveryReport
+
+# Seconds after the first message before an unregistered user is reminded, 0 turns reminders off
+REMINDER_DELAY: float = float(getenv("REMINDER_DELAY", str(24 * 3600)))
+# Share of the Telegram budget (messages per second) reminders may use, the rest is left to handlers and the draw
+REMINDER_RATE: float = float(getenv("REMINDER_RATE", "5"))
+REMINDER_BATCH: int = int(getenv("REMINDER_BATCH", "50"))
+# Pause between two passes over the table, users who were too new for one pass are reminded in the next
+REMINDER_SCAN_INTERVAL: float = float(getenv("REMINDER_SCAN_INTERVAL", "600"))
+# Updates queued or running above which reminders wait, so they never delay answers to users
+REMINDER_BUSY_UPDATES: int = int(getenv("REMINDER_BUSY_UPDATES", "8"))
+REMINDER_BUSY_SLEEP: float = 1.0
+REMINDER_TEXT: str = (
+    "Ты начал регистрацию в Тайном Санте, но не закончил ее. "
+    "Ответь на последний вопрос бота, чтобы участвовать в розыгрыше!"
+)
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Where a pass over the table starts, before every (event_id, user_id)
+START: tuple[int, int] = (-1, -1)
+
+# Reminders sent or failed and batches postponed because of handler load, exported on the metrics endpoint
+counters: dict[str, int] = {"sent": 0, "failed": 0, "deferred": 0}
+
+
+async def remind_batch(
+    redis: Redis, broadcaster: Broadcaster, after: tuple[int, int], joined_before: float, batch: int
+) -> tuple[int, int] | None:
+    """Claim and remind the next `batch` users after `after`, returning the cursor of the next claim."""
+    cursor, claimed = await claim_reminders(after, joined_before, batch)
+    # Events drawn before draws were saved in the database are only marked in redis
+    drawn: set[int] = set()
+    for event_id in {event_id for event_id, _ in claimed}:
+        if await is_roll_done(redis, event_id=event_id):
+            drawn.add(event_id)
+    due: list[int] = [user_id for event_id, user_id in claimed if event_id not in drawn]
+    if due:
+        report: DeliveryReport = await broadcaster.send((user_id, REMINDER_TEXT) for user_id in due)
+        failed: int = len(report.failed)
+        counters["sent"] += len(report.deliveries) - failed
+        counters["failed"] += failed
+    return cursor
+
+
+async def run_reminders(
+    redis: Redis,
+    broadcaster: Broadcaster,
+    busy: Callable[[], bool],
+    delay: float = REMINDER_DELAY,
+    batch: int = REMINDER_BATCH,
+    interval: float = REMINDER_SCAN_INTERVAL,
+) -> None:
+    """Remind users who started registration `delay` seconds ago or earlier but did not finish it, until cancelled.
+
+    The table is walked with a keyset cursor, `batch` users per claim. Every user is reminded at most once, since
+    the claim records reminded_at before the message is sent. Users of events whose roll_done flag is set are
+    claimed but not reminded. `broadcaster` should have a rate of its own, and no batch starts while `busy()` is
+    true. A failed batch (locked database, redis or Telegram errors) is logged and retried after a backoff.
+    """
+    after: tuple[int, int] = START
+    failures: int = 0
+    while True:
+        while busy():
+            counters["deferred"] += 1
+            await sleep(REMINDER_BUSY_SLEEP)
+        try:
+            cursor: tuple[int, int] | None = await remind_batch(redis, broadcaster, after, time() - delay, batch)
+        except Exception:
+            failures += 1
+            logger.exception("Reminder batch failed")
+            await sleep(backoff_delay(failures))
+            continue
+        failures = 0
+        if cursor is None:
+            after = START
+            await sleep(interval)
+        else:
+            after = cursor
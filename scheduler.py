@@ -0,0 +1,138 @@
+# Standard libraries imports
+from asyncio import Event, Queue, Task, create_task, gather, sleep
+from collections import deque
+from os import getenv
+from typing import Hashable
+
+# Third-party libraries imports
+from aiogram import Bot, Dispatcher, loggers
+from aiogram.methods import GetUpdates
+from aiogram.types import Chat, Update, User
+from aiogram.types.update import UpdateTypeLookupError
+
+# Moduls imports
+from broadcast import backoff_delay
+
+UPDATE_WORKERS: int = int(getenv("UPDATE_WORKERS", "64"))
+UPDATE_QUEUE_SIZE: int = int(getenv("UPDATE_QUEUE_SIZE", "1000"))
+UPDATE_OVERLOAD: str = getenv("UPDATE_OVERLOAD", "defer")
+POLLING_TIMEOUT: int = int(getenv("POLLING_TIMEOUT", "30"))
+
+
+def update_key(update: Update) -> Hashable:
+    """Updates with the same key are handled one at a time in arrival order: the user, else the chat."""
+    try:
+        event: object = update.event
+    except UpdateTypeLookupError:
+        return ("update", update.update_id)
+    user: object = getattr(event, "from_user", None)
+    if isinstance(user, User):
+        return user.id
+    chat: object = getattr(event, "chat", None)
+    if isinstance(chat, Chat):
+        return chat.id
+    return ("update", update.update_id)
+
+
+class UpdateScheduler:
+    """Feeds updates to the dispatcher from a bounded pool of workers.
+
+    Updates wait in one queue per key, so updates of one user stay in order while different users run in
+    parallel. Once `high_water` updates are queued or running, `submit` either drops the update ("shed") or
+    waits for room ("defer"), which stops the polling loop or holds the webhook response.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        workers: int = UPDATE_WORKERS,
+        high_water: int = UPDATE_QUEUE_SIZE,
+        policy: str = UPDATE_OVERLOAD,
+    ) -> None:
+        if policy not in ("shed", "defer"):
+            raise ValueError(f"Unknown overload policy: {policy}")
+        self.dp: Dispatcher = dp
+        self.bot: Bot = bot
+        self.workers: int = workers
+        self.high_water: int = high_water
+        self.policy: str = policy
+        self.pending: dict[Hashable, deque[Update]] = {}
+        self.ready: Queue[Hashable] = Queue()
+        self.space: Event = Event()
+        self.space.set()
+        self.size: int = 0
+        self.tasks: list[Task[None]] = []
+        self.processed: int = 0
+        self.shed: int = 0
+        self.deferred: int = 0
+
+    def start(self) -> None:
+        self.tasks = [create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Wait for the submitted updates to be handled, then stop the workers."""
+        await self.ready.join()
+        for task in self.tasks:
+            task.cancel()
+        await gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def submit(self, update: Update) -> bool:
+        """Queue an update. Returns False if it was shed."""
+        if self.size >= self.high_water:
+            if self.policy == "shed":
+                self.shed += 1
+                return False
+            self.deferred += 1
+            while self.size >= self.high_water:
+                self.space.clear()
+                await self.space.wait()
+        key: Hashable = update_key(update)
+        updates: deque[Update] | None = self.pending.get(key)
+        if updates is None:
+            self.pending[key] = deque([update])
+            self.ready.put_nowait(key)
+        else:
+            # A worker has the key already and picks the update up when it is done with the earlier ones
+            updates.append(update)
+        self.size += 1
+        return True
+
+    async def _work(self) -> None:
+        while True:
+            key: Hashable = await self.ready.get()
+            updates: deque[Update] = self.pending[key]
+            update: Update = updates.popleft()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as error:
+                loggers.event.exception("Failed to process update id=%d: %s", update.update_id, error)
+            finally:
+                self.size -= 1
+                self.processed += 1
+                if updates:
+                    self.ready.put_nowait(key)
+                else:
+                    del self.pending[key]
+                if self.size < self.high_water:
+                    self.space.set()
+                self.ready.task_done()
+
+
+async def run_polling(dp: Dispatcher, bot: Bot, scheduler: UpdateScheduler, timeout: int = POLLING_TIMEOUT) -> None:
+    """Long polling that hands updates to the scheduler and only asks for more once they were accepted."""
+    get_updates: GetUpdates = GetUpdates(timeout=timeout, allowed_updates=dp.resolve_used_update_types())
+    failures: int = 0
+    while True:
+        try:
+            updates: list[Update] = await bot(get_updates, request_timeout=timeout + 30)
+        except Exception as error:
+            failures += 1
+            loggers.dispatcher.error("Failed to fetch updates: %s", error)
+            await sleep(backoff_delay(failures))
+            continue
+        failures = 0
+        for update in updates:
+            await scheduler.submit(update)
+            get_updates.offset = update.update_id + 1
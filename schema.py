@@ -1,6 +1,23 @@
+# Standard libraries imports
+from typing import NamedTuple
+
 # Third-party libraties imports
 from pydantic import BaseModel
 
+# Event of the original single-draw deployment, administered by ADMIN_ID
+DEFAULT_EVENT_ID: int = 0
+
+class Event(BaseModel):
+    id: int
+    title: str = ""
+    admin_id: int = 0
+
+class UserRow(NamedTuple):
+    """Read-only user for bulk reads: no validation and no per-row dict, unlike User."""
+    id: int
+    tg_name: str
+    name: str
+    desire: str
 
 class User(BaseModel):
     id: int
@@ -9,18 +26,95 @@ class User(BaseModel):
     desire: str = ""
 
 class UserStatistics(BaseModel):
+    id: int = 0
     tg_name: str
     name: str
     is_registered: bool
 
+    def __str__(self) -> str:
+        return f"{'✅' if self.is_registered else '❌'} {self.tg_name} ({self.name}) ID {self.id}"
+
 class Statistics(BaseModel):
     users: list[UserStatistics]
+    total_count: int | None = None
+    registered_count: int | None = None
+    has_prev: bool = False
+    has_next: bool = False
+
+    def __str__(self) -> str:
+        registered_count: int = (
+            self.registered_count if self.registered_count is not None
+            else sum(user.is_registered for user in self.users)
+        )
+        total_count: int = self.total_count if self.total_count is not None else len(self.users)
+        lines: list[str] = [f"Зарегистрировано пользователей: {registered_count} из {total_count}"]
+        lines.extend(map(str, self.users))
+        return "\n".join(lines) + "\n"
+
+class SearchResults(BaseModel):
+    query: str
+    users: list[UserStatistics]
+    # Search index rowids of the first and last user, the keyset cursors of the neighbouring pages
+    first_key: int = 0
+    last_key: int = 0
+    has_prev: bool = False
+    has_next: bool = False
+
+    def __str__(self) -> str:
+        if not self.users:
+            return f"По запросу «{self.query}» никого не найдено"
+        lines: list[str] = [f"Найдено по запросу «{self.query}»:"]
+        lines.extend(map(str, self.users))
+        return "\n".join(lines) + "\n"
+
+class Delivery(BaseModel):
+    chat_id: int
+    ok: bool
+    attempts: int
+    error: str = ""
+
+class DeliveryReport(BaseModel):
+    deliveries: list[Delivery]
+    sent_count: int | None = None
+
+    @property
+    def failed(self) -> list[Delivery]:
+        return [delivery for delivery in self.deliveries if not delivery.ok]
+
+    def __str__(self) -> str:
+        failed: list[Delivery] = self.failed
+        sent: int = self.sent_count if self.sent_count is not None else len(self.deliveries) - len(failed)
+        lines: list[str] = [f"Доставлено писем: {sent} из {sent + len(failed)}"]
+        lines.extend(f"❌ {delivery.chat_id}: {delivery.error}" for delivery in failed[:50])
+        if len(failed) > 50:
+            lines.append(f"... и еще {len(failed) - 50}")
+        return "\n".join(lines)
+
+class Snapshot(BaseModel):
+    path: str
+    size: int
+    steps: int
+    seconds: float
+    users: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"Снимок базы сохранен: {self.path}\n"
+            f"Размер: {self.size / 2**20:.1f} МиБ, участников: {self.users}, время: {self.seconds:.1f} с"
+        )
+
+class DeliveryProgress(BaseModel):
+    pending: int = 0
+    sending: int = 0
+    sent: int = 0
+    failed: int = 0
 
     def __str__(self) -> str:
-        registered_count: int = sum(user.is_registered for user in self.users)
-        total_count: int = len(self.users)
-        result: str = f"Зарегистрировано пользователей: {registered_count} из {total_count}\n"
-        for user in self.users:
-            status: str = "✅" if user.is_registered else "❌"
-            result += f"{status} {user.tg_name} ({user.name})\n"
-        return result
+        total: int = self.pending + self.sending + self.sent + self.failed
+        if total == 0:
+            return "Розыгрыш еще не проводился"
+        return (
+            f"Отправлено писем: {self.sent} из {total}\n"
+            f"В очереди: {self.pending + self.sending}\n"
+            f"Ошибок: {self.failed}"
+        )
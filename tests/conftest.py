@@ -1,5 +1,7 @@
 """Pytest configuration and shared fixtures."""
 from asyncio import get_event_loop_policy
+
+from fakeredis.aioredis import FakeRedis
 from pytest import fixture
 
 
@@ -9,3 +11,25 @@ def event_loop():
     loop = get_event_loop_policy().new_event_loop()
     yield loop
     loop.close()
+
+
+class FakeBot:
+    """Bot stand-in that records messages and raises queued errors per chat."""
+
+    def __init__(self, errors: dict[int, list[Exception]] | None = None) -> None:
+        self.errors = errors or {}
+        self.sent: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        pending = self.errors.get(chat_id)
+        if pending:
+            raise pending.pop(0)
+        self.sent.append((chat_id, text))
+
+
+@fixture
+async def redis():
+    """Fresh in-memory redis for every test."""
+    client = FakeRedis()
+    yield client
+    await client.aclose()
@@ -0,0 +1,96 @@
+"""Tests for async_db.py"""
+import asyncio
+import os
+import threading
+import time
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import pytest
+
+import async_db
+import cache
+
+
+class TestAsyncDatabase:
+    """Test the async data-access API."""
+
+    @pytest.fixture(autouse=True)
+    def setup_db(self):
+        """Point db.py at a fresh temp database for each test."""
+        temp_dir = TemporaryDirectory()
+        cache.users.clear()
+        with patch("db.DB_PATH", os.path.join(temp_dir.name, "test.db")):
+            from db import init_db
+            init_db()
+            yield
+        temp_dir.cleanup()
+
+    async def test_registration_round_trip(self) -> None:
+        """Test that writes are visible to subsequent reads."""
+        await async_db.add_user(1, "@user")
+        await async_db.update_name(1, "User")
+        await async_db.update_desire(1, "A book")
+
+        user = await async_db.get_user(1)
+        assert user is not None
+        assert user.name == "User"
+        assert user.desire == "A book"
+        assert [user.id for user in await async_db.get_data()] == [1]
+        assert len((await async_db.get_statistics()).users) == 1
+
+    async def test_get_user_not_exists(self) -> None:
+        """Test getting non-existent user."""
+        assert await async_db.get_user(999) is None
+
+    async def test_writes_use_single_thread(self) -> None:
+        """Test that all writes run on the same writer thread."""
+        threads: set[str] = set()
+
+        def record(user_id: int, name: str, event_id: int) -> None:
+            threads.add(threading.current_thread().name)
+
+        with patch("db.update_name", record):
+            await asyncio.gather(*(async_db.update_name(user_id, "x") for user_id in range(20)))
+        assert len(threads) == 1
+        assert threads.pop().startswith("db-write")
+
+    async def test_event_loop_not_blocked(self) -> None:
+        """Test that a slow write does not stall other coroutines."""
+        ticks: list[float] = []
+
+        def slow_write(user_id: int, tg_name: str, event_id: int) -> None:
+            time.sleep(0.2)
+
+        async def ticker() -> None:
+            for _ in range(10):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        with patch("db.add_user", slow_write):
+            await asyncio.gather(async_db.add_user(1, "@user"), ticker())
+        assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+
+    async def test_write_behind(self) -> None:
+        """Test that buffered updates are visible to reads and flushed before the draw."""
+        from write_behind import WriteBehindQueue
+        queue = WriteBehindQueue(async_db._write_batch, interval_ms=10_000, max_rows=100)
+        with patch("async_db.write_behind", queue):
+            await async_db.add_user(1, "@user")
+            await async_db.update_name(1, "User")
+            await async_db.update_desire(1, "A book")
+            assert (await async_db.get_user(1)).name == "User"
+
+            assert [user.id for user in await async_db.get_data()] == [1]
+            assert queue.pending == {}
+
+    async def test_get_user_is_cached(self) -> None:
+        """Test that get_user is served from the cache until the user changes."""
+        await async_db.add_user(1, "@user")
+        await async_db.get_user(1)
+        with patch("db.get_user") as db_get_user:
+            assert (await async_db.get_user(1)).tg_name == "@user"
+            db_get_user.assert_not_called()
+
+        await async_db.update_name(1, "New name")
+        assert (await async_db.get_user(1)).name == "New name"
@@ -0,0 +1,146 @@
+"""Tests for backup.py"""
+import asyncio
+import os
+import sqlite3
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+import backup
+import db
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """A fresh database with a few users and an empty snapshot directory for every test."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "live.db"))
+    db.init_db()
+    for user_id in range(1, 51):
+        db.add_user(user_id, f"@user{user_id}")
+        db.update_desire(user_id, "A book " * 50)
+    yield tmp_path / "snapshots"
+    db.close_db()
+    backup.running = False
+
+
+def count_users(path) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT count(*) FROM users").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class TestSnapshot:
+    """Test taking and verifying snapshots."""
+
+    def test_snapshot_is_verified_copy(self, database) -> None:
+        """Test that a snapshot holds the same rows, is a single file and passes verification."""
+        snapshot = backup.take_snapshot(str(database), pages=4, pause_ms=0)
+
+        assert snapshot.users == 50
+        assert snapshot.steps > 1
+        assert count_users(snapshot.path) == 50
+        assert sorted(os.listdir(database)) == [os.path.basename(snapshot.path)]
+        assert backup.verify(snapshot.path)["users"] == 50
+
+    def test_snapshot_sees_one_point_in_time(self, database, monkeypatch) -> None:
+        """Test that writes between steps neither block nor restart the copy and are not in the snapshot."""
+        written = []
+
+        def write_between_steps(seconds: float) -> None:
+            # Bounded, so a copy that restarts on every write still ends and fails on the row count
+            if len(written) == 100:
+                return
+            user_id = 1000 + len(written)
+            db.add_user(user_id, f"@late{user_id}")
+            written.append(user_id)
+
+        monkeypatch.setattr(backup, "pause", write_between_steps)
+        snapshot = backup.take_snapshot(str(database), pages=1, pause_ms=1)
+
+        assert len(written) > 10
+        assert count_users(snapshot.path) == 50
+        assert count_users(db.DB_PATH) == 50 + len(written)
+
+    def test_old_snapshots_are_pruned(self, database) -> None:
+        """Test that only the newest snapshots are kept."""
+        database.mkdir()
+        for day in range(1, 5):
+            (database / f"santa-2026010{day}-000000.db").write_bytes(b"")
+        snapshot = backup.take_snapshot(str(database), keep=2, pause_ms=0)
+
+        assert sorted(os.listdir(database)) == ["santa-20260104-000000.db", os.path.basename(snapshot.path)]
+
+    def test_verify_rejects_damaged_files(self, database) -> None:
+        """Test that truncated and foreign files are refused."""
+        snapshot = backup.take_snapshot(str(database), pause_ms=0)
+        truncated = database / "truncated.db"
+        with open(snapshot.path, "rb") as file:
+            truncated.write_bytes(file.read()[: os.path.getsize(snapshot.path) // 2])
+        garbage = database / "garbage.db"
+        garbage.write_bytes(b"not a database" * 1000)
+
+        for path in (truncated, garbage, database / "missing.db"):
+            with pytest.raises(ValueError):
+                backup.verify(str(path))
+
+
+class TestRestore:
+    """Test restoring the database from a snapshot."""
+
+    def test_restore_round_trip(self, database) -> None:
+        """Test that a restored database matches the snapshot and works with the bot."""
+        snapshot = backup.take_snapshot(str(database), pause_ms=0)
+        db.add_user(999, "@after")
+        db.close_db()
+
+        restored = backup.restore(snapshot.path)
+
+        assert restored["users"] == 50
+        assert db.get_user(999) is None
+        assert db.get_user(7).tg_name == "@user7"
+        assert [user.id for user in db.search_users("user7").users] == [7]
+
+    def test_damaged_snapshot_is_not_restored(self, database) -> None:
+        """Test that the database is left alone when the snapshot fails verification."""
+        damaged = database / "damaged.db"
+        database.mkdir()
+        damaged.write_bytes(b"SQLite format 3\x00" + b"\xff" * 8192)
+        db.close_db()
+
+        with pytest.raises(ValueError):
+            backup.restore(str(damaged))
+        assert count_users(db.DB_PATH) == 50
+
+
+class TestScheduling:
+    """Test the async entry points."""
+
+    async def test_one_snapshot_at_a_time(self, database, monkeypatch) -> None:
+        """Test that the snapshot runs in the backup thread and a second one is refused meanwhile."""
+        monkeypatch.setattr(backup, "take_snapshot", lambda: backup.Snapshot(path="x", size=0, steps=1, seconds=0.0))
+        assert (await backup.snapshot()).path == "x"
+        assert backup.running is False
+
+        backup.running = True
+        with pytest.raises(RuntimeError):
+            await backup.snapshot()
+
+    async def test_scheduled_snapshot_taken_by_one_instance(self, database, monkeypatch) -> None:
+        """Test that instances sharing redis take one snapshot per period between them."""
+        taken = []
+
+        def fake_snapshot(*args) -> backup.Snapshot:
+            taken.append(True)
+            return backup.Snapshot(path="x", size=0, steps=1, seconds=0.0)
+
+        monkeypatch.setattr(backup, "take_snapshot", fake_snapshot)
+        redis = FakeRedis()
+        workers = [asyncio.create_task(backup.run_backups(redis, 0.2)) for _ in range(3)]
+        await asyncio.sleep(0.3)
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        assert len(taken) == 1
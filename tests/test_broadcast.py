@@ -0,0 +1,117 @@
+"""Tests for broadcast.py"""
+from time import monotonic
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from broadcast import Broadcaster, ChatLimiter, TokenBucket
+from tests.conftest import FakeBot
+
+
+def _method(chat_id: int) -> SendMessage:
+    return SendMessage(chat_id=chat_id, text="")
+
+
+class TestTokenBucket:
+    """Test TokenBucket rate limiting."""
+
+    async def test_burst_up_to_capacity(self) -> None:
+        """Test that a full bucket serves its capacity without waiting."""
+        bucket = TokenBucket(rate=100)
+        start = monotonic()
+        for _ in range(100):
+            await bucket.acquire()
+        assert monotonic() - start < 0.05
+
+    async def test_waits_when_empty(self) -> None:
+        """Test that an empty bucket waits for a refill."""
+        bucket = TokenBucket(rate=50, capacity=1)
+        await bucket.acquire()
+        start = monotonic()
+        await bucket.acquire()
+        assert monotonic() - start >= 0.015
+
+    async def test_pause(self) -> None:
+        """Test that pause blocks acquire for the given time."""
+        bucket = TokenBucket(rate=1000)
+        bucket.pause(0.05)
+        start = monotonic()
+        await bucket.acquire()
+        assert monotonic() - start >= 0.04
+
+
+    async def test_active(self) -> None:
+        """Test that a bucket is active right after a send and while paused."""
+        bucket = TokenBucket(rate=1000)
+        await bucket.acquire()
+        assert bucket.active(0.5)
+        assert not bucket.active(0)
+        bucket.pause(0.5)
+        assert bucket.active(0)
+
+
+class TestChatLimiter:
+    """Test ChatLimiter per-chat spacing."""
+
+    async def test_same_chat_is_spaced(self) -> None:
+        """Test that repeated messages to one chat are spaced by the interval."""
+        limiter = ChatLimiter(rate=20)
+        start = monotonic()
+        await limiter.wait(1)
+        await limiter.wait(1)
+        assert monotonic() - start >= 0.04
+
+    async def test_different_chats_do_not_wait(self) -> None:
+        """Test that different chats are independent."""
+        limiter = ChatLimiter(rate=1)
+        start = monotonic()
+        for chat_id in range(10):
+            await limiter.wait(chat_id)
+        assert monotonic() - start < 0.05
+
+
+class TestBroadcaster:
+    """Test Broadcaster delivery and reporting."""
+
+    async def test_sends_all_messages(self) -> None:
+        """Test that every message is delivered."""
+        bot = FakeBot()
+        broadcaster = Broadcaster(bot, rate=1000, chat_rate=1000)
+        report = await broadcaster.send([(chat_id, f"hi {chat_id}") for chat_id in range(100)])
+        assert len(bot.sent) == 100
+        assert len(report.deliveries) == 100
+        assert report.failed == []
+
+    async def test_retries_transient_errors(self) -> None:
+        """Test that network errors are retried."""
+        bot = FakeBot({1: [TelegramNetworkError(_method(1), "timeout")]})
+        broadcaster = Broadcaster(bot, rate=1000, chat_rate=1000, retries=2)
+        report = await broadcaster.send([(1, "hi")])
+        assert bot.sent == [(1, "hi")]
+        assert report.deliveries[0].ok is True
+        assert report.deliveries[0].attempts == 2
+
+    async def test_gives_up_after_retries(self) -> None:
+        """Test that a recipient is reported as failed after all retries."""
+        bot = FakeBot({1: [TelegramNetworkError(_method(1), "timeout") for _ in range(5)]})
+        broadcaster = Broadcaster(bot, rate=1000, chat_rate=1000, retries=1)
+        report = await broadcaster.send([(1, "hi"), (2, "hi")])
+        assert bot.sent == [(2, "hi")]
+        assert [delivery.chat_id for delivery in report.failed] == [1]
+
+    async def test_permanent_error_is_not_retried(self) -> None:
+        """Test that a blocked bot does not stop the broadcast."""
+        bot = FakeBot({1: [TelegramForbiddenError(_method(1), "bot was blocked by the user")]})
+        broadcaster = Broadcaster(bot, rate=1000, chat_rate=1000)
+        report = await broadcaster.send([(1, "hi"), (2, "hi")])
+        assert report.failed[0].attempts == 1
+        assert "blocked" in report.failed[0].error
+        assert bot.sent == [(2, "hi")]
+
+    async def test_retry_after_pauses_bucket(self) -> None:
+        """Test that flood control pauses sending and the message is still delivered."""
+        bot = FakeBot({1: [TelegramRetryAfter(_method(1), "flood", retry_after=0)]})
+        broadcaster = Broadcaster(bot, rate=1000, chat_rate=1000, retries=0)
+        report = await broadcaster.send([(1, "hi")])
+        assert report.deliveries[0].ok is True
+        assert bot.sent == [(1, "hi")]
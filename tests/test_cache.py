@@ -0,0 +1,142 @@
+"""Tests for cache.py"""
+from unittest.mock import patch
+
+import pytest
+
+import cache
+from cache import TTLCache
+from schema import User
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis commands used by cache.py."""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+        self.gets = 0
+
+    async def get(self, key: str) -> bytes | None:
+        self.gets += 1
+        return self.data.get(key)
+
+    async def set(self, key: str, value: str, ex: int | None = None) -> None:
+        self.data[key] = value.encode()
+
+    async def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    """Start every test with empty caches and no second level."""
+    cache.users.clear()
+    cache.flags.clear()
+    cache.events.clear()
+    with patch("cache.l2", None):
+        yield
+    cache.users.clear()
+    cache.flags.clear()
+
+
+class TestTTLCache:
+    """Test TTLCache."""
+
+    def test_hit_and_miss_counters(self) -> None:
+        """Test that hits and misses are counted."""
+        lru: TTLCache[int, str] = TTLCache(size=10, ttl=60)
+        assert lru.get(1) is None
+        lru.set(1, "one")
+        assert lru.get(1) == "one"
+        assert (lru.hits, lru.misses) == (1, 1)
+
+    def test_evicts_least_recently_used(self) -> None:
+        """Test that the oldest unused entry is evicted."""
+        lru: TTLCache[int, str] = TTLCache(size=2, ttl=60)
+        lru.set(1, "one")
+        lru.set(2, "two")
+        lru.get(1)
+        lru.set(3, "three")
+        assert lru.get(2) is None
+        assert lru.get(1) == "one"
+
+    def test_expired_entry_is_a_miss(self) -> None:
+        """Test that entries expire after their ttl."""
+        lru: TTLCache[int, str] = TTLCache(size=10, ttl=60)
+        lru.set(1, "one", ttl=-1)
+        assert lru.get(1) is None
+        assert 1 not in lru.entries
+
+    def test_invalidate(self) -> None:
+        """Test explicit invalidation."""
+        lru: TTLCache[int, str] = TTLCache(size=10, ttl=60)
+        lru.set(1, "one")
+        lru.invalidate(1)
+        assert lru.get(1) is None
+
+
+class TestUserCache:
+    """Test the two-level user cache."""
+
+    async def test_local_only(self) -> None:
+        """Test the in-process level without redis."""
+        await cache.set_user(User(id=1, name="One"))
+        assert (await cache.get_user(1)).name == "One"
+        await cache.invalidate_user(1)
+        assert await cache.get_user(1) is None
+
+    async def test_second_level(self) -> None:
+        """Test that a user stored by another process is read from redis."""
+        redis = FakeRedis()
+        with patch("cache.l2", redis):
+            await cache.set_user(User(id=1, name="One"))
+            cache.users.clear()
+            assert (await cache.get_user(1)).name == "One"
+            assert (0, 1) in cache.users.entries
+            await cache.invalidate_user(1)
+            assert redis.data == {}
+
+
+class TestRollDone:
+    """Test the cached roll_done flag."""
+
+    async def test_not_done_is_cached(self) -> None:
+        """Test that repeated checks do not hit redis."""
+        redis = FakeRedis()
+        assert await cache.is_roll_done(redis) is False
+        assert await cache.is_roll_done(redis) is False
+        assert redis.gets == 1
+
+    async def test_not_done_is_not_cached_with_several_instances(self) -> None:
+        """Test that with several instances every check asks redis until the draw is done, then the flag is kept."""
+        redis = FakeRedis()
+        with patch("cache.CACHE_NOT_DONE", False):
+            assert await cache.is_roll_done(redis) is False
+            redis.data["roll_done"] = b"yes"
+            assert await cache.is_roll_done(redis) is True
+            assert await cache.is_roll_done(redis) is True
+        assert redis.gets == 2
+
+    async def test_fresh_bypasses_cache(self) -> None:
+        """Test that fresh=True always asks redis."""
+        redis = FakeRedis()
+        await cache.is_roll_done(redis)
+        redis.data["roll_done"] = b"yes"
+        assert await cache.is_roll_done(redis, fresh=True) is True
+        assert redis.gets == 2
+
+    async def test_set_roll_done(self) -> None:
+        """Test that setting the flag updates redis and the local cache."""
+        redis = FakeRedis()
+        assert await cache.is_roll_done(redis) is False
+        await cache.set_roll_done(redis)
+        assert redis.data["roll_done"] == b"yes"
+        assert await cache.is_roll_done(redis) is True
+        assert redis.gets == 1
+
+    async def test_per_event(self) -> None:
+        """Test that every event has its own flag and the default event keeps the old key."""
+        redis = FakeRedis()
+        await cache.set_roll_done(redis, event_id=3)
+        assert redis.data == {"roll_done:3": b"yes"}
+        assert await cache.is_roll_done(redis, event_id=3) is True
+        assert await cache.is_roll_done(redis) is False
@@ -0,0 +1,96 @@
+"""Tests for callbacks.py"""
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageText
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+
+import callbacks
+from callbacks import show
+
+KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Info", callback_data="info")]])
+
+
+class FakeBot:
+    """Records edits and new messages; edits fail with `edit_error` if set."""
+
+    id = 123456
+
+    def __init__(self, edit_error: str | None = None) -> None:
+        self.edit_error = edit_error
+        self.edits: list[str] = []
+        self.sent: list[str] = []
+
+    async def __call__(self, method, request_timeout=None):
+        assert isinstance(method, EditMessageText)
+        if self.edit_error:
+            raise TelegramBadRequest(method=method, message=self.edit_error)
+        self.edits.append(method.text)
+        return True
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.sent.append(text)
+
+
+def _query(bot: FakeBot, text: str = "menu", keyboard: InlineKeyboardMarkup | None = KEYBOARD) -> CallbackQuery:
+    message = {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "text": text,
+    }
+    if keyboard is not None:
+        message["reply_markup"] = keyboard.model_dump(exclude_none=True)
+    return CallbackQuery.model_validate(
+        {
+            "id": "1",
+            "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+            "chat_instance": "42",
+            "data": "info",
+            "message": message,
+        },
+        context={"bot": bot},
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_counters():
+    for name in callbacks.counters:
+        callbacks.counters[name] = 0
+
+
+class TestShow:
+    """Test editing callback screens in place."""
+
+    async def test_edits_in_place(self) -> None:
+        """Test that a new screen replaces the pressed message."""
+        bot = FakeBot()
+        await show(_query(bot), "Твои данные", KEYBOARD)
+        assert (bot.edits, bot.sent) == (["Твои данные"], [])
+        assert callbacks.counters["edited"] == 1
+
+    async def test_unchanged_screen(self) -> None:
+        """Test that the same text and keyboard are not sent again."""
+        bot = FakeBot()
+        await show(_query(bot, text="Твои данные"), "Твои данные", KEYBOARD)
+        assert (bot.edits, bot.sent) == ([], [])
+        assert callbacks.counters["unchanged"] == 1
+
+    async def test_keyboard_change_is_edited(self) -> None:
+        """Test that the same text with another keyboard is still edited."""
+        bot = FakeBot()
+        await show(_query(bot, text="Твои данные"), "Твои данные")
+        assert bot.edits == ["Твои данные"]
+
+    async def test_not_modified(self) -> None:
+        """Test that Telegram's "message is not modified" counts as unchanged."""
+        bot = FakeBot(edit_error="Bad Request: message is not modified")
+        await show(_query(bot), "menu ", KEYBOARD)
+        assert bot.sent == []
+        assert callbacks.counters["unchanged"] == 1
+
+    async def test_not_editable(self) -> None:
+        """Test that a message that cannot be edited is replaced by a new one."""
+        bot = FakeBot(edit_error="Bad Request: message can't be edited")
+        await show(_query(bot), "Твои данные", KEYBOARD)
+        assert bot.sent == ["Твои данные"]
+        assert callbacks.counters["sent"] == 1
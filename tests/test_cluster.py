@@ -0,0 +1,138 @@
+"""Tests for cluster.py"""
+import asyncio
+import os
+import sqlite3
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import pytest
+
+import async_db
+import cluster
+from broadcast import Broadcaster
+from cluster import DRAW_LOCK_KEY, DrawLock, run_outbox_worker
+from schema import Delivery
+from tests.conftest import FakeBot
+
+
+class TestDrawLock:
+    """Test DrawLock."""
+
+    async def test_only_one_holder(self, redis) -> None:
+        """Test that a second acquire fails while the lock is held."""
+        first = DrawLock(redis)
+        second = DrawLock(redis)
+        token = await first.acquire()
+        assert token is not None
+        assert await second.acquire() is None
+
+    async def test_tokens_increase(self, redis) -> None:
+        """Test that every acquisition gets a new, larger token."""
+        lock = DrawLock(redis)
+        first = await lock.acquire()
+        await lock.release(first)
+        second = await lock.acquire()
+        assert second > first
+
+    async def test_release_with_stale_token(self, redis) -> None:
+        """Test that a worker whose lock expired cannot release the new holder's lock."""
+        lock = DrawLock(redis, ttl_ms=10)
+        stale = await lock.acquire()
+        await asyncio.sleep(0.03)
+        current = await lock.acquire()
+        assert await lock.release(stale) is False
+        assert int(await redis.get(DRAW_LOCK_KEY)) == current
+
+
+class TestOutboxWorker:
+    """Test delivery from the persistent outbox."""
+
+    @pytest.fixture(autouse=True)
+    def setup_db(self):
+        """Point db.py at a fresh temp database for each test."""
+        temp_dir = TemporaryDirectory()
+        with patch("db.DB_PATH", os.path.join(temp_dir.name, "test.db")):
+            from db import init_db
+            init_db()
+            yield
+        temp_dir.cleanup()
+
+    async def _run_workers(self, bots: list[FakeBot], admin_id: int, report_to: set[int] | None = None) -> None:
+        workers = [
+            asyncio.create_task(
+                run_outbox_worker(bot, Broadcaster(bot, rate=1000, chat_rate=1000), admin_id, batch=7, poll=0.01)
+            )
+            for bot in bots
+        ]
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if (report_to or {admin_id}) <= {chat_id for bot in bots for chat_id, _ in bot.sent}:
+                break
+        for worker in workers:
+            worker.cancel()
+
+    async def test_workers_share_outbox_and_report_once(self) -> None:
+        """Test that several workers deliver everything and the admin gets one report."""
+        messages = [(chat_id, "hi") for chat_id in range(1, 51)]
+        assert await async_db.save_draw(1, [(chat_id, chat_id % 50 + 1) for chat_id in range(1, 51)], messages)
+
+        bots = [FakeBot(), FakeBot()]
+        await self._run_workers(bots, 999)
+
+        delivered = sorted(chat_id for bot in bots for chat_id, _ in bot.sent if chat_id != 999)
+        assert delivered == list(range(1, 51))
+        reports = [text for bot in bots for chat_id, text in bot.sent if chat_id == 999]
+        assert reports == ["Доставлено писем: 50 из 50"]
+        assert (await async_db.get_delivery_progress()).sent == 50
+
+    async def test_resumes_after_restart(self) -> None:
+        """Test that a new worker only sends what was not delivered before the restart."""
+        messages = [(chat_id, "hi") for chat_id in range(1, 11)]
+        await async_db.save_draw(1, [(chat_id, chat_id % 10 + 1) for chat_id in range(1, 11)], messages)
+        _, claimed = await async_db.claim_outbox(4)
+        await async_db.finish_outbox([Delivery(chat_id=chat_id, ok=True, attempts=1) for chat_id, _ in claimed])
+
+        bot = FakeBot()
+        await self._run_workers([bot], 999)
+
+        resent = sorted(chat_id for chat_id, _ in bot.sent if chat_id != 999)
+        assert resent == [chat_id for chat_id in range(1, 11) if chat_id not in {c for c, _ in claimed}]
+        assert (999, "Доставлено писем: 10 из 10") in bot.sent
+
+    async def test_survives_errors(self, monkeypatch) -> None:
+        """Test that a locked database or a failed report send does not stop the worker for good."""
+        await async_db.save_draw(1, [(chat_id, chat_id % 10 + 1) for chat_id in range(1, 11)], [
+            (chat_id, "hi") for chat_id in range(1, 11)
+        ])
+        errors = [sqlite3.OperationalError("database is locked")]
+        claim = cluster.claim_outbox
+
+        async def flaky_claim(limit):
+            if errors:
+                raise errors.pop()
+            return await claim(limit)
+
+        monkeypatch.setattr(cluster, "claim_outbox", flaky_claim)
+        monkeypatch.setattr(cluster, "backoff_delay", lambda failures: 0.01)
+        monkeypatch.setattr(cluster, "outbox_ready", asyncio.Event())
+        bot = FakeBot(errors={999: [RuntimeError("report failed")]})
+        workers = asyncio.create_task(run_outbox_worker(bot, Broadcaster(bot, rate=1000), 999, batch=7, poll=0.01))
+        await asyncio.sleep(0.2)
+        workers.cancel()
+        await asyncio.gather(workers, return_exceptions=True)
+
+        assert errors == []
+        assert sorted(chat_id for chat_id, _ in bot.sent) == list(range(1, 11))
+        assert workers.cancelled()
+
+    async def test_report_goes_to_event_admin(self) -> None:
+        """Test that every event is reported separately to its own admin."""
+        event = await async_db.create_event("Office", admin_id=777)
+        await async_db.save_draw(1, [(1, 2), (2, 1)], [(1, "hi"), (2, "hi")])
+        await async_db.save_draw(2, [(3, 4), (4, 3)], [(3, "hi"), (4, "hi")], event.id)
+
+        bot = FakeBot()
+        await self._run_workers([bot], 999, report_to={999, 777})
+
+        assert (999, "Доставлено писем: 2 из 2") in bot.sent
+        assert (777, "Доставлено писем: 2 из 2") in bot.sent
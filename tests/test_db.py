@@ -98,7 +98,11 @@ class TestDatabase:
 
         conn = self._get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT desire, is_registered FROM users WHERE id = ?", (111,))
+        cursor.execute("""
+            SELECT desire, is_registered FROM users
+            JOIN user_desires ON user_desires.user_id = users.id
+            WHERE id = ?
+        """, (111,))
         result = cursor.fetchone()
         conn.close()
 
@@ -177,6 +181,14 @@ class TestDatabase:
         data = self._patch_and_run(get_data)
         assert len(data) == 0
 
+    def test_get_data_returns_rows(self) -> None:
+        """Test that get_data returns lean rows with empty strings instead of NULLs."""
+        from db import add_user, get_data, update_desire
+        from schema import UserRow
+        self._patch_and_run(add_user, 1, None)
+        self._patch_and_run(update_desire, 1, "Gift")
+        assert self._patch_and_run(get_data) == [UserRow(id=1, tg_name="", name="", desire="Gift")]
+
     def test_user_fields_default_values(self) -> None:
         """Test that user fields have correct default values."""
         from db import add_user, get_user
@@ -187,3 +199,315 @@ class TestDatabase:
         assert user.name == ""
         assert user.desire == ""
         assert user.tg_name == "@user"
+
+    def test_connection_is_reused(self) -> None:
+        """Test that consecutive calls share one connection."""
+        from db import get_connection
+        first = self._patch_and_run(get_connection)
+        second = self._patch_and_run(get_connection)
+        assert first is second
+
+    def test_connection_uses_wal(self) -> None:
+        """Test that the connection is tuned for WAL mode."""
+        from db import get_connection
+        conn = self._patch_and_run(get_connection)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+    def test_close_db_reopens_connection(self) -> None:
+        """Test that close_db closes the connection and the next call opens a new one."""
+        from db import add_user, close_db, get_connection, get_user
+        self._patch_and_run(add_user, 444, "@user")
+        first = self._patch_and_run(get_connection)
+        close_db()
+        assert self._patch_and_run(get_connection) is not first
+        assert self._patch_and_run(get_user, 444) is not None
+
+    def test_apply_batch(self) -> None:
+        """Test applying a batch of registration updates."""
+        from db import add_user, apply_batch, get_data, get_user
+        self._patch_and_run(add_user, 1, "@existing")
+        self._patch_and_run(apply_batch, [(0, 1, "@ignored"), (0, 2, "@new")], [("One", 0, 1), ("Two", 0, 2)], [("Book", 0, 2)])
+
+        assert self._patch_and_run(get_user, 1).tg_name == "@existing"
+        assert self._patch_and_run(get_user, 1).name == "One"
+        data = self._patch_and_run(get_data)
+        assert [(user.id, user.desire) for user in data] == [(2, "Book")]
+
+    def test_statistics_counters(self) -> None:
+        """Test that counters follow inserts, registrations and deletes."""
+        from db import add_user, get_statistics, update_desire
+        for user_id in range(1, 6):
+            self._patch_and_run(add_user, user_id, f"@user{user_id}")
+        self._patch_and_run(update_desire, 1, "Gift")
+        self._patch_and_run(update_desire, 1, "Other gift")
+        self._patch_and_run(update_desire, 2, "Gift")
+
+        conn = self._get_db_connection()
+        conn.execute("DELETE FROM users WHERE id = 2")
+        conn.commit()
+        conn.close()
+
+        stats = self._patch_and_run(get_statistics)
+        assert stats.total_count == 4
+        assert stats.registered_count == 1
+
+    def test_migrates_database_created_before_migrations(self) -> None:
+        """Test that a database with the original users table is upgraded in place."""
+        import time
+        from db import MIGRATIONS, claim_reminders, get_membership, get_statistics, get_user, init_db, search_users
+        old_path = os.path.join(self.temp_dir.name, "old.db")
+        conn = sqlite3.connect(old_path)
+        conn.execute("""
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY,
+                tg_name TEXT DEFAULT '',
+                name TEXT DEFAULT '',
+                desire TEXT DEFAULT '',
+                is_registered BOOLEAN DEFAULT 0
+            )
+        """)
+        conn.execute("INSERT INTO users VALUES (1, '@a', 'A', 'A book', 1), (2, '@b', 'B', '', 0)")
+        conn.commit()
+        conn.close()
+
+        with patch("db.DB_PATH", old_path):
+            init_db()
+            init_db()
+            stats = get_statistics()
+            user = get_user(1)
+
+        assert (stats.registered_count, stats.total_count) == (1, 2)
+        assert user.desire == "A book"
+        with patch("db.DB_PATH", old_path):
+            assert [found.id for found in search_users("boo").users] == [1]
+        conn = sqlite3.connect(old_path)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(users)")]
+        conn.close()
+        assert "desire" not in columns
+        assert "event_id" in columns
+        with patch("db.DB_PATH", old_path):
+            assert get_membership(2) == 0
+        # Users from before reminders existed count as joined at the upgrade, not as overdue
+        with patch("db.DB_PATH", old_path):
+            assert claim_reminders((-1, -1), time.time() - 3600, 10) == (None, [])
+            assert claim_reminders((-1, -1), time.time() + 1, 10) == (None, [(0, 2)])
+
+    def test_concurrent_migrations(self) -> None:
+        """Test that instances migrating the same database at once apply every migration exactly once."""
+        from threading import Barrier, Thread
+        from db import MIGRATIONS, _connect, migrate
+        path = os.path.join(self.temp_dir.name, "shared.db")
+        barrier = Barrier(4)
+        versions, errors = [], []
+
+        def start_instance() -> None:
+            conn = _connect(path)
+            barrier.wait()
+            try:
+                versions.append(migrate(conn))
+            except sqlite3.Error as error:
+                errors.append(error)
+            finally:
+                conn.close()
+
+        threads = [Thread(target=start_instance) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert versions == [len(MIGRATIONS)] * 4
+
+    def test_draw_query_uses_partial_index(self) -> None:
+        """Test that the draw-time query is served by the index on registered users."""
+        conn = self._get_db_connection()
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM users WHERE is_registered = 1").fetchall()
+        conn.close()
+        assert "users_registered" in " ".join(str(row) for row in plan)
+
+    def test_statistics_pagination(self) -> None:
+        """Test keyset pagination forwards and backwards."""
+        from db import add_user, get_statistics
+        for user_id in range(1, 8):
+            self._patch_and_run(add_user, user_id, f"@user{user_id}")
+
+        first = self._patch_and_run(get_statistics, None, None, 3)
+        assert [user.id for user in first.users] == [1, 2, 3]
+        assert (first.has_prev, first.has_next) == (False, True)
+
+        second = self._patch_and_run(get_statistics, 3, None, 3)
+        assert [user.id for user in second.users] == [4, 5, 6]
+        assert (second.has_prev, second.has_next) == (True, True)
+
+        last = self._patch_and_run(get_statistics, 6, None, 3)
+        assert [user.id for user in last.users] == [7]
+        assert last.has_next is False
+
+        back = self._patch_and_run(get_statistics, None, 4, 3)
+        assert [user.id for user in back.users] == [1, 2, 3]
+        assert back.total_count == 7
+
+    def test_save_draw_only_once(self) -> None:
+        """Test that pairs and outbox are stored once per event."""
+        from db import save_draw
+        assert self._patch_and_run(save_draw, 7, [(1, 2), (2, 1)], [(1, "to 2"), (2, "to 1")]) is True
+        assert self._patch_and_run(save_draw, 8, [(1, 2), (2, 1)], [(1, "again"), (2, "again")]) is False
+
+        conn = self._get_db_connection()
+        pairs = conn.execute("SELECT giver_id, recipient_id FROM pairs ORDER BY giver_id").fetchall()
+        outbox = conn.execute("SELECT chat_id, text, status FROM outbox ORDER BY chat_id").fetchall()
+        conn.close()
+        assert pairs == [(1, 2), (2, 1)]
+        assert outbox == [(1, "to 2", "pending"), (2, "to 1", "pending")]
+
+    def test_outbox_lifecycle(self) -> None:
+        """Test claiming, finishing and reporting outbox messages."""
+        from db import claim_outbox, claim_report, finish_outbox, get_delivery_progress, get_delivery_report, save_draw
+        from schema import Delivery
+        self._patch_and_run(save_draw, 1, [(1, 2), (2, 3), (3, 1)], [(1, "a"), (2, "b"), (3, "c")])
+
+        event_id, first = self._patch_and_run(claim_outbox, 2)
+        assert (event_id, len(first)) == (0, 2)
+        assert self._patch_and_run(claim_outbox, 2) == (0, [(3, "c")])
+        assert self._patch_and_run(claim_outbox, 2) == (0, [])
+        assert self._patch_and_run(get_delivery_progress).sending == 3
+        assert self._patch_and_run(claim_report) is False
+
+        self._patch_and_run(finish_outbox, [
+            Delivery(chat_id=1, ok=True, attempts=1),
+            Delivery(chat_id=2, ok=True, attempts=2),
+            Delivery(chat_id=3, ok=False, attempts=1, error="blocked"),
+        ])
+        progress = self._patch_and_run(get_delivery_progress)
+        assert (progress.sent, progress.failed, progress.pending) == (2, 1, 0)
+        assert self._patch_and_run(claim_report) is True
+        assert self._patch_and_run(claim_report) is False
+        assert str(self._patch_and_run(get_delivery_report)) == "Доставлено писем: 2 из 3\n❌ 3: blocked"
+
+    def test_events_are_partitioned(self) -> None:
+        """Test that users, counters, draws and the outbox of different events are kept apart."""
+        from db import add_user, claim_outbox, create_event, get_data, get_event, get_statistics, save_draw, update_desire
+        event = self._patch_and_run(create_event, "Office", 42)
+        assert self._patch_and_run(get_event, event.id) == event
+        for event_id in (0, event.id):
+            self._patch_and_run(add_user, 1, "@one", event_id)
+        self._patch_and_run(update_desire, 1, "Book", event.id)
+
+        assert self._patch_and_run(get_data) == []
+        assert [user.desire for user in self._patch_and_run(get_data, event.id)] == ["Book"]
+        statistics = self._patch_and_run(get_statistics, None, None, 25, event.id)
+        assert (statistics.total_count, statistics.registered_count) == (1, 1)
+        assert self._patch_and_run(get_statistics).registered_count == 0
+
+        assert self._patch_and_run(save_draw, 1, [(1, 2)], [(1, "a")], event.id) is True
+        assert self._patch_and_run(save_draw, 2, [(1, 2)], [(1, "b")], event.id) is False
+        assert self._patch_and_run(save_draw, 3, [(1, 2)], [(1, "c")]) is True
+        claimed = sorted(self._patch_and_run(claim_outbox, 10) for _ in range(2))
+        assert claimed == [(0, [(1, "c")]), (event.id, [(1, "a")])]
+
+    def test_exclusions(self) -> None:
+        """Test that exclusion rules are stored per event without duplicates."""
+        from db import add_exclusions, get_exclusions
+        self._patch_and_run(add_exclusions, [(1, 2), (2, 1), (1, 3), (1, 2)])
+        self._patch_and_run(add_exclusions, [(1, 4)], 5)
+        assert self._patch_and_run(get_exclusions) == {1: {2, 3}, 2: {1}}
+        assert self._patch_and_run(get_exclusions, 5) == {1: {4}}
+
+    def test_memberships(self) -> None:
+        """Test that the event a user takes part in follows joins but not imports."""
+        from db import add_user, apply_batch, create_event, get_membership, import_users
+        from schema import User
+        event = self._patch_and_run(create_event, "Office", 42)
+        self._patch_and_run(add_user, 1, "@one")
+        self._patch_and_run(add_user, 1, "@one", event.id)
+        self._patch_and_run(apply_batch, [(event.id, 2, "@two")], [], [])
+        self._patch_and_run(import_users, [User(id=1), User(id=3)])
+
+        assert self._patch_and_run(get_membership, 1) == event.id
+        assert self._patch_and_run(get_membership, 2) == event.id
+        assert self._patch_and_run(get_membership, 3) == 0
+        assert self._patch_and_run(get_membership, 4) is None
+
+    def test_abandoned_claims_are_reclaimed(self) -> None:
+        """Test that messages claimed by a dead worker are picked up again after the timeout."""
+        from db import claim_outbox, save_draw
+        self._patch_and_run(save_draw, 1, [(1, 2), (2, 1)], [(1, "a"), (2, "b")])
+        assert len(self._patch_and_run(claim_outbox, 10)[1]) == 2
+        assert self._patch_and_run(claim_outbox, 10)[1] == []
+        with patch("db.OUTBOX_CLAIM_TIMEOUT", -1):
+            assert len(self._patch_and_run(claim_outbox, 10)[1]) == 2
+
+    def test_search_follows_changes(self) -> None:
+        """Test that the search index is kept in sync with names and desires by triggers."""
+        from db import add_user, search_users, update_desire, update_name
+        self._patch_and_run(add_user, 1, "@alice")
+        self._patch_and_run(add_user, 2, "@bob")
+        self._patch_and_run(update_name, 2, "Борис Ёлкин")
+        self._patch_and_run(update_desire, 2, "Настольная игра")
+
+        def found(text):
+            return [user.id for user in self._patch_and_run(search_users, text).users]
+
+        assert found("ali") == [1]
+        assert found("бор") == [2]
+        assert found("ЁЛК") == [2]
+        assert found("наст иг") == [2]
+        assert found("наст ali") == []
+        self._patch_and_run(update_desire, 2, "Книга")
+        assert found("наст") == []
+        assert found("кни") == [2]
+        assert found("") == []
+        assert found('"* OR NEAR(') == []
+
+    def test_search_pagination(self) -> None:
+        """Test keyset pagination of search results and that events are searched separately."""
+        from db import add_user, search_users
+        for user_id in range(1, 8):
+            self._patch_and_run(add_user, user_id, f"@santa{user_id}")
+        self._patch_and_run(add_user, 100, "@santa100", 5)
+
+        first = self._patch_and_run(search_users, "santa", None, None, 3)
+        assert [user.id for user in first.users] == [1, 2, 3]
+        assert (first.has_prev, first.has_next) == (False, True)
+
+        second = self._patch_and_run(search_users, "santa", first.last_key, None, 3)
+        assert [user.id for user in second.users] == [4, 5, 6]
+        assert (second.has_prev, second.has_next) == (True, True)
+
+        last = self._patch_and_run(search_users, "santa", second.last_key, None, 3)
+        assert [user.id for user in last.users] == [7]
+        assert (last.has_prev, last.has_next) == (True, False)
+
+        back = self._patch_and_run(search_users, "santa", None, second.first_key, 3)
+        assert [user.id for user in back.users] == [1, 2, 3]
+        assert (back.has_prev, back.has_next) == (False, True)
+
+        other = self._patch_and_run(search_users, "santa", None, None, 3, 5)
+        assert [user.id for user in other.users] == [100]
+
+    def test_claim_reminders(self) -> None:
+        """Test that the keyset scan claims every due unregistered user once and skips new users and drawn events."""
+        import time
+        from db import add_user, claim_reminders, save_draw, update_desire
+        for user_id in range(1, 6):
+            self._patch_and_run(add_user, user_id, f"@user{user_id}")
+        self._patch_and_run(update_desire, 3, "A book")
+        self._patch_and_run(add_user, 7, "@drawn", 5)
+        self._patch_and_run(save_draw, 1, [(7, 7)], [], 5)
+
+        assert self._patch_and_run(claim_reminders, (-1, -1), time.time() - 3600, 10) == (None, [])
+
+        claimed, cursor = [], (-1, -1)
+        while cursor is not None:
+            cursor, batch = self._patch_and_run(claim_reminders, cursor, time.time() + 1, 2)
+            claimed += batch
+        assert claimed == [(0, 1), (0, 2), (0, 4), (0, 5)]
+        assert self._patch_and_run(claim_reminders, (-1, -1), time.time() + 1, 10) == (None, [])
+
+        conn = self._get_db_connection()
+        reminded = conn.execute("SELECT id FROM users WHERE reminded_at IS NOT NULL ORDER BY id").fetchall()
+        conn.close()
+        assert reminded == [(1,), (2,), (4,), (5,)]
@@ -0,0 +1,129 @@
+"""Tests for fsm_storage.py"""
+import asyncio
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from fsm_storage import TieredStorage
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+STATE_KEY = "fsm:42:42:state"
+DATA_KEY = "fsm:42:42:data"
+
+
+def tiered(redis, **kwargs) -> TieredStorage:
+    return TieredStorage(RedisStorage(redis), **kwargs)
+
+
+class TestTieredStorage:
+    """Test the local cache, the write-through and the TTLs."""
+
+    async def test_round_trip(self, redis) -> None:
+        """Test that states and data are stored in redis under the RedisStorage keys."""
+        storage = tiered(redis)
+        await storage.set_state(KEY, State("done", group_name="UsersStates"))
+        await storage.update_data(KEY, {"event_id": 7})
+        assert await storage.get_state(KEY) == "UsersStates:done"
+        assert await storage.get_data(KEY) == {"event_id": 7}
+        plain = RedisStorage(redis)
+        assert await plain.get_state(KEY) == "UsersStates:done"
+        assert await plain.get_data(KEY) == {"event_id": 7}
+
+    async def test_hot_reads_stay_local(self, redis) -> None:
+        """Test that a cached user is read without going to redis."""
+        storage = tiered(redis)
+        await storage.set_state(KEY, "new")
+        await storage.get_state(KEY)
+        await redis.delete(STATE_KEY)
+        assert await storage.get_state(KEY) == "new"
+        assert (storage.records.hits, storage.records.misses) == (1, 1)
+
+    async def test_writes_update_cache(self, redis) -> None:
+        """Test that writes keep the cached record in step with redis."""
+        storage = tiered(redis)
+        await storage.get_state(KEY)
+        await storage.set_state(KEY, "name")
+        await storage.set_data(KEY, {"event_id": 3})
+        await redis.flushall()
+        assert await storage.get_state(KEY) == "name"
+        assert await storage.get_data(KEY) == {"event_id": 3}
+
+    async def test_data_is_copied(self, redis) -> None:
+        """Test that changing a returned dict does not change the cached data."""
+        storage = tiered(redis)
+        (await storage.get_data(KEY))["event_id"] = 5
+        assert await storage.get_data(KEY) == {}
+
+    async def test_clear(self, redis) -> None:
+        """Test that clearing the state and data removes the keys."""
+        storage = tiered(redis)
+        await storage.set_state(KEY, "new")
+        await storage.set_data(KEY, {"event_id": 1})
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_data(KEY) == {}
+        assert await redis.keys() == []
+
+    async def test_idle_states_expire(self, redis) -> None:
+        """Test that both keys get the TTL and reads restart it."""
+        storage = tiered(redis, state_ttl=100)
+        await storage.set_state(KEY, "new")
+        await storage.set_data(KEY, {"event_id": 1})
+        assert 0 < await redis.ttl(STATE_KEY) <= 100
+        assert 0 < await redis.ttl(DATA_KEY) <= 100
+        await redis.expire(STATE_KEY, 10)
+        await tiered(redis, state_ttl=100).get_state(KEY)
+        assert await redis.ttl(STATE_KEY) > 10
+
+    async def test_no_ttl(self, redis) -> None:
+        """Test that a TTL of 0 keeps states forever."""
+        storage = tiered(redis, state_ttl=0)
+        await storage.set_state(KEY, "new")
+        await storage.get_state(KEY)
+        assert await redis.ttl(STATE_KEY) == -1
+
+    async def test_disabled_cache(self, redis) -> None:
+        """Test that with size 0 every read goes to redis, so other instances' writes are seen."""
+        storage = tiered(redis, size=0)
+        await storage.set_state(KEY, "new")
+        await RedisStorage(redis).set_state(KEY, "done")
+        assert await storage.get_state(KEY) == "done"
+
+    async def test_write_during_read(self, redis) -> None:
+        """Test that a read that raced with a write does not cache the old record."""
+        storage = tiered(redis)
+        await storage.set_state(KEY, "new")
+        gate = asyncio.Event()
+        make_pipeline = redis.pipeline
+
+        def slow_pipeline(*args, **kwargs):
+            pipeline = make_pipeline(*args, **kwargs)
+            execute = pipeline.execute
+
+            async def execute_later():
+                result = await execute()
+                await gate.wait()
+                return result
+
+            pipeline.execute = execute_later
+            return pipeline
+
+        redis.pipeline = slow_pipeline
+        read = asyncio.create_task(storage.get_state(KEY))
+        await asyncio.sleep(0.01)
+        redis.pipeline = make_pipeline
+        await storage.set_state(KEY, "name")
+        gate.set()
+        assert await read == "new"
+        assert await storage.get_state(KEY) == "name"
+
+    async def test_overlapping_loads(self, redis) -> None:
+        """Test that two reads of the same cold key at once both succeed and the record is cached afterwards."""
+        storage = tiered(redis)
+        await RedisStorage(redis).set_state(KEY, "new")
+        await RedisStorage(redis).set_data(KEY, {"event_id": 7})
+        assert await asyncio.gather(storage.get_state(KEY), storage.get_data(KEY)) == ["new", {"event_id": 7}]
+        assert storage.loading == {}
+        assert storage.records.peek(KEY) == ("new", {"event_id": 7})
@@ -0,0 +1,135 @@
+"""Tests for metrics.py"""
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import SendMessage
+from aiogram.types import Message, Update
+from aiohttp.test_utils import TestClient, TestServer
+from fakeredis.aioredis import FakeRedis
+
+import async_db
+import db
+import metrics
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+        "text": "hello",
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    """Empty histograms and no collectors for every test."""
+    for histogram in metrics.histograms:
+        histogram.counts.clear()
+        histogram.sums.clear()
+    metrics.collectors.clear()
+    yield
+    metrics.collectors.clear()
+
+
+class TestHistogram:
+    """Test the Prometheus text rendering."""
+
+    def test_buckets_are_cumulative(self) -> None:
+        """Test that buckets count every observation up to their bound."""
+        histogram = metrics.Histogram("test_seconds", "Test", "name", buckets=(0.1, 1))
+        for seconds in (0.05, 0.1, 0.5, 2):
+            histogram.observe("a", seconds)
+        assert histogram.render() == [
+            "# HELP santa_test_seconds Test",
+            "# TYPE santa_test_seconds histogram",
+            'santa_test_seconds_bucket{name="a",le="0.1"} 2',
+            'santa_test_seconds_bucket{name="a",le="1"} 3',
+            'santa_test_seconds_bucket{name="a",le="+Inf"} 4',
+            'santa_test_seconds_sum{name="a"} 2.65',
+            'santa_test_seconds_count{name="a"} 4',
+        ]
+
+    def test_label_escaping(self) -> None:
+        """Test that quotes in label values do not break the format."""
+        histogram = metrics.Histogram("test_seconds", "Test", "name", buckets=())
+        histogram.observe('say "hi"', 1)
+        assert 'santa_test_seconds_count{name="say \\"hi\\""} 1' in histogram.render()
+
+    def test_collectors(self) -> None:
+        """Test that registered counters and gauges are rendered with their current values."""
+        values = {"allowed": 1}
+        metrics.register("throttling", "counter", "Updates", lambda: values)
+        metrics.register("queue", "gauge", "Queued", lambda: {"size": 3})
+        values["allowed"] = 5
+        text = metrics.render()
+        assert "# TYPE santa_throttling_allowed_total counter\nsanta_throttling_allowed_total 5\n" in text
+        assert "# TYPE santa_queue_size gauge\nsanta_queue_size 3\n" in text
+
+
+class TestInstrumentation:
+    """Test the middlewares and wrappers that feed the histograms."""
+
+    async def test_handler(self) -> None:
+        """Test that handlers are timed by their function name."""
+        dp = Dispatcher(storage=MemoryStorage())
+
+        @dp.message()
+        async def greet(message: Message) -> None:
+            pass
+
+        dp.message.middleware(metrics.HandlerMetricsMiddleware())
+        bot = Bot(token="123456:TEST")
+        await dp.feed_update(bot, Update.model_validate(UPDATE, context={"bot": bot}))
+        await bot.session.close()
+        assert sum(metrics.handler_seconds.counts["greet"]) == 1
+
+    async def test_telegram_request(self) -> None:
+        """Test that Bot API requests are timed by their method."""
+        async def make_request(bot, method):
+            return "sent"
+
+        middleware = metrics.RequestMetricsMiddleware()
+        assert await middleware(make_request, None, SendMessage(chat_id=1, text="hi")) == "sent"
+        assert sum(metrics.telegram_request_seconds.counts["sendMessage"]) == 1
+
+    async def test_redis(self) -> None:
+        """Test that every Redis command of the client is timed, scripts included, and a pipeline counts once."""
+        redis = FakeRedis()
+        metrics.instrument_redis(redis)
+        await redis.set("key", "value")
+        assert await redis.get("key") == b"value"
+        await redis.eval("return 1", 0)
+        async with redis.pipeline(transaction=False) as pipeline:
+            pipeline.get("key")
+            pipeline.expire("key", 60)
+            assert await pipeline.execute() == [b"value", True]
+        await redis.aclose()
+        assert set(metrics.redis_command_seconds.counts) == {"SET", "GET", "EVAL", "PIPELINE"}
+        assert sum(metrics.redis_command_seconds.counts["PIPELINE"]) == 1
+
+    async def test_db_query(self, monkeypatch, tmp_path) -> None:
+        """Test that queries are timed by their db.py function name only while metrics are enabled."""
+        monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+        db.init_db()
+        try:
+            await async_db.get_exclusions()
+            assert metrics.db_query_seconds.counts == {}
+            monkeypatch.setattr(metrics, "enabled", True)
+            assert await async_db.get_exclusions() == {}
+            assert sum(metrics.db_query_seconds.counts["get_exclusions"]) == 1
+        finally:
+            db.close_db()
+
+    async def test_endpoint(self) -> None:
+        """Test that /metrics serves the text format."""
+        metrics.db_query_seconds.observe("get_user", 0.002)
+        client = TestClient(TestServer(metrics.create_app()))
+        await client.start_server()
+        response = await client.get(metrics.METRICS_PATH)
+        assert response.status == 200
+        assert response.content_type == "text/plain"
+        assert 'santa_db_query_seconds_count{query="get_user"} 1' in await response.text()
+        await client.close()
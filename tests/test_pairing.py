@@ -0,0 +1,115 @@
+"""Tests for pairing.py"""
+from random import Random
+
+import pytest
+
+from pairing import draw_pairs
+from schema import User, UserRow
+
+
+def _users(count: int) -> list[User]:
+    return [User(id=user_id, name=f"User {user_id}") for user_id in range(1, count + 1)]
+
+
+class TestDrawPairs:
+    """Test draw_pairs function."""
+
+    def test_two_users_swap(self) -> None:
+        """Test that two users draw each other."""
+        pairs = draw_pairs(_users(2))
+        assert pairs[1].id == 2
+        assert pairs[2].id == 1
+
+    @pytest.mark.parametrize("count", [2, 3, 5, 50, 1000])
+    def test_is_derangement(self, count: int) -> None:
+        """Test that everyone gives and receives exactly once and nobody draws themselves."""
+        users = _users(count)
+        pairs = draw_pairs(users)
+        assert set(pairs) == {user.id for user in users}
+        assert sorted(recipient.id for recipient in pairs.values()) == sorted(pairs)
+        assert all(giver_id != recipient.id for giver_id, recipient in pairs.items())
+
+    def test_single_cycle(self) -> None:
+        """Test that following the pairs visits every participant."""
+        pairs = draw_pairs(_users(100))
+        seen = {1}
+        current = pairs[1].id
+        while current != 1:
+            seen.add(current)
+            current = pairs[current].id
+        assert len(seen) == 100
+
+    def test_returns_user_objects(self) -> None:
+        """Test that recipients are the original User objects."""
+        users = _users(3)
+        pairs = draw_pairs(users)
+        assert all(any(recipient is user for user in users) for recipient in pairs.values())
+
+    def test_accepts_rows(self) -> None:
+        """Test that lean rows from bulk reads can be drawn like User models."""
+        rows = [UserRow(id=user_id, tg_name="", name="", desire="") for user_id in range(1, 11)]
+        pairs = draw_pairs(rows, {1: {2}})
+        assert all(isinstance(recipient, UserRow) for recipient in pairs.values())
+        assert pairs[1].id != 2
+
+    @pytest.mark.parametrize("count", [0, 1])
+    def test_too_few_users(self, count: int) -> None:
+        """Test that a draw needs at least two users."""
+        with pytest.raises(ValueError):
+            draw_pairs(_users(count))
+
+
+def _assert_valid(users: list[User], pairs: dict[int, User]) -> None:
+    assert set(pairs) == {user.id for user in users}
+    assert sorted(recipient.id for recipient in pairs.values()) == sorted(pairs)
+    assert all(giver_id != recipient.id for giver_id, recipient in pairs.items())
+
+
+class TestDrawPairsWithRules:
+    """Test draw_pairs with exclusions and teams."""
+
+    def test_exclusions_are_respected(self) -> None:
+        """Test that no giver draws an excluded recipient."""
+        users = _users(200)
+        random = Random(1)
+        exclusions = {user.id: set(random.sample(range(1, 201), 5)) for user in users}
+        for _ in range(20):
+            pairs = draw_pairs(users, exclusions)
+            _assert_valid(users, pairs)
+            assert all(recipient.id not in exclusions[giver_id] for giver_id, recipient in pairs.items())
+
+    def test_teams_are_respected(self) -> None:
+        """Test that nobody draws a member of their own team."""
+        users = _users(300)
+        teams = {user.id: user.id % 7 for user in users}
+        pairs = draw_pairs(users, teams=teams)
+        _assert_valid(users, pairs)
+        assert all(teams[giver_id] != teams[recipient.id] for giver_id, recipient in pairs.items())
+
+    def test_only_one_valid_draw(self) -> None:
+        """Test that a draw is found when the rules leave a single valid assignment."""
+        users = _users(4)
+        exclusions = {1: {3, 4}, 2: {1, 4}, 3: {1, 2}, 4: {2, 3}}
+        assert {giver_id: recipient.id for giver_id, recipient in draw_pairs(users, exclusions).items()} == {
+            1: 2, 2: 3, 3: 4, 4: 1,
+        }
+
+    def test_team_of_more_than_half_is_infeasible(self) -> None:
+        """Test that a team with more than half of the participants cannot be matched."""
+        users = _users(1000)
+        teams = {user.id: 0 for user in users[:501]}
+        with pytest.raises(ValueError, match="No valid draw"):
+            draw_pairs(users, teams=teams)
+
+    def test_recipient_excluded_by_everyone_is_infeasible(self) -> None:
+        """Test that a participant nobody may give to is reported."""
+        users = _users(50)
+        exclusions = {user.id: {1} for user in users}
+        with pytest.raises(ValueError, match="No valid draw"):
+            draw_pairs(users, exclusions)
+
+    def test_unknown_ids_are_ignored(self) -> None:
+        """Test that exclusions of users who did not register do not matter."""
+        users = _users(2)
+        pairs = draw_pairs(users, {1: {99}, 99: {1}})
+        assert (pairs[1].id, pairs[2].id) == (2, 1)
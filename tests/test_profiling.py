@@ -0,0 +1,105 @@
+"""Tests for profiling.py"""
+import asyncio
+import time
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message, Update
+
+import profiling
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+        "text": "hello",
+    },
+}
+
+
+def busy_loop(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_session():
+    """Every test starts without a running session."""
+    profiling.session = None
+    yield
+    profiling.session = None
+
+
+class TestParseArgs:
+    """Test the /profile arguments."""
+
+    def test_defaults(self) -> None:
+        """Test that no arguments mean a sampling run of the default length."""
+        assert profiling.parse_args(None) == ("sample", profiling.PROFILE_SECONDS, 0)
+
+    def test_units(self) -> None:
+        """Test seconds, updates and the cprofile mode."""
+        assert profiling.parse_args("10") == ("sample", 10, 0)
+        assert profiling.parse_args("10s cprofile") == ("cprofile", 10, 0)
+        assert profiling.parse_args("100u") == ("sample", profiling.PROFILE_MAX_SECONDS, 100)
+
+    def test_bounded(self) -> None:
+        """Test that a session cannot run longer than the maximum."""
+        assert profiling.parse_args("999999")[1] == profiling.PROFILE_MAX_SECONDS
+
+    def test_invalid(self) -> None:
+        """Test that garbage is rejected."""
+        with pytest.raises(ValueError):
+            profiling.parse_args("forever")
+
+
+class TestProfileSession:
+    """Test profiling sessions."""
+
+    async def test_sampling_finds_busy_function(self) -> None:
+        """Test that the sampler sees a function that keeps a thread busy."""
+        session = profiling.start("sample", seconds=0.3)
+        await asyncio.to_thread(busy_loop, 0.2)
+        report = await session.run()
+        assert session.sampler.samples > 0
+        assert "busy_loop" in report
+
+    async def test_cprofile(self) -> None:
+        """Test that the cProfile mode reports functions run on the event loop."""
+        session = profiling.start("cprofile", seconds=0.05)
+        busy_loop(0.01)
+        report = await session.run()
+        assert "busy_loop" in report
+        assert profiling.session is None
+
+    async def test_stops_after_updates(self) -> None:
+        """Test that a session ends after N handled updates with a per-handler breakdown."""
+        dp = Dispatcher(storage=MemoryStorage())
+
+        @dp.message()
+        async def greet(message: Message) -> None:
+            await asyncio.sleep(0.01)
+
+        dp.message.middleware(profiling.ProfilingMiddleware())
+        bot = Bot(token="123456:TEST")
+        session = profiling.start("sample", seconds=10, updates=2)
+        for _ in range(2):
+            await dp.feed_update(bot, Update.model_validate(UPDATE, context={"bot": bot}))
+        await bot.session.close()
+        report = await asyncio.wait_for(session.run(), 1)
+        assert session.handled == 2
+        assert session.handlers["greet"][0] == 2
+        assert "greet" in report
+
+    async def test_one_session_at_a_time(self) -> None:
+        """Test that a second session is refused while one is running."""
+        session = profiling.start("sample", seconds=0.01)
+        with pytest.raises(RuntimeError):
+            profiling.start("sample", seconds=0.01)
+        await session.run()
+        await profiling.start("sample", seconds=0.01).run()
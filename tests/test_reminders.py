@@ -0,0 +1,115 @@
+"""Tests for reminders.py"""
+import asyncio
+import sqlite3
+
+import pytest
+
+import async_db
+import cache
+import db
+import reminders
+from broadcast import Broadcaster
+from tests.conftest import FakeBot
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """A fresh database and zeroed counters for every test."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(reminders, "REMINDER_BUSY_SLEEP", 0.01)
+    monkeypatch.setattr(reminders, "counters", {"sent": 0, "failed": 0, "deferred": 0})
+    cache.flags.clear()
+    db.init_db()
+    yield
+    db.close_db()
+    cache.flags.clear()
+
+
+async def run_for(seconds: float, redis, bot: FakeBot, busy=lambda: False, **kwargs) -> None:
+    worker = asyncio.create_task(reminders.run_reminders(
+        redis, Broadcaster(bot, rate=1000, chat_rate=1000), busy, batch=2, interval=0.01, **kwargs
+    ))
+    await asyncio.sleep(seconds)
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+
+
+class TestRunReminders:
+    """Test the reminder loop."""
+
+    async def test_reminds_unregistered_users_once(self, redis) -> None:
+        """Test that every unfinished registration gets one reminder, even across several passes."""
+        for user_id in range(1, 6):
+            await async_db.add_user(user_id, f"@user{user_id}")
+        await async_db.add_user(6, "@user6", 5)
+        await async_db.update_desire(2, "A book")
+        await async_db.flush()
+        bot = FakeBot()
+
+        await run_for(0.2, redis, bot, delay=-1)
+
+        assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 3, 4, 5, 6]
+        assert reminders.counters["sent"] == 5
+
+    async def test_skips_events_drawn_before_draws_were_saved(self, redis) -> None:
+        """Test that an event whose draw is only marked in redis gets no reminders."""
+        await async_db.add_user(1, "@user1")
+        await async_db.add_user(2, "@user2", 5)
+        await async_db.flush()
+        await redis.set(cache.roll_done_key(), "yes")
+        bot = FakeBot()
+
+        await run_for(0.1, redis, bot, delay=-1)
+
+        assert bot.sent == [(2, reminders.REMINDER_TEXT)]
+
+    async def test_new_users_wait_for_delay(self, redis) -> None:
+        """Test that users are not reminded before the delay has passed since they joined."""
+        await async_db.add_user(1, "@user1")
+        await async_db.flush()
+        bot = FakeBot()
+
+        await run_for(0.1, redis, bot, delay=3600)
+
+        assert bot.sent == []
+
+    async def test_waits_while_busy(self, redis) -> None:
+        """Test that nothing is claimed or sent while handlers are busy, and sending resumes afterwards."""
+        await async_db.add_user(1, "@user1")
+        await async_db.flush()
+        bot = FakeBot()
+        busy = True
+
+        worker = asyncio.create_task(
+            reminders.run_reminders(redis, Broadcaster(bot, rate=1000), lambda: busy, delay=-1, interval=0.01)
+        )
+        await asyncio.sleep(0.1)
+        assert bot.sent == []
+        assert reminders.counters["deferred"] > 0
+        busy = False
+        await asyncio.sleep(0.1)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+        assert [chat_id for chat_id, _ in bot.sent] == [1]
+
+    async def test_survives_errors(self, redis, monkeypatch) -> None:
+        """Test that a locked database does not stop the reminders for good."""
+        await async_db.add_user(1, "@user1")
+        await async_db.flush()
+        errors = [sqlite3.OperationalError("database is locked")]
+        claim = reminders.claim_reminders
+
+        async def flaky_claim(after, joined_before, limit):
+            if errors:
+                raise errors.pop()
+            return await claim(after, joined_before, limit)
+
+        monkeypatch.setattr(reminders, "claim_reminders", flaky_claim)
+        monkeypatch.setattr(reminders, "backoff_delay", lambda failures: 0.01)
+        bot = FakeBot()
+
+        await run_for(0.1, redis, bot, delay=-1)
+
+        assert errors == []
+        assert bot.sent == [(1, reminders.REMINDER_TEXT)]
@@ -0,0 +1,113 @@
+"""Tests for scheduler.py"""
+import asyncio
+
+import pytest
+from aiogram.types import Update
+
+from scheduler import UpdateScheduler, update_key
+
+
+def _update(update_id: int, user_id: int, text: str = "") -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": text or str(update_id),
+        },
+    })
+
+
+class FakeDispatcher:
+    """Records handled updates; a handler takes `delay` seconds and fails on the text "fail"."""
+
+    def __init__(self, delay: float = 0.01) -> None:
+        self.delay = delay
+        self.handled: list[tuple[int, int]] = []
+        self.running = 0
+        self.peak = 0
+
+    async def feed_update(self, bot, update: Update) -> None:
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if update.message.text == "fail":
+                raise RuntimeError("handler failed")
+            self.handled.append((update.message.from_user.id, update.update_id))
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture
+def dp() -> FakeDispatcher:
+    return FakeDispatcher()
+
+
+class TestUpdateScheduler:
+    """Test ordering, parallelism and the overload policies."""
+
+    async def test_same_user_in_order(self, dp) -> None:
+        """Test that updates of one user are handled one at a time in arrival order."""
+        scheduler = UpdateScheduler(dp, bot=None, workers=8, high_water=100)
+        scheduler.start()
+        for update_id in range(10):
+            await scheduler.submit(_update(update_id, user_id=1))
+        await scheduler.stop()
+        assert dp.handled == [(1, update_id) for update_id in range(10)]
+        assert dp.peak == 1
+
+    async def test_users_in_parallel(self, dp) -> None:
+        """Test that different users are handled in parallel, up to the number of workers."""
+        scheduler = UpdateScheduler(dp, bot=None, workers=4, high_water=100)
+        scheduler.start()
+        for update_id in range(20):
+            await scheduler.submit(_update(update_id, user_id=update_id % 10))
+        await scheduler.stop()
+        assert len(dp.handled) == 20
+        assert dp.peak == 4
+        for user_id in range(10):
+            assert [update_id for user, update_id in dp.handled if user == user_id] == [user_id, user_id + 10]
+
+    async def test_shed(self, dp) -> None:
+        """Test that the "shed" policy drops updates above the high-water mark."""
+        scheduler = UpdateScheduler(dp, bot=None, workers=2, high_water=3, policy="shed")
+        scheduler.start()
+        accepted = [await scheduler.submit(_update(update_id, user_id=update_id)) for update_id in range(5)]
+        await scheduler.stop()
+        assert accepted == [True, True, True, False, False]
+        assert (scheduler.processed, scheduler.shed) == (3, 2)
+
+    async def test_defer(self, dp) -> None:
+        """Test that the "defer" policy waits for room and loses nothing."""
+        scheduler = UpdateScheduler(dp, bot=None, workers=2, high_water=3, policy="defer")
+        scheduler.start()
+        for update_id in range(10):
+            await scheduler.submit(_update(update_id, user_id=update_id))
+            assert scheduler.size <= 3
+        await scheduler.stop()
+        assert len(dp.handled) == 10
+        assert scheduler.deferred > 0
+
+    async def test_handler_error(self, dp) -> None:
+        """Test that a failing handler is logged and the worker carries on."""
+        scheduler = UpdateScheduler(dp, bot=None, workers=1, high_water=10)
+        scheduler.start()
+        await scheduler.submit(_update(1, user_id=1, text="fail"))
+        await scheduler.submit(_update(2, user_id=1))
+        await scheduler.stop()
+        assert dp.handled == [(1, 2)]
+        assert scheduler.processed == 2
+        assert scheduler.pending == {}
+
+    def test_unknown_policy(self, dp) -> None:
+        """Test that a mistyped policy is rejected."""
+        with pytest.raises(ValueError):
+            UpdateScheduler(dp, bot=None, policy="drop")
+
+    def test_update_key(self) -> None:
+        """Test that updates are keyed by their user."""
+        assert update_key(_update(1, user_id=7)) == 7
+        assert update_key(Update(update_id=5)) == ("update", 5)
@@ -1,5 +1,5 @@
 """Tests for schema.py"""
-from schema import User, UserStatistics, Statistics
+from schema import Delivery, DeliveryProgress, DeliveryReport, SearchResults, User, UserStatistics, Statistics
 
 
 class TestUserModel:
@@ -47,6 +47,13 @@ class TestUserStatisticsModel:
         assert stat.name == "User Two"
         assert stat.is_registered is False
 
+    def test_user_statistics_str(self) -> None:
+        """Test that statistics and search results show a user with the same row."""
+        stat = UserStatistics(id=7, tg_name="@user7", name="User Seven", is_registered=True)
+        assert str(stat) == "✅ @user7 (User Seven) ID 7"
+        assert str(stat) in str(Statistics(users=[stat])).splitlines()
+        assert str(stat) in str(SearchResults(query="user", users=[stat])).splitlines()
+
 
 class TestStatisticsModel:
     """Test Statistics schema model."""
@@ -102,3 +109,45 @@ class TestStatisticsModel:
         stats = Statistics(users=users)
         result = str(stats)
         assert "Зарегистрировано пользователей: 3 из 4" in result
+
+
+    def test_statistics_str_uses_counters(self) -> None:
+        """Test that __str__ prefers the stored counters over the page contents."""
+        users = [UserStatistics(id=1, tg_name="@a", name="A", is_registered=True)]
+        stats = Statistics(users=users, total_count=1000, registered_count=600)
+        result = str(stats)
+        assert "Зарегистрировано пользователей: 600 из 1000" in result
+        assert "✅ @a (A)" in result
+
+class TestDeliveryReportModel:
+    """Test DeliveryReport schema model."""
+
+    def test_report_str_all_delivered(self) -> None:
+        """Test __str__ when every message was delivered."""
+        report = DeliveryReport(deliveries=[Delivery(chat_id=1, ok=True, attempts=1)])
+        assert str(report) == "Доставлено писем: 1 из 1"
+
+    def test_report_str_with_failures(self) -> None:
+        """Test __str__ lists failed recipients."""
+        report = DeliveryReport(deliveries=[
+            Delivery(chat_id=1, ok=True, attempts=1),
+            Delivery(chat_id=2, ok=False, attempts=4, error="timeout"),
+        ])
+        result = str(report)
+        assert "Доставлено писем: 1 из 2" in result
+        assert "❌ 2: timeout" in result
+
+
+class TestDeliveryProgressModel:
+    """Test DeliveryProgress schema model."""
+
+    def test_progress_str_no_draw(self) -> None:
+        """Test __str__ before the draw."""
+        assert str(DeliveryProgress()) == "Розыгрыш еще не проводился"
+
+    def test_progress_str(self) -> None:
+        """Test __str__ during the broadcast."""
+        result = str(DeliveryProgress(pending=5, sending=2, sent=10, failed=1))
+        assert "Отправлено писем: 10 из 18" in result
+        assert "В очереди: 7" in result
+        assert "Ошибок: 1" in result
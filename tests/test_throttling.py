@@ -0,0 +1,91 @@
+"""Tests for throttling.py"""
+import asyncio
+
+from aiogram.types import CallbackQuery, Chat, User
+from aiogram.utils.callback_answer import CallbackAnswerMiddleware
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from throttling import ThrottlingMiddleware
+
+
+async def handler(event, data) -> str:
+    return "handled"
+
+
+def _data(user_id: int, chat_id: int | None = None) -> dict:
+    chat_id = user_id if chat_id is None else chat_id
+    return {
+        "event_from_user": User(id=user_id, is_bot=False, first_name="User"),
+        "event_chat": Chat(id=chat_id, type="private" if chat_id == user_id else "group"),
+    }
+
+
+async def _send(middleware: ThrottlingMiddleware, count: int, user_id: int, chat_id: int | None = None) -> int:
+    results = [await middleware(handler, object(), _data(user_id, chat_id)) for _ in range(count)]
+    return results.count("handled")
+
+
+class TestThrottlingMiddleware:
+    """Test the per-user and per-chat token buckets."""
+
+    async def test_burst_then_drop(self, redis) -> None:
+        """Test that a user gets `burst` updates through and the rest are dropped and counted."""
+        middleware = ThrottlingMiddleware(redis, user_rate=0.01, user_burst=3)
+        assert await _send(middleware, 10, user_id=1) == 3
+        assert (middleware.allowed, middleware.throttled) == (3, 7)
+
+    async def test_users_are_independent(self, redis) -> None:
+        """Test that one flooding user does not throttle another."""
+        middleware = ThrottlingMiddleware(redis, user_rate=0.01, user_burst=2)
+        await _send(middleware, 10, user_id=1)
+        assert await _send(middleware, 2, user_id=2) == 2
+
+    async def test_refill(self, redis) -> None:
+        """Test that tokens come back at the configured rate."""
+        middleware = ThrottlingMiddleware(redis, user_rate=50, user_burst=1)
+        assert await _send(middleware, 2, user_id=1) == 1
+        await asyncio.sleep(0.05)
+        assert await _send(middleware, 1, user_id=1) == 1
+
+    async def test_group_chat_limit(self, redis) -> None:
+        """Test that a group chat is limited across its users without spending the users' tokens on denial."""
+        middleware = ThrottlingMiddleware(redis, user_rate=0.01, user_burst=5, chat_rate=0.01, chat_burst=3)
+        handled = sum([await _send(middleware, 2, user_id=user_id, chat_id=-100) for user_id in (1, 2, 3)])
+        assert handled == 3
+        assert await _send(middleware, 3, user_id=3) == 3
+
+    async def test_disabled(self, redis) -> None:
+        """Test that a rate of 0 turns throttling off."""
+        middleware = ThrottlingMiddleware(redis, user_rate=0, chat_rate=0)
+        assert await _send(middleware, 20, user_id=1) == 20
+        assert await redis.keys() == []
+
+    async def test_redis_down_lets_updates_through(self, redis) -> None:
+        """Test that a redis failure does not block the bot."""
+        middleware = ThrottlingMiddleware(redis, user_rate=0.01, user_burst=1)
+
+        async def broken(*args, **kwargs):
+            raise RedisConnectionError("down")
+
+        middleware.script = broken
+        assert await _send(middleware, 3, user_id=1) == 3
+
+    async def test_dropped_button_presses_are_answered(self, redis) -> None:
+        """Test that with the answer middleware registered outside the limit, dropped presses are answered too."""
+        answered = []
+
+        class FakeBot:
+            async def __call__(self, method, request_timeout=None):
+                answered.append(method.callback_query_id)
+                return True
+
+        throttling = ThrottlingMiddleware(redis, user_rate=0.01, user_burst=1)
+        answer = CallbackAnswerMiddleware(pre=True)
+        results = []
+        for query_id in ("1", "2", "3"):
+            query = CallbackQuery(
+                id=query_id, from_user=User(id=1, is_bot=False, first_name="User"), chat_instance="1", data="info"
+            ).as_(FakeBot())
+            results.append(await answer(lambda event, data: throttling(handler, event, data), query, _data(1)))
+        assert results == ["handled", None, None]
+        assert answered == ["1", "2", "3"]
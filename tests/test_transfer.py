@@ -0,0 +1,103 @@
+"""Tests for transfer.py"""
+import io
+import json
+import os
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import pytest
+from pydantic import ValidationError
+
+import db
+import transfer
+from schema import User
+
+
+@pytest.fixture(autouse=True)
+def temp_db():
+    """Point db.py at a fresh temp database and yield the temp directory."""
+    temp_dir = TemporaryDirectory()
+    with patch("db.DB_PATH", os.path.join(temp_dir.name, "test.db")):
+        db.init_db()
+        yield temp_dir.name
+    temp_dir.cleanup()
+
+
+class TestReadParticipants:
+    """Test parsing of import files."""
+
+    def test_csv(self) -> None:
+        """Test that CSV rows become users and empty cells get defaults."""
+        file = io.StringIO("id,tg_name,name,desire\n1,@one,One,Book\n2,,Two,\n")
+        assert list(transfer.read_participants(file)) == [
+            User(id=1, tg_name="@one", name="One", desire="Book"),
+            User(id=2, name="Two"),
+        ]
+
+    def test_jsonl(self) -> None:
+        """Test that JSONL lines become users and blank lines are skipped."""
+        file = io.StringIO('{"id": 1, "name": "One"}\n\n{"id": 2, "desire": "Socks"}\n')
+        assert list(transfer.read_participants(file, jsonl=True)) == [User(id=1, name="One"), User(id=2, desire="Socks")]
+
+    def test_bad_row(self) -> None:
+        """Test that a row without a valid id is rejected."""
+        with pytest.raises(ValidationError):
+            list(transfer.read_participants(io.StringIO("id,name\nabc,One\n")))
+
+
+class TestImportExport:
+    """Test streaming import and export through the database."""
+
+    def test_import_registers_complete_rows(self, temp_db: str) -> None:
+        """Test that users with a name and a desire are registered and counted."""
+        path = os.path.join(temp_db, "users.csv")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("id,tg_name,name,desire\n")
+            file.writelines(f"{user_id},@u{user_id},User {user_id},{'Gift' if user_id % 2 else ''}\n" for user_id in range(10))
+        assert transfer.import_participants(path, chunk=3) == 10
+
+        statistics = db.get_statistics()
+        assert (statistics.total_count, statistics.registered_count) == (10, 5)
+        assert db.get_user(1) == User(id=1, tg_name="@u1", name="User 1", desire="Gift")
+
+    def test_import_updates_existing_users(self, temp_db: str) -> None:
+        """Test that importing a user again updates the row and keeps the registration."""
+        db.add_user(1, "@old")
+        db.update_desire(1, "Old gift")
+        path = os.path.join(temp_db, "users.jsonl")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(json.dumps({"id": 1, "tg_name": "@new", "name": "New"}) + "\n")
+        transfer.import_participants(path)
+        assert db.get_user(1) == User(id=1, tg_name="@new", name="New", desire="Old gift")
+        assert db.get_statistics().registered_count == 1
+
+    def test_bad_file_imports_nothing(self, temp_db: str) -> None:
+        """Test that an invalid row rolls back the whole import."""
+        path = os.path.join(temp_db, "users.csv")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("id,name\n" + "".join(f"{user_id},User\n" for user_id in range(5)) + "oops,User\n")
+        with pytest.raises(ValidationError):
+            transfer.import_participants(path, chunk=2)
+        assert db.get_statistics().total_count == 0
+
+    def test_export_round_trip(self, temp_db: str) -> None:
+        """Test that exported participants can be imported into another event."""
+        db.import_users([User(id=user_id, name=f"User {user_id}", desire="Gift") for user_id in range(3)])
+        path = os.path.join(temp_db, "users.csv")
+        assert transfer.export_participants(path) == 3
+        event = db.create_event("Copy", 1)
+        assert transfer.import_participants(path, event.id) == 3
+        assert db.get_data(event.id) == db.get_data()
+
+    def test_export_pairs(self, temp_db: str) -> None:
+        """Test that drawn pairs are exported with names."""
+        db.import_users([User(id=1, name="One", desire="A"), User(id=2, name="Two", desire="B")])
+        db.save_draw(1, [(1, 2), (2, 1)], [(1, "a"), (2, "b")])
+        path = os.path.join(temp_db, "pairs.jsonl")
+        assert transfer.export_pairs(path) == 2
+        with open(path, encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+        assert rows[0] == {
+            "giver_id": 1, "giver_tg_name": "", "giver_name": "One",
+            "recipient_id": 2, "recipient_tg_name": "", "recipient_name": "Two",
+        }
@@ -0,0 +1,121 @@
+"""Tests for webhook.py"""
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from scheduler import UpdateScheduler
+import webhook
+from webhook import SECRET_HEADER, create_app
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+        "text": "hello",
+    },
+}
+
+
+@pytest.fixture
+async def client():
+    """Webhook app with a dispatcher that records received texts."""
+    dp = Dispatcher(storage=MemoryStorage())
+    received: list[str] = []
+
+    @dp.message()
+    async def record(message: Message) -> None:
+        await asyncio.sleep(0.01)
+        received.append(message.text)
+
+    bot = Bot(token="123456:TEST")
+    test_client = TestClient(TestServer(create_app(dp, bot, secret="s3cret", path="/webhook")))
+    await test_client.start_server()
+    test_client.received = received
+    yield test_client
+    await test_client.close()
+    await bot.session.close()
+
+
+class TestWebhook:
+    """Test the webhook request handler."""
+
+    async def test_update_is_handled(self, client) -> None:
+        """Test that a recorded update reaches the handlers."""
+        response = await client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: "s3cret"})
+        assert response.status == 200
+        await asyncio.sleep(0.05)
+        assert client.received == ["hello"]
+
+    async def test_answers_before_handler_finishes(self, client) -> None:
+        """Test that Telegram gets its response before the handler is done."""
+        response = await client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: "s3cret"})
+        assert response.status == 200
+        assert client.received == []
+
+    async def test_wrong_secret(self, client) -> None:
+        """Test that requests without the secret token are rejected."""
+        response = await client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: "wrong"})
+        assert response.status == 401
+        response = await client.post("/webhook", json=UPDATE)
+        assert response.status == 401
+
+    def test_secret_is_required(self) -> None:
+        """Test that an app that would accept updates from anyone is refused."""
+        with pytest.raises(ValueError):
+            create_app(Dispatcher(storage=MemoryStorage()), Bot(token="123456:TEST"), secret="")
+
+    async def test_random_secret_for_single_instance(self, monkeypatch) -> None:
+        """Test that without WEBHOOK_SECRET one instance registers a random secret and several refuse to start."""
+        registered: list[str] = []
+
+        class FakeBot:
+            async def set_webhook(self, url: str, secret_token: str, allowed_updates: list[str]) -> None:
+                registered.append(secret_token)
+
+        monkeypatch.setattr(webhook, "WEBHOOK_SECRET", "")
+        monkeypatch.setattr(webhook, "WEBHOOK_PORT", 0)
+        monkeypatch.setattr(webhook, "BOT_WORKERS", 2)
+        with pytest.raises(RuntimeError):
+            await webhook.run_webhook(Dispatcher(storage=MemoryStorage()), FakeBot())
+
+        monkeypatch.setattr(webhook, "BOT_WORKERS", 1)
+        server = asyncio.create_task(webhook.run_webhook(Dispatcher(storage=MemoryStorage()), FakeBot()))
+        while not registered:
+            await asyncio.sleep(0.01)
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+        assert len(registered[0]) >= 32
+
+    async def test_invalid_body(self, client) -> None:
+        """Test that malformed updates are rejected."""
+        response = await client.post("/webhook", data="not json", headers={SECRET_HEADER: "s3cret"})
+        assert response.status == 400
+
+    async def test_scheduler(self) -> None:
+        """Test that with a scheduler the update is handled by its workers."""
+        dp = Dispatcher(storage=MemoryStorage())
+        received: list[str] = []
+
+        @dp.message()
+        async def record(message: Message) -> None:
+            received.append(message.text)
+
+        bot = Bot(token="123456:TEST")
+        scheduler = UpdateScheduler(dp, bot, workers=2, high_water=10)
+        scheduler.start()
+        test_client = TestClient(TestServer(create_app(dp, bot, secret="s3cret", path="/webhook", scheduler=scheduler)))
+        await test_client.start_server()
+        response = await test_client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: "s3cret"})
+        assert response.status == 200
+        await scheduler.stop()
+        assert received == ["hello"]
+        assert scheduler.processed == 1
+        await test_client.close()
+        await bot.session.close()
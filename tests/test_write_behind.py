@@ -0,0 +1,102 @@
+"""Tests for write_behind.py"""
+import asyncio
+
+import pytest
+
+from schema import User
+from write_behind import Batch, PendingUser, WriteBehindQueue, to_batch
+
+
+class Recorder:
+    """Collects written batches."""
+
+    def __init__(self, fail: int = 0) -> None:
+        self.batches: list[Batch] = []
+        self.fail = fail
+
+    async def __call__(self, batch: Batch) -> None:
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("disk full")
+        self.batches.append(batch)
+
+
+class TestToBatch:
+    """Test to_batch function."""
+
+    def test_splits_updates(self) -> None:
+        """Test that merged updates are split into executemany parameters."""
+        batch = to_batch({
+            (0, 1): PendingUser(tg_name="@one", name="One"),
+            (5, 2): PendingUser(desire="Book"),
+        })
+        assert batch == ([(0, 1, "@one")], [("One", 0, 1)], [("Book", 5, 2)])
+
+
+class TestWriteBehindQueue:
+    """Test WriteBehindQueue merging and flushing."""
+
+    async def test_merges_updates_per_user(self) -> None:
+        """Test that repeated updates of one user become one row."""
+        recorder = Recorder()
+        queue = WriteBehindQueue(recorder, interval_ms=10_000, max_rows=100)
+        queue.add_user(1, "@one")
+        queue.add_user(1, "@ignored")
+        queue.update_name(1, "First")
+        queue.update_name(1, "Second")
+        await queue.flush()
+        assert recorder.batches == [([(0, 1, "@one")], [("Second", 0, 1)], [])]
+
+    async def test_flush_after_interval(self) -> None:
+        """Test that pending updates are written after the interval."""
+        recorder = Recorder()
+        queue = WriteBehindQueue(recorder, interval_ms=10, max_rows=100)
+        queue.update_desire(1, "Book")
+        assert recorder.batches == []
+        await asyncio.sleep(0.05)
+        assert recorder.batches == [([], [], [("Book", 0, 1)])]
+
+    async def test_flush_at_max_rows(self) -> None:
+        """Test that reaching max_rows flushes without waiting for the interval."""
+        recorder = Recorder()
+        queue = WriteBehindQueue(recorder, interval_ms=10_000, max_rows=3)
+        for user_id in range(3):
+            queue.add_user(user_id, f"@{user_id}")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert len(recorder.batches) == 1
+        assert len(recorder.batches[0][0]) == 3
+        assert queue.pending == {}
+
+    async def test_failed_flush_keeps_updates(self) -> None:
+        """Test that updates survive a failed write and newer values win."""
+        recorder = Recorder(fail=1)
+        queue = WriteBehindQueue(recorder, interval_ms=10_000, max_rows=100)
+        queue.update_name(1, "Old")
+        queue.update_desire(1, "Book")
+        with pytest.raises(RuntimeError):
+            await queue.flush()
+        queue.update_name(1, "New")
+        await queue.flush()
+        assert recorder.batches == [([], [("New", 0, 1)], [("Book", 0, 1)])]
+
+    async def test_overlay(self) -> None:
+        """Test that reads see updates that are not flushed yet."""
+        queue = WriteBehindQueue(Recorder(), interval_ms=10_000, max_rows=100)
+        queue.add_user(1, "@one")
+        queue.update_name(1, "One")
+        assert queue.overlay(1, None) == User(id=1, tg_name="@one", name="One")
+        stored = User(id=1, tg_name="@stored", name="Old", desire="Book")
+        assert queue.overlay(1, stored) == User(id=1, tg_name="@stored", name="One", desire="Book")
+        assert queue.overlay(2, None) is None
+
+    async def test_events_are_separate(self) -> None:
+        """Test that one user's updates in different events are kept apart."""
+        recorder = Recorder()
+        queue = WriteBehindQueue(recorder, interval_ms=10_000, max_rows=100)
+        queue.update_name(1, "Home", event_id=0)
+        queue.update_name(1, "Work", event_id=7)
+        assert queue.overlay(1, None, event_id=7) is None
+        assert queue.overlay(1, User(id=1), event_id=7) == User(id=1, name="Work")
+        await queue.flush()
+        assert recorder.batches == [([], [("Home", 0, 1), ("Work", 7, 1)], [])]
@@ -0,0 +1,91 @@
+# Standard libraries imports
+from os import getenv
+from typing import Any, Awaitable, Callable
+
+# Third-party libraries imports
+from aiogram import BaseMiddleware
+from aiogram.types import Chat, TelegramObject, User
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+THROTTLE_USER_RATE: float = float(getenv("THROTTLE_USER_RATE", "1"))
+THROTTLE_USER_BURST: int = int(getenv("THROTTLE_USER_BURST", "5"))
+THROTTLE_CHAT_RATE: float = float(getenv("THROTTLE_CHAT_RATE", "5"))
+THROTTLE_CHAT_BURST: int = int(getenv("THROTTLE_CHAT_BURST", "20"))
+
+# Takes one token from every bucket in KEYS or from none of them. ARGV holds rate and burst per key.
+# Uses the redis clock, so all bot instances share the same buckets.
+BUCKET_SCRIPT: str = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local state = redis.call("HMGET", key, "tokens", "ts")
+    local value = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    value = math.min(burst, value + (now - ts) * rate)
+    if value < 1 then
+        return 0
+    end
+    tokens[i] = value
+end
+for i, key in ipairs(KEYS) do
+    redis.call("HSET", key, "tokens", tokens[i] - 1, "ts", now)
+    redis.call("PEXPIRE", key, math.ceil(tonumber(ARGV[2 * i]) / tonumber(ARGV[2 * i - 1]) * 1000))
+end
+return 1
+"""
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Outer middleware that drops updates once their user or group chat runs out of tokens.
+
+    A rate of 0 turns the limit off. If redis is unavailable, updates are let through.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        user_rate: float = THROTTLE_USER_RATE,
+        user_burst: int = THROTTLE_USER_BURST,
+        chat_rate: float = THROTTLE_CHAT_RATE,
+        chat_burst: int = THROTTLE_CHAT_BURST,
+    ) -> None:
+        self.script = redis.register_script(BUCKET_SCRIPT)
+        self.user_rate: float = user_rate
+        self.user_burst: int = user_burst
+        self.chat_rate: float = chat_rate
+        self.chat_burst: int = chat_burst
+        self.allowed: int = 0
+        self.throttled: int = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        chat: Chat | None = data.get("event_chat")
+        keys: list[str] = []
+        args: list[float] = []
+        if user is not None and self.user_rate > 0:
+            keys.append(f"throttle:user:{user.id}")
+            args += [self.user_rate, self.user_burst]
+        # In a private chat the chat is the user, so only group chats get a bucket of their own
+        if chat is not None and self.chat_rate > 0 and (user is None or chat.id != user.id):
+            keys.append(f"throttle:chat:{chat.id}")
+            args += [self.chat_rate, self.chat_burst]
+        if keys and not await self._take(keys, args):
+            self.throttled += 1
+            return None
+        self.allowed += 1
+        return await handler(event, data)
+
+    async def _take(self, keys: list[str], args: list[float]) -> bool:
+        try:
+            return bool(await self.script(keys=keys, args=args))
+        except RedisError:
+            return True
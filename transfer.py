@@ -0,0 +1,58 @@
+# Standard libraries imports
+import csv
+import json
+from typing import Iterable, Iterator, TextIO
+
+# Moduls imports
+import db
+from schema import DEFAULT_EVENT_ID, User
+
+PARTICIPANT_FIELDS: tuple[str, ...] = ("id", "tg_name", "name", "desire", "is_registered")
+PAIR_FIELDS: tuple[str, ...] = (
+    "giver_id", "giver_tg_name", "giver_name", "recipient_id", "recipient_tg_name", "recipient_name"
+)
+
+
+def read_participants(file: TextIO, jsonl: bool = False) -> Iterator[User]:
+    """Parse participants line by line from a CSV file with an `id` column (also tg_name, name, desire) or JSONL.
+
+    Rows are validated with the User model, which raises pydantic.ValidationError on a bad row.
+    """
+    if jsonl:
+        for line in file:
+            if line.strip():
+                yield User.model_validate_json(line)
+    else:
+        for row in csv.DictReader(file):
+            yield User.model_validate({key: value for key, value in row.items() if value})
+
+
+def write_rows(file: TextIO, fields: tuple[str, ...], rows: Iterable[tuple[object, ...]], jsonl: bool = False) -> int:
+    count: int = 0
+    if jsonl:
+        for row in rows:
+            file.write(json.dumps(dict(zip(fields, row, strict=True)), ensure_ascii=False) + "\n")
+            count += 1
+        return count
+    writer = csv.writer(file)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def import_participants(path: str, event_id: int = DEFAULT_EVENT_ID, chunk: int = db.IMPORT_CHUNK) -> int:
+    """Stream a .csv or .jsonl file into the event in one transaction. Returns the number of imported users."""
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        return db.import_users(read_participants(file, jsonl=path.endswith(".jsonl")), event_id, chunk)
+
+
+def export_participants(path: str, event_id: int = DEFAULT_EVENT_ID) -> int:
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        return write_rows(file, PARTICIPANT_FIELDS, db.iter_participants(event_id), jsonl=path.endswith(".jsonl"))
+
+
+def export_pairs(path: str, event_id: int = DEFAULT_EVENT_ID) -> int:
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        return write_rows(file, PAIR_FIELDS, db.iter_pairs(event_id), jsonl=path.endswith(".jsonl"))
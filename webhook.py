@@ -0,0 +1,84 @@
+# Standard libraries imports
+from asyncio import Event, Task, create_task, gather
+from hmac import compare_digest
+from os import getenv
+from secrets import token_urlsafe
+
+# Third-party libraries imports
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+from pydantic import ValidationError
+
+# Moduls imports
+from cluster import BOT_WORKERS
+from scheduler import UpdateScheduler
+
+BOT_MODE: str = getenv("BOT_MODE", "polling")
+WEBHOOK_URL: str = getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH: str = getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET: str = getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST: str = getenv("WEBHOOK_HOST", "0.0.0.0")  # noqa: S104
+WEBHOOK_PORT: int = int(getenv("WEBHOOK_PORT", "8080"))
+SECRET_HEADER: str = "X-Telegram-Bot-Api-Secret-Token"  # noqa: S105 (header name, not a secret)
+
+
+def create_app(
+    dp: Dispatcher,
+    bot: Bot,
+    secret: str = WEBHOOK_SECRET,
+    path: str = WEBHOOK_PATH,
+    scheduler: UpdateScheduler | None = None,
+) -> web.Application:
+    """aiohttp app that acknowledges every update right away and handles it in a background task.
+
+    With a scheduler the update is queued there instead; under the "defer" policy the response then waits for room.
+    Requests without `secret` in the secret token header are rejected, so an empty secret is refused.
+    """
+    if not secret:
+        raise ValueError("A webhook secret is required, otherwise anyone can post forged updates")
+    tasks: set[Task[object]] = set()
+
+    async def handle(request: web.Request) -> web.Response:
+        if not compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=401)
+        try:
+            update: Update = Update.model_validate(await request.json(), context={"bot": bot})
+        except (ValueError, ValidationError):
+            return web.Response(status=400)
+        if scheduler is not None:
+            await scheduler.submit(update)
+            return web.Response()
+        task: Task[object] = create_task(dp.feed_update(bot, update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return web.Response()
+
+    async def wait_tasks(app: web.Application) -> None:
+        await gather(*tasks, return_exceptions=True)
+
+    app: web.Application = web.Application()
+    app.router.add_post(path, handle)
+    app.on_shutdown.append(wait_tasks)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, scheduler: UpdateScheduler | None = None) -> None:
+    """Serve the webhook until cancelled. Without WEBHOOK_SECRET a single instance registers a random one."""
+    if not WEBHOOK_SECRET and BOT_WORKERS > 1:
+        # Every instance would register its own secret and reject the updates sent with the others'
+        raise RuntimeError("WEBHOOK_SECRET must be set when several instances serve the webhook")
+    secret: str = WEBHOOK_SECRET or token_urlsafe(32)
+    app: web.Application = create_app(dp, bot, secret=secret, scheduler=scheduler)
+    runner: web.AppRunner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    await bot.set_webhook(
+        WEBHOOK_URL + WEBHOOK_PATH,
+        secret_token=secret,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    try:
+        await Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,123 @@
+# Standard libraries imports
+from asyncio import Lock, Task, TimerHandle, create_task, get_running_loop
+from dataclasses import dataclass
+from os import getenv
+from typing import Awaitable, Callable
+
+# Moduls imports
+from schema import DEFAULT_EVENT_ID, User
+
+WRITE_BEHIND_MS: int = int(getenv("WRITE_BEHIND_MS", "0"))
+WRITE_BEHIND_ROWS: int = int(getenv("WRITE_BEHIND_ROWS", "500"))
+
+
+@dataclass(slots=True)
+class PendingUser:
+    tg_name: str | None = None
+    name: str | None = None
+    desire: str | None = None
+
+
+# Pending updates are keyed by (event_id, user_id)
+Key = tuple[int, int]
+Batch = tuple[list[tuple[int, int, str]], list[tuple[str, int, int]], list[tuple[str, int, int]]]
+
+
+def to_batch(pending: dict[Key, PendingUser]) -> Batch:
+    """Split merged updates into the (new_users, names, desires) lists expected by db.apply_batch."""
+    new_users: list[tuple[int, int, str]] = []
+    names: list[tuple[str, int, int]] = []
+    desires: list[tuple[str, int, int]] = []
+    for (event_id, user_id), update in pending.items():
+        if update.tg_name is not None:
+            new_users.append((event_id, user_id, update.tg_name))
+        if update.name is not None:
+            names.append((update.name, event_id, user_id))
+        if update.desire is not None:
+            desires.append((update.desire, event_id, user_id))
+    return new_users, names, desires
+
+
+class WriteBehindQueue:
+    """Merges registration updates per user and writes them in one transaction every `interval_ms` or `max_rows`.
+
+    Updates that are not flushed yet are lost if the process dies, so `interval_ms` is the durability window.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[Batch], Awaitable[None]],
+        interval_ms: int = WRITE_BEHIND_MS,
+        max_rows: int = WRITE_BEHIND_ROWS,
+    ) -> None:
+        self.write: Callable[[Batch], Awaitable[None]] = write
+        self.interval: float = interval_ms / 1000
+        self.max_rows: int = max_rows
+        self.pending: dict[Key, PendingUser] = {}
+        self.lock: Lock = Lock()
+        self.timer: TimerHandle | None = None
+        self.task: Task[None] | None = None
+
+    def add_user(self, user_id: int, tg_name: str, event_id: int = DEFAULT_EVENT_ID) -> None:
+        update: PendingUser = self.pending.setdefault((event_id, user_id), PendingUser())
+        if update.tg_name is None:
+            update.tg_name = tg_name
+        self._changed()
+
+    def update_name(self, user_id: int, name: str, event_id: int = DEFAULT_EVENT_ID) -> None:
+        self.pending.setdefault((event_id, user_id), PendingUser()).name = name
+        self._changed()
+
+    def update_desire(self, user_id: int, desire: str, event_id: int = DEFAULT_EVENT_ID) -> None:
+        self.pending.setdefault((event_id, user_id), PendingUser()).desire = desire
+        self._changed()
+
+    def overlay(self, user_id: int, user: User | None, event_id: int = DEFAULT_EVENT_ID) -> User | None:
+        """Apply not yet flushed updates on top of a user read from the database."""
+        update: PendingUser | None = self.pending.get((event_id, user_id))
+        if update is None:
+            return user
+        if user is None:
+            if update.tg_name is None:
+                return None
+            user = User(id=user_id, tg_name=update.tg_name)
+        changes: dict[str, str] = {}
+        if update.name is not None:
+            changes["name"] = update.name
+        if update.desire is not None:
+            changes["desire"] = update.desire
+        return user.model_copy(update=changes) if changes else user
+
+    def _changed(self) -> None:
+        if len(self.pending) >= self.max_rows:
+            self._schedule()
+        elif self.timer is None:
+            self.timer = get_running_loop().call_later(self.interval, self._schedule)
+
+    def _schedule(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = create_task(self.flush())
+
+    async def flush(self) -> None:
+        async with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            pending: dict[Key, PendingUser] = self.pending
+            self.pending = {}
+            if not pending:
+                return
+            try:
+                await self.write(to_batch(pending))
+            except Exception:
+                # Keep the failed updates unless they were superseded while writing
+                for key, update in pending.items():
+                    newer: PendingUser = self.pending.setdefault(key, update)
+                    if newer is not update:
+                        newer.tg_name = newer.tg_name if update.tg_name is None else update.tg_name
+                        newer.name = update.name if newer.name is None else newer.name
+                        newer.desire = update.desire if newer.desire is None else newer.desire
+                self.timer = get_running_loop().call_later(self.interval, self._schedule)
+                raise
+        if len(self.pending) >= self.max_rows:
+            self._schedule()